@@ -0,0 +1,67 @@
+"""
+Micro-benchmark of the per-report cost of the SysCheck IOS checks.
+
+"legacy" rebuilds one MULTILINE regex per rule alternative on every call and searches the whole report, the way
+validation_helpers worked before the rule table; "parsed" tokenizes the report once and runs the compiled rules.
+
+    python benchmarks/bench_syscheck_checks.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from libModMii.syscheck import validation_helpers as validation
+from libModMii.syscheck.report_parser import parse_syscheck_report
+from libModMii.syscheck.rules import get_syscheck_rules, _ANY
+from syscheck_fixtures import make_report
+
+def _legacy_pattern(slot, expectation):
+    revision = r'\d+' if expectation.revision is _ANY else str(expectation.revision)
+    info = '' if expectation.info is _ANY else f', Info: {re.escape(expectation.info)}'
+    if expectation.patches is _ANY:
+        return f'^{re.escape(slot)} \\(rev {revision}{info}\\)'
+    patches = f': {re.escape(expectation.patches)}' if expectation.patches else ''
+    return f'^{re.escape(slot)} \\(rev {revision}{info}\\){patches}$'
+
+def _legacy_missing(data, checks, region):
+    missing = []
+    for check in checks:
+        if not check.applies_to(region):
+            continue
+        patterns = [re.compile(_legacy_pattern(slot, expectation), re.MULTILINE)
+                    for slot, expectations in check.slots for expectation in expectations]
+        patterns += [re.compile(f'^{name} {re.escape(value)}$', re.MULTILINE) for name, value in check.components]
+        if not any(pattern.search(data) for pattern in patterns):
+            missing.append(check.ios)
+    return missing
+
+def legacy_checks(data, console_type):
+    rules = get_syscheck_rules()
+    return (_legacy_missing(data, rules.activeIOS[console_type], 'PAL') +
+            _legacy_missing(data, rules.extraProtection, 'PAL'))
+
+def parsed_checks(data, console_type):
+    report = parse_syscheck_report(data)
+    return (validation.check_for_missing_ios(report, 'PAL', console_type) +
+            validation.check_extra_protection(report))
+
+def main():
+    reports = []
+    for seed in range(40):
+        console_type = 'Wii' if seed % 2 else 'vWii'
+        reports.append((validation.translate_keywords_to_english(make_report(seed, 'en', console_type)), console_type))
+
+    for data, console_type in reports:
+        assert legacy_checks(data, console_type) == parsed_checks(data, console_type)
+
+    for name, checks in (('legacy', legacy_checks), ('parsed', parsed_checks)):
+        number = 20
+        seconds = timeit.timeit(lambda: [checks(data, console_type) for data, console_type in reports], number=number)
+        print(f"{name}: {seconds / (number * len(reports)) * 1e6:.1f} us/report")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Benchmark suite for the hot paths of libModMii, on synthetic fixtures only (no network, no real WAD):
+
+    syscheck   get_syscheck_analysis() on Wii and vWii reports of several sizes and languages, and the keyword
+               translation with its replace loop and single-pass regex strategies
+    database   get_database_entry() lookups, cold (database not loaded yet) and warm
+    verify     verify_file() on pattern-filled files, with and without the hash index
+    cios       build_cios() against synthetic base IOS built with libWiiPy
+    nus        nus_title_download() against a local fake NUS server, with and without the NUS cache
+
+Results are written as JSON (one object per run, tagged with the git commit) so they can be compared across
+commits; a summary is printed on stderr.
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --quick --only syscheck,database
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+SCHEMA = 'libModMii-bench/1'
+SUITES = ('syscheck', 'database', 'verify', 'cios', 'nus')
+MB = 1024 * 1024
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Runner:
+    def __init__(self, repeat, min_time):
+        self.repeat = repeat
+        self.min_time = min_time
+        self.results = []
+
+    def measure(self, name, params, func, number=None, setup=None, size=None, unit_name=None):
+        """
+        Time func() `repeat` times, `number` calls per repeat (calibrated to last at least min_time when None).
+        setup() runs, untimed, before every repeat. size is the amount of work per call (bytes or items) used to
+        report a throughput.
+        """
+        if number is None:
+            if setup:
+                setup()
+            number = 1
+            while True:
+                elapsed = timeit.timeit(func, number=number)
+                if elapsed >= self.min_time or number >= 1 << 20:
+                    break
+                number *= 2 if elapsed == 0 else max(2, min(10, int(self.min_time / elapsed) + 1))
+        samples = []
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            samples.append(timeit.timeit(func, number=number) / number)
+
+        result = {
+            'name': name,
+            'params': params,
+            'unit': 's',
+            'number': number,
+            'repeat': self.repeat,
+            'min': min(samples),
+            'median': statistics.median(samples),
+            'mean': statistics.fmean(samples),
+            'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        }
+        if size:
+            result['throughput'] = size / result['median']
+            result['throughputUnit'] = unit_name or 'B/s'
+        self.results.append(result)
+
+        params_text = ' '.join(f'{key}={value}' for key, value in params.items())
+        line = f'{name:<24} {params_text:<48} {result["median"] * 1e3:10.3f} ms'
+        if size:
+            scale, suffix = (MB, 'MB/s') if result['throughputUnit'] == 'B/s' else (1, result['throughputUnit'])
+            line += f'  {result["throughput"] / scale:12.1f} {suffix}'
+        print(line, file=sys.stderr)
+        return result
+
+def bench_syscheck(runner, quick, workdir):
+    from libModMii.syscheck import get_syscheck_analysis, set_default_analysis_cache
+    from libModMii.syscheck import translation
+    from libModMii.syscheck.translation import KeywordTranslator, load_translations
+    from syscheck_fixtures import make_report
+
+    # Measure the analysis itself, not the cache
+    set_default_analysis_cache(None)
+    languages = ('en', 'fr') if quick else ('en', 'fr', 'de', 'it', 'es')
+    sizes = (0, 500) if quick else (0, 200, 2000)
+    for console_type in ('Wii', 'vWii'):
+        for language in languages:
+            for extra_lines in sizes:
+                report = make_report(1, language, console_type, extra_lines)
+                runner.measure('syscheck.analysis',
+                               {'console': console_type, 'language': language, 'lines': report.count('\n') + 1},
+                               lambda: get_syscheck_analysis(report, True, True))
+
+    # Keyword translation alone, each strategy forced on the packaged table and on one grown past
+    # LOOP_MAX_KEYWORDS, the threshold between the two
+    packaged = load_translations()
+    grown = {**packaged, 'bench': {f'Keyword {index:03d}': f'Word {index}' for index in range(256)}}
+    loop_max_keywords = translation.LOOP_MAX_KEYWORDS
+    translators = []
+    for limit in (sys.maxsize, 0):
+        translation.LOOP_MAX_KEYWORDS = limit
+        try:
+            translators += [KeywordTranslator(packaged), KeywordTranslator(grown)]
+        finally:
+            translation.LOOP_MAX_KEYWORDS = loop_max_keywords
+    for translator in translators:
+        for language in ('en', 'fr'):
+            report = make_report(1, language, 'Wii', sizes[-1])
+            runner.measure('syscheck.translate',
+                           {'keywords': len(translator._replacements),
+                            'strategy': 'regex' if translator._loop is None else 'replace',
+                            'language': language, 'lines': report.count('\n') + 1},
+                           lambda: translator.translate(report))
+
+def bench_database(runner, quick, workdir):
+    from libModMii.download import database
+
+    keys = [key for key, entry in database.get_database()['entries'].items() if entry.get('wadname')]
+
+    def cold():
+        database._database = None
+        database._entry_cache.clear()
+
+    def lookup_all():
+        for key in keys:
+            database.get_database_entry(key)
+
+    runner.measure('database.load', {}, database.get_database, number=1, setup=cold)
+    runner.measure('database.lookup', {'state': 'cold', 'entries': len(keys)}, lookup_all, number=1,
+                   setup=lambda: database._entry_cache.clear(), size=len(keys), unit_name='lookups/s')
+    runner.measure('database.lookup', {'state': 'warm', 'entries': len(keys)}, lookup_all,
+                   size=len(keys), unit_name='lookups/s')
+
+def _pattern_file(path, size):
+    # Deterministic non-repeating-looking content, written 1 MiB at a time
+    block = bytes((i * 131 + (i >> 8) * 7) & 0xFF for i in range(MB))
+    with open(path, 'wb') as f:
+        written = 0
+        while written < size:
+            chunk = block[:min(MB, size - written)]
+            f.write(chunk)
+            written += len(chunk)
+
+def bench_verify(runner, quick, workdir, sizes):
+    from libModMii.download.validation import HashIndex, md5_file, verify_file
+
+    hash_index = HashIndex(os.path.join(workdir, 'hashes.sqlite'))
+    for size_mb in sizes:
+        path = os.path.join(workdir, f'verify-{size_mb}.bin')
+        _pattern_file(path, size_mb * MB)
+        md5 = md5_file(path)
+        # Large files take long enough for a single call per repeat
+        runner.measure('verify.file', {'sizeMB': size_mb, 'hashIndex': False},
+                       lambda: verify_file(path, md5), number=1 if size_mb >= 100 else None, size=size_mb * MB)
+        # First call hashes and records the file, the measured ones only stat it
+        verify_file(path, md5, hash_index=hash_index)
+        runner.measure('verify.file', {'sizeMB': size_mb, 'hashIndex': True},
+                       lambda: verify_file(path, md5, hash_index=hash_index), size=size_mb * MB)
+        os.remove(path)
+
+def bench_cios(runner, quick, workdir):
+    from libModMii.download.cios_maps import get_cios_map
+    from libModMii.download.d2x_modules import get_module_store
+    from libModMii.download.wiipy.ciosbuild import build_cios
+    from title_fixtures import make_base_ios
+
+    cios_version = 'd2x-v11-beta3'
+    cios_map = get_cios_map()
+    modules = get_module_store()
+    for ios in ((56,) if quick else (37, 56, 58, 80)):
+        base = cios_map.get_base(cios_version, ios)
+        base_path = os.path.join(workdir, f'IOS{ios}-base.wad')
+        with open(base_path, 'wb') as f:
+            f.write(make_base_ios(base, seed=ios).dump_wad())
+        output = os.path.join(workdir, f'cIOS249[{ios}]-{cios_version}.wad')
+
+        def build():
+            with contextlib.redirect_stdout(io.StringIO()):
+                build_cios(base_path, cios_map, cios_version, modules, output, 249, 21011)
+
+        build()
+        if not os.path.exists(output):
+            raise Exception(f'build_cios did not produce {output}')
+        runner.measure('cios.build', {'cios': cios_version, 'base': ios}, build, number=1 if quick else None,
+                       size=os.path.getsize(base_path))
+
+def bench_nus(runner, quick, workdir):
+    from libModMii.download.nus_cache import NusCache
+    from libModMii.download.wiipy.nus import nus_title_download
+    from title_fixtures import FakeNus, make_title
+
+    content_counts = ((4, MB),) if quick else ((4, MB), (16, 256 * 1024), (2, 16 * MB))
+    titles = [make_title(f'00010001{index:08X}', 1, [os.urandom(size) for _ in range(count)])
+              for index, (count, size) in enumerate(content_counts)]
+    nus = FakeNus(titles)
+    try:
+        for title, (count, size) in zip(titles, content_counts):
+            tid, version = title.tmd.title_id, title.tmd.title_version
+            wad = os.path.join(workdir, f'{tid}.wad')
+            for max_workers in (1, 4):
+                params = {'contents': count, 'contentMB': size / MB, 'maxWorkers': max_workers}
+                runner.measure('nus.download', {**params, 'cache': 'none'},
+                               lambda: nus_title_download(tid, version, wad=wad, endpoint=nus.url, verbose=False,
+                                                          max_workers=max_workers),
+                               number=1 if quick else None, size=count * size)
+
+            cache = NusCache(os.path.join(workdir, 'nus-cache'))
+            cold_cache = lambda: cache.clear()
+            download = lambda: nus_title_download(tid, version, wad=wad, endpoint=nus.url, verbose=False,
+                                                  cache=cache, max_workers=4)
+            runner.measure('nus.download', {'contents': count, 'contentMB': size / MB, 'maxWorkers': 4,
+                                            'cache': 'cold'}, download, number=1, setup=cold_cache, size=count * size)
+            download()
+            runner.measure('nus.download', {'contents': count, 'contentMB': size / MB, 'maxWorkers': 4,
+                                            'cache': 'warm'}, download, size=count * size)
+    finally:
+        nus.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the libModMii benchmark suite.')
+    parser.add_argument('--output', help='Write the JSON results to this file (stdout by default)')
+    parser.add_argument('--only', help=f'Comma-separated suites to run, among {", ".join(SUITES)}')
+    parser.add_argument('--quick', action='store_true', help='Fewer cases and repeats, for a smoke run')
+    parser.add_argument('--sizes', default='1,10,100,500', help='verify_file sizes in MB (default: 1,10,100,500)')
+    parser.add_argument('--repeat', type=int, help='Repeats per case (default: 5, 3 with --quick)')
+    args = parser.parse_args(argv)
+
+    suites = args.only.split(',') if args.only else list(SUITES)
+    unknown = [suite for suite in suites if suite not in SUITES]
+    if unknown:
+        parser.error(f'unknown suites: {", ".join(unknown)}')
+    sizes = [int(size) for size in args.sizes.split(',')]
+    if args.quick and args.sizes == parser.get_default('sizes'):
+        sizes = [1, 10]
+
+    with tempfile.TemporaryDirectory(prefix='libmodmii-bench-') as workdir:
+        # Keep the default NUS cache, artifact cache, hash index and manifest out of the user's cache directory
+        os.environ['LIBMODMII_CACHE_DIR'] = os.path.join(workdir, 'cache')
+        runner = Runner(args.repeat or (3 if args.quick else 5), 0.05 if args.quick else 0.2)
+        started = time.perf_counter()
+        for suite in suites:
+            if suite == 'verify':
+                bench_verify(runner, args.quick, workdir, sizes)
+            else:
+                globals()[f'bench_{suite}'](runner, args.quick, workdir)
+        duration = time.perf_counter() - started
+
+    document = {
+        'schema': SCHEMA,
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpuCount': os.cpu_count(),
+        'quick': args.quick,
+        'duration': duration,
+        'results': runner.results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
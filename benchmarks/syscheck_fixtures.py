@@ -0,0 +1,80 @@
+"""Synthetic SysCheck reports for the benchmarks, in the layout and languages SysCheck produces."""
+import random
+
+# Revisions expected by the activeIOS rules
+WII_REVISIONS = {
+    9: 1034, 12: 526, 13: 1032, 14: 1032, 15: 1032, 17: 1032, 21: 1039, 22: 1294, 28: 1807, 31: 3608, 33: 3608,
+    34: 3608, 35: 3608, 36: 3608, 37: 5663, 38: 4124, 41: 3607, 43: 3607, 45: 3607, 46: 3607, 48: 4124, 53: 5663,
+    55: 5663, 56: 5662, 57: 5919, 58: 6176, 59: 9249, 61: 5662, 62: 6430, 80: 6944,
+}
+VWII_REVISIONS = {
+    9: 1290, 12: 782, 13: 1288, 14: 1288, 15: 1288, 17: 1288, 21: 1295, 22: 1550, 28: 2063, 31: 3864, 33: 3864,
+    34: 3864, 35: 3864, 36: 3864, 37: 5919, 38: 4380, 41: 3863, 43: 3863, 45: 3863, 46: 3863, 48: 4380, 53: 5919,
+    55: 5919, 56: 5918, 57: 6175, 59: 9249, 61: 5918, 62: 6942, 80: 7200,
+}
+# header, region, system menu, homebrew channel, console type, "No Patches", "NAND Access"
+LANGUAGES = {
+    'en': ("SysCheck HDE v2.4.0 by blackb0x", "Region: {region}", "System Menu 4.3{r} (v{smv})",
+           "Homebrew Channel 1.1.{hbc} running on IOS58", "Console Type: {ct}", "No Patches", "NAND Access"),
+    'fr': ("SysCheck ME v2.5.0 par blackb0x", "Region: {region}", "Menu Systeme 4.3{r} (v{smv})",
+           "Chaine Homebrew 1.1.{hbc} utilise IOS58", "Type de Console: {ct}", "Pas de patches", "Acces NAND"),
+    'de': ("SysCheck ME v2.5.0 von blackb0x", "Region: {region}", "Systemmenue 4.3{r} (v{smv})",
+           "Homebrewkanal 1.1.{hbc} benutzt IOS58", "Konsolentyp: {ct}", "Keine Patches", "NAND Zugriff"),
+    'it': ("SysCheck ME v2.5.0 di blackb0x", "Regione: {region}", "Menu di sistema 4.3{r} (v{smv})",
+           "Canale Homebrew 1.1.{hbc} appoggiato all'IOS58", "Tipo Console: {ct}", "Non patchato", "Accesso NAND"),
+    'es': ("SysCheck ME v2.5.0 por blackb0x", "Region: {region}", "Menu de Sistema 4.3{r} (v{smv})",
+           "Canal Homebrew 1.1.{hbc} ejecutandose en IOS58", "Tipo de consola: {ct}", "Sin Parches", "Acceso NAND"),
+}
+
+def make_report(seed: int, language: str = 'en', console_type: str = 'Wii', extra_lines: int = 0) -> str:
+    """Build a deterministic report; extra_lines appends that many stub IOS lines to grow the report."""
+    rnd = random.Random(seed)
+    header = LANGUAGES[language]
+    region, short = rnd.choice([('PAL', 'E'), ('NTSC-U', 'U'), ('NTSC-J', 'J'), ('KOR', 'K')])
+    lines = [
+        header[0], "...running on IOS58 (rev 6176).", "",
+        header[1].format(region=region),
+        header[2].format(r=short, smv=rnd.choice([514, 513, 518, 481, 450])),
+        "Priiloader installed" if rnd.random() < .5 else "",
+        header[3].format(hbc=rnd.choice([1, 2, 3])) if rnd.random() < .8 else "",
+        "",
+        header[4].format(ct=console_type),
+        "",
+    ]
+    revisions = WII_REVISIONS if console_type == 'Wii' else VWII_REVISIONS
+    prefix = 'v' if console_type == 'vWii' else ''
+    for slot, revision in sorted(revisions.items()):
+        roll = rnd.random()
+        if roll < .6:
+            lines.append(f"{prefix}IOS{slot} (rev {revision}): {header[5]}")
+        elif roll < .7:
+            lines.append(f"{prefix}IOS{slot} (rev {revision}): Trucha Bug, {header[6]}")
+        elif roll < .8:
+            lines.append(f"{prefix}IOS{slot} (rev {revision + 1}): {header[5]}")
+        elif roll < .9:
+            lines.append(f"{prefix}IOS{slot} (rev 65280): Stub")
+    for slot in (11, 20, 30, 40, 50, 52, 60, 70, 80):
+        roll = rnd.random()
+        if any(line.startswith(f"IOS{slot} ") for line in lines):
+            continue
+        if roll < .3:
+            lines.append(f"IOS{slot} (rev {rnd.choice([16174, 65535])}): Trucha Bug, {header[6]}")
+        elif roll < .6:
+            lines.append(f"IOS{slot}{'' if slot == 60 else '[60]'} (rev 65535, Info: ModMii-IOS60-v6174)")
+    for slot, base in ((248, 38), (249, 56), (250, 57), (251, 58)):
+        if rnd.random() < .7:
+            version = rnd.choice(['10-beta52', '11beta3', '10-beta53-alt'])
+            lines.append(f"{prefix}IOS{slot}[{base}] (rev 65535, Info: d2x-v{version}): Trucha Bug, {header[6]}")
+    if console_type == 'Wii' and rnd.random() < .7:
+        lines.append("BC v6")
+    if console_type == 'vWii':
+        if rnd.random() < .7:
+            lines.append(f"vIOS512 (rev 7): {header[5]}")
+        if rnd.random() < .7:
+            lines.append(f"vIOS513 (rev 1): {header[5]}")
+    if rnd.random() < .6:
+        lines.append("IOS254 (rev 65281): BootMii")
+    for index in range(extra_lines):
+        lines.append(f"{prefix}IOS{300 + index} (rev {index}): Stub")
+    lines.append("Report generated on 2025/07/30.")
+    return "\n".join(lines)
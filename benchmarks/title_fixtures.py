@@ -0,0 +1,147 @@
+"""Synthetic titles, base IOS and a local fake NUS server for the benchmarks, built with libWiiPy."""
+import hashlib
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, List, Optional
+import libWiiPy
+
+def _cert(sig_type: int, sig_len: int, issuer: str, key_type: int, key_len: int, child: str) -> bytes:
+    data = struct.pack(">I", sig_type) + b"\x00" * sig_len
+    data += b"\x00" * ((0x40 - len(data) % 0x40) % 0x40)
+    data += issuer.encode().ljust(0x40, b"\x00") + struct.pack(">I", key_type)
+    data += child.encode().ljust(0x40, b"\x00") + struct.pack(">I", 0) + b"\x01" * key_len + struct.pack(">I", 65537)
+    data += b"\x00" * ((0x40 - len(data) % 0x40) % 0x40)
+    return data
+
+def cert_chain() -> bytes:
+    """CA, CP and XS certificates with the real layout and dummy keys."""
+    return (_cert(0x00010000, 0x200, "Root", 1, 0x100, "CA00000001") +
+            _cert(0x00010001, 0x100, "Root-CA00000001", 1, 0x100, "CP00000004") +
+            _cert(0x00010001, 0x100, "Root-CA00000001", 1, 0x100, "XS00000003"))
+
+def _tmd(tid: str, version: int) -> bytes:
+    data = bytearray(0x1E4)
+    data[0:4] = struct.pack(">I", 0x00010001)
+    data[0x140:0x140 + 26] = b"Root-CA00000001-CP00000004"
+    data[0x18C:0x194] = bytes.fromhex(tid)
+    data[0x194:0x198] = b"\x00\x00\x00\x01"
+    data[0x1DC:0x1DE] = struct.pack(">H", version)
+    return bytes(data)
+
+def _ticket(tid: str) -> bytes:
+    data = bytearray(0x2A4)
+    data[0:4] = struct.pack(">I", 0x00010001)
+    data[0x140:0x140 + 26] = b"Root-CA00000001-XS00000003"
+    data[0x1BF:0x1CF] = hashlib.md5(tid.encode()).digest()
+    data[0x1DC:0x1E4] = bytes.fromhex(tid)
+    return bytes(data)
+
+def make_title(tid: str, version: int, contents: Iterable[bytes], cids: Optional[List[int]] = None):
+    """A libWiiPy Title with the given decrypted contents, encrypted with a title key derived from the title ID."""
+    title = libWiiPy.title.Title()
+    title.load_tmd(_tmd(tid, version))
+    title.load_ticket(_ticket(tid))
+    title.load_cert_chain(cert_chain())
+    title.load_content_records()
+    title_key = title.ticket.get_title_key()
+    for index, content in enumerate(contents):
+        title.add_enc_content(libWiiPy.title.encrypt_content(content, title_key, index),
+                              cids[index] if cids else index, index, libWiiPy.title.ContentType.NORMAL,
+                              len(content), hashlib.sha1(content).hexdigest().encode())
+    title.tmd.content_records = title.content.content_records
+    title.tmd.num_contents = len(title.content.content_records)
+    return title
+
+def make_base_ios(cios_base, seed: int = 0, min_size: int = 0x4000):
+    """
+    Base IOS matching a parsed cIOS map base (libModMii.download.cios_maps.CiosBase): same title ID, version and
+    content IDs, random contents with the map's original bytes at every patch offset, so build_cios() applies all
+    its patches.
+    """
+    rnd = random.Random(seed)
+    # Contents the build adds (tmdModuleId -1) are not part of the base
+    base_contents = sorted((content for content in cios_base.contents
+                            if content.module is None or content.tmdModuleId != -1), key=lambda c: c.cid)
+    data = []
+    for content in base_contents:
+        size = max([min_size] + [patch.offset + len(patch.originalBytes) + 16 for patch in content.patches])
+        buffer = bytearray(rnd.randbytes(size))
+        for patch in content.patches:
+            buffer[patch.offset:patch.offset + len(patch.originalBytes)] = patch.originalBytes
+        data.append(bytes(buffer))
+    return make_title(f"00000001{cios_base.ios:08X}", cios_base.version, data,
+                      [content.cid for content in base_contents])
+
+class FakeNus:
+    """
+    NUS look-alike on 127.0.0.1 serving the TMD, ticket and encrypted contents of the given titles, plus the
+    system titles nus_title_download() builds the cert chain from. Supports Range requests, an optional
+    per-request latency and random dropped connections.
+    """
+
+    def __init__(self, titles, latency: float = 0.0, drop_rate: float = 0.0, seed: int = 0):
+        rnd = random.Random(seed)
+        self.requests = 0
+        self.files = {}
+        chain = cert_chain()
+        ca, cp, xs = chain[:0x400], chain[0x400:0x700], chain[0x700:]
+        self.files["/0000000100000002/tmd.513"] = b"\x00" * 0x328 + cp
+        self.files["/0000000100000002/cetk"] = b"\x00" * 0x2A4 + xs + ca
+        for title in titles:
+            tid = title.tmd.title_id.lower()
+            self.files[f"/{tid}/tmd.{title.tmd.title_version}"] = title.tmd.dump()
+            self.files[f"/{tid}/tmd"] = title.tmd.dump()
+            self.files[f"/{tid}/cetk"] = title.ticket.dump()
+            for record in title.content.content_records:
+                self.files[f"/{tid}/{record.content_id:08x}"] = title.content.get_enc_content_by_index(record.index)
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _empty(self, status):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                server.requests += 1
+                if latency:
+                    time.sleep(latency)
+                data = server.files.get(self.path.lower())
+                if data is None:
+                    return self._empty(404)
+                start = 0
+                if self.headers.get("Range"):
+                    start = int(self.headers["Range"].split("=")[1].split("-")[0])
+                    if start >= len(data):
+                        return self._empty(416)
+                    self.send_response(206)
+                else:
+                    self.send_response(200)
+                body = data[start:]
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if drop_rate and len(body) > 1000 and rnd.random() < drop_rate:
+                    self.wfile.write(body[:len(body) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -1,189 +1,172 @@
+import argparse
+import hashlib
 import os
-import re
+import shutil
+import sys
 import requests
 import json
-from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from libModMii.download.database import DATABASE_JSON, diff_databases, write_database_index
+from libModMii.download.db_bat import parse_db_file
 
 # Download DB.bat from URL
 download_url = 'https://raw.githubusercontent.com/modmii/modmii.github.io/refs/heads/master/Support/subscripts/DB.bat'
 db_file_path = os.path.join(os.path.dirname(__file__), 'DB.bat')
+# ETag / Last-Modified of the last downloaded DB.bat, sent back to only download it again when it changed
+fetch_state_path = db_file_path + '.fetch.json'
+output_file_path = os.path.join(os.path.dirname(__file__), '../database/database.json')
+# libModMii loads database.json and its precompiled index from the package assets, not from ../database
+assets_dir_path = os.path.join(os.path.dirname(__file__), '../src/libModMii/assets')
+
+def _read_json(path):
+  try:
+    with open(path, 'r', encoding='utf-8') as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return None
+
+def download_db_file(url=download_url, path=db_file_path, state_path=fetch_state_path, force=False):
+  """
+  Downloads DB.bat to `path` with a conditional request.
 
-print('Downloading DB.bat...')
+  The ETag and Last-Modified headers of the previous download are kept in `state_path` and sent back as
+  If-None-Match / If-Modified-Since, so an unchanged DB.bat is not downloaded again. The headers of this download
+  are returned rather than saved: the caller saves them with `write_fetch_state` once database.json has been
+  regenerated, so a failed conversion is retried on the next run instead of being answered with a 304.
 
-response = requests.get(download_url)
-if response.status_code == 200:
-  with open(db_file_path, 'w', encoding='utf-8') as f:
+  Returns:
+    dict, bool or None: The fetch state to save if a new DB.bat was written, False if it did not change, None if
+    the download failed.
+  """
+  headers = {}
+  state = _read_json(state_path) or {}
+  if not force and os.path.exists(path):
+    if state.get('etag'):
+      headers['If-None-Match'] = state['etag']
+    if state.get('lastModified'):
+      headers['If-Modified-Since'] = state['lastModified']
+
+  print('Downloading DB.bat...')
+  response = requests.get(url, headers=headers)
+  if response.status_code == 304:
+    print('DB.bat not modified since the last download')
+    return False
+  if response.status_code != 200:
+    print('Download failed:', response.status_code)
+    return None
+  with open(path, 'w', encoding='utf-8') as f:
     f.write(response.text)
   print('Download completed!')
-else:
-  print('Download failed:', response.status_code)
-  exit(1)
+  return {'etag': response.headers.get('ETag'), 'lastModified': response.headers.get('Last-Modified')}
 
-def evaluate_variables(entry):
+def write_fetch_state(state, state_path=fetch_state_path):
   """
-  Evaluates and replaces variable placeholders in the values of a dictionary.
-
-  Iteratively searches for string values in the given dictionary `entry` that contain
-  variable placeholders in the format `%VAR_NAME%`. For each placeholder found, it replaces
-  it with the corresponding value from the dictionary. The process repeats until no more
-  replacements are made or a maximum number of iterations is reached to prevent infinite loops.
+  Saves the ETag / Last-Modified returned by `download_db_file`, sent back by the next download.
 
   Args:
-    entry (dict): The dictionary containing key-value pairs where values may include
-            variable placeholders.
-
-  Returns:
-    None: The function modifies the input dictionary in place.
+    state (dict): The fetch state returned by `download_db_file`.
+    state_path (str): Where to save it.
   """
-  changed = True
-  iterations = 0
-  max_iterations = 10
-  while changed and iterations < max_iterations:
-    changed = False
-    iterations += 1
-    for key in entry:
-      value = entry[key]
-      if isinstance(value, str) and '%' in value:
-        original_value = value
-        def repl(match):
-          var_name = match.group(1)
-          return str(entry.get(var_name, match.group(0)))
-        value = re.sub(r'%([^%]+)%', repl, value)
-        if value != original_value:
-          entry[key] = value
-          changed = True
-
-def categorize_entry(entry_id, entry):
-  """
-  Categorizes a given entry dictionary by adding a 'category' key based on its properties.
-
-  Parameters:
-    entry_id (str): The identifier for the entry.
-    entry (dict): The entry to categorize. May contain keys such as 'name', 'ciosslot', 'ciosversion',
-            'cIOSFamilyName', 'basecios', and 'diffpath'.
-
-  Behavior:
-    - If the entry already contains a 'category' key, no action is taken.
-    - If the entry's 'name' or entry_id contains 'd2x' (case-insensitive), sets entry['category'] to 'd2x'.
-    - If the entry's 'name' or entry_id contains 'cios' (case-insensitive), or if any of the following keys
-      are present and truthy in the entry: 'ciosslot', 'ciosversion', 'cIOSFamilyName', 'basecios', 'diffpath',
-      sets entry['category'] to 'cios'.
-  """
-  if 'category' in entry:
-    return
-  name = entry.get('name', '')
-  entry_id_lower = entry_id.lower()
-  name_lower = name.lower()
-  if 'd2x' in name_lower or 'd2x' in entry_id_lower:
-    entry['category'] = 'd2x'
-    return
-  if (
-    'cios' in name_lower or
-    'cios' in entry_id_lower or
-    entry.get('ciosslot') or
-    entry.get('ciosversion') or
-    entry.get('cIOSFamilyName') or
-    entry.get('basecios') or
-    entry.get('diffpath')
-  ):
-    entry['category'] = 'cios'
-    return
-
-def process_db_file():
+  with open(state_path, 'w', encoding='utf-8') as f:
+    json.dump(state, f)
+
+def write_database(database, output_path=output_file_path, assets_path=assets_dir_path):
   """
-  Parses a batch database file, extracts structured entries, and converts them to a JSON format.
+  Writes database.json to `output_path` and installs it into the package assets.
 
-  The function reads the batch file specified by `db_file_path`, processes its contents line by line,
-  and constructs a dictionary containing metadata and entries. It filters out irrelevant lines, identifies
-  entry labels, and extracts key-value pairs from 'set' commands within each entry. Entries are further
-  evaluated and categorized using helper functions `evaluate_variables` and `categorize_entry`.
-  Invalid or empty entries are removed before saving the final result.
+  The copy in `assets_path` is the one libModMii reads at runtime, its precompiled lookup index (database.pickle)
+  is written next to it. Without `assets_path` the index is written next to `output_path` instead.
 
-  The output JSON is written to '../database/database.json' relative to the script's location.
-  The function prints a summary upon completion.
+  Args:
+    database (dict): The database, as returned by `parse_db_file`.
+    output_path (str): Where to write database.json.
+    assets_path (str or None): The package assets directory to install database.json into.
+  """
+  os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+  with open(output_path, 'w', encoding='utf-8') as f:
+    json.dump(database, f, indent=2)
+  print(f'Output written to {output_path}')
+  installed_path = output_path
+  if assets_path is not None:
+    installed_path = os.path.join(assets_path, DATABASE_JSON)
+    if os.path.abspath(installed_path) != os.path.abspath(output_path):
+      shutil.copyfile(output_path, installed_path)
+      print(f'Installed to {installed_path}')
+  index_file_path = write_database_index(installed_path)
+  print(f'Precompiled index written to {index_file_path}')
+
+def process_db_file(path=db_file_path, output_path=output_file_path, force=False, assets_path=assets_dir_path):
+  """
+  Converts a DB.bat file into database.json, only rewriting it when something changed.
 
-  Side Effects:
-    - Writes the converted JSON data to a file.
-    - Prints conversion status and entry count to stdout.
+  Parsing, %VAR% expansion and categorization are done by `libModMii.download.db_bat.parse_db_file`, which
+  streams the file line by line. The SHA-1 of DB.bat is stored as `meta.sourceHash`: when it matches the current
+  database.json nothing is parsed. Otherwise the new entries are compared with the current ones. When neither an
+  entry nor the DB version changed, the current database.json is kept with only its `meta.sourceHash` updated, so
+  that the next run does not parse the same DB.bat again. The result is written with `write_database`.
 
-  Dependencies:
-    - Assumes existence of `db_file_path`, `evaluate_variables`, and `categorize_entry`.
-    - Uses `os`, `json`, `re`, and `datetime` modules.
+  Args:
+    path (str): The DB.bat file to convert.
+    output_path (str): Where to write database.json.
+    force (bool): Parse and rewrite even when nothing changed.
+    assets_path (str or None): The package assets directory to install database.json into, see `write_database`.
 
   Returns:
-    None
+    DatabaseDiff or None: The per-entry changes, None when DB.bat did not change at all.
   """
-  with open(db_file_path, 'r', encoding='utf-8') as f:
-    batch_content = f.read()
-  lines = [line.strip() for line in batch_content.split('\n') if line.strip()]
-  result = {
-    'meta': {
-      'DBversion': None,
-      'converted': datetime.utcnow().isoformat() + 'Z',
-      'source': 'DB.bat',
-      'creator': "https://github.com/xflak",
-    },
-    'entries': {}
-  }
-  current_entry = None
-  in_entry = False
-  for line in lines:
-    if line.startswith('set DBversion='):
-      result['meta']['DBversion'] = line.split('=', 1)[1]
-      continue
-    if (
-      'goto:' in line or
-      'if ' in line or
-      'call ' in line or
-      'move ' in line or
-      'exist ' in line or
-      line.startswith('::') or
-      'cls' in line or
-      'echo' in line
-    ):
-      continue
-    if line.startswith(':'):
-      label = line[1:]
-      if (
-        label in ['skip', 'DBend'] or
-        ' ' in label or
-        ':' in label or
-        'Rename' in label or
-        'download' in label
-      ):
-        in_entry = False
-        continue
-      current_entry = label
-      in_entry = True
-      result['entries'][current_entry] = {}
-      continue
-    if in_entry and current_entry and line.startswith('set '):
-      set_command = line[4:]
-      if set_command.startswith('"') and '=' in set_command and set_command.endswith('"'):
-        set_command = set_command[1:-1]
-      equal_index = set_command.find('=')
-      if equal_index != -1:
-        key = set_command[:equal_index]
-        value = set_command[equal_index + 1:]
-        value = re.sub(r'^"|"$', '', value)
-        if re.fullmatch(r'[0-9A-Fa-f]+', value) and len(value) > 4:
-          pass
-        elif value.isdigit():
-          value = int(value)
-        result['entries'][current_entry][key] = value
-  to_delete = []
-  for entry_key, entry in result['entries'].items():
-    evaluate_variables(entry)
-    categorize_entry(entry_key, entry)
-    if not entry or (len(entry) == 1 and entry.get('name') is None):
-      to_delete.append(entry_key)
-  for key in to_delete:
-    del result['entries'][key]
-  output_file_path = os.path.join(os.path.dirname(__file__), '../database/database.json')
-  os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
-  with open(output_file_path, 'w', encoding='utf-8') as f:
-    json.dump(result, f, indent=2)
-  print('Conversion completed! Output written to public/database.json')
-  print(f'Converted {len(result["entries"])} entries')
-
-process_db_file()
+  with open(path, 'rb') as f:
+    source_hash = hashlib.sha1(f.read()).hexdigest()
+  current = _read_json(output_path) or {'meta': {}, 'entries': {}}
+  if not force and current['meta'].get('sourceHash') == source_hash:
+    print('DB.bat unchanged, database.json is up to date')
+    return None
+
+  result = parse_db_file(path)
+  result['meta']['sourceHash'] = source_hash
+  diff = diff_databases(current, result)
+  print(f'{len(diff.added)} added, {len(diff.removed)} removed, {len(diff.changed)} changed entries')
+  if not force and not diff and current['meta'].get('DBversion') == result['meta']['DBversion']:
+    # Only whitespace or comments changed in DB.bat, keep the entries as they are
+    print('No entry changed, only updating the source hash of database.json')
+    current['meta']['sourceHash'] = source_hash
+    result = current
+  else:
+    print(f'Converted {len(result["entries"])} entries')
+
+  write_database(result, output_path, assets_path)
+  return diff
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Convert ModMii\'s DB.bat into database.json.')
+  parser.add_argument('db_file', nargs='?', help='Local DB.bat to convert (downloads the latest one when omitted)')
+  parser.add_argument('--output', default=output_file_path, help='database.json to update')
+  parser.add_argument('--assets', default=assets_dir_path,
+                      help='Package assets directory to install database.json and its index into')
+  parser.add_argument('--no-assets', dest='assets', action='store_const', const=None,
+                      help='Only write --output, with its index next to it')
+  parser.add_argument('--diff', help='Write the per-entry changes to this JSON file')
+  parser.add_argument('--force', action='store_true', help='Download, parse and rewrite even when nothing changed')
+  args = parser.parse_args(argv)
+
+  db_file = args.db_file
+  if db_file is None:
+    db_file = db_file_path
+    downloaded = download_db_file(force=args.force)
+    if downloaded is None:
+      return 1
+  else:
+    downloaded = False
+
+  # Run even when DB.bat was not modified: database.json may be missing or older than it, and the source hash
+  # check makes this cheap when it is up to date
+  diff = process_db_file(db_file, args.output, args.force, args.assets)
+  if downloaded:
+    write_fetch_state(downloaded)
+  if args.diff and diff is not None:
+    with open(args.diff, 'w', encoding='utf-8') as f:
+      json.dump(diff.to_dict(), f, indent=2)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -1,3 +1,12 @@
 # downloader package
 from .download import *
-from .database import *
\ No newline at end of file
+from .database import *
+from .nus_cache import NusCache, get_default_cache, set_default_cache
+from .validation import HashIndex, verify_file, get_default_hash_index, set_default_hash_index
+from .artifact_cache import ArtifactCache, get_default_artifact_cache, set_default_artifact_cache
+from .http_async import AsyncHttpClient, HttpError
+from .async_download import download_entry_async, nus_title_download_async
+from .plan import DownloadPlan, PlanStep, plan_downloads
+from .manifest import DownloadManifest, get_default_manifest, set_default_manifest
+from .invalidation import StaleFile, find_stale_files, stale_between, invalidate, invalidate_stale
+from .instrumentation import Count, MetricsCollector, Span, get_instrumentation, set_instrumentation
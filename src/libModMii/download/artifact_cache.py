@@ -0,0 +1,211 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from .cache_paths import get_cache_path, get_cache_root
+from .nus_cache import CacheItem
+from .validation import md5_file
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows, no reflink support
+    fcntl = None
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024  # 1 GiB
+
+ARTIFACT_SUFFIX = ".wad"
+METADATA_SUFFIX = ".json"
+
+# ioctl request to share a file's extents (btrfs, xfs, ...), the copy costs no extra space until either side changes
+_FICLONE = 0x40049409
+
+def artifact_key(inputs: Dict[str, Any]) -> str:
+    """Stable key for a build, from a JSON-serializable description of everything the output depends on."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+def _reflink(source: str, destination: str) -> None:
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+def link_or_copy(source: str, destination: str) -> str:
+    """
+    Make destination a copy of source as cheaply as the filesystem allows: hardlink, then reflink, then a plain
+    copy. The destination is replaced atomically. Returns the method used.
+    """
+    tmp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            os.link(source, tmp_path)
+            method = "hardlink"
+        except OSError:
+            try:
+                _reflink(source, tmp_path)
+                method = "reflink"
+            except OSError as error:
+                if error.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.EBADF):
+                    raise
+                shutil.copyfile(source, tmp_path)
+                method = "copy"
+        os.replace(tmp_path, destination)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return method
+
+class ArtifactCache:
+    """
+    Persistent cache of built WADs (d2x cIOS...) keyed by the hash of their build inputs.
+
+    Each artifact is stored as <key>.wad next to a <key>.json holding its provenance (build inputs, creation
+    time) and integrity data (size, md5). Reads refresh the artifact's mtime, used as the LRU order when the total
+    size goes over max_size.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: int = DEFAULT_MAX_SIZE):
+        self.path = path or get_cache_path("artifacts")
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _artifact_path(self, key: str) -> str:
+        return os.path.join(self.path, key + ARTIFACT_SUFFIX)
+
+    def _metadata_path(self, key: str) -> str:
+        return os.path.join(self.path, key + METADATA_SUFFIX)
+
+    def metadata(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._metadata_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, key: str, verify: bool = False) -> Optional[str]:
+        """
+        Path of the cached artifact, or None. The size is always checked against the metadata, verify=True also
+        checks the md5. A damaged artifact is evicted.
+        """
+        artifact_path = self._artifact_path(key)
+        metadata = self.metadata(key)
+        try:
+            stat = os.stat(artifact_path)
+        except OSError:
+            return None
+        if metadata is None or stat.st_size != metadata.get("size") or (
+                verify and md5_file(artifact_path) != metadata.get("md5")):
+            self.evict(key)
+            return None
+        os.utime(artifact_path)
+        return artifact_path
+
+    def put(self, key: str, file_path: str, inputs: Optional[Dict[str, Any]] = None) -> str:
+        artifact_path = self._artifact_path(key)
+        link_or_copy(file_path, artifact_path)
+        metadata = {
+            "key": key,
+            "inputs": inputs or {},
+            "source": os.path.abspath(file_path),
+            "size": os.path.getsize(artifact_path),
+            "md5": md5_file(artifact_path),
+            "created": time.time(),
+        }
+        tmp_path = f"{self._metadata_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_path, self._metadata_path(key))
+
+        if self.max_size is not None and self.size() > self.max_size:
+            self.prune()
+        return artifact_path
+
+    def restore(self, key: str, destination: str, verify: bool = False) -> Optional[str]:
+        """Place the cached artifact at destination. Returns the method used, None on a cache miss."""
+        artifact_path = self.get(key, verify)
+        if artifact_path is None:
+            return None
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        return link_or_copy(artifact_path, destination)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._artifact_path(key)) and os.path.exists(self._metadata_path(key))
+
+    def evict(self, key: str) -> None:
+        for item_path in (self._artifact_path(key), self._metadata_path(key)):
+            try:
+                os.remove(item_path)
+            except OSError:
+                pass
+
+    def items(self) -> List[CacheItem]:
+        items = []
+        with os.scandir(self.path) as it:
+            for dir_entry in it:
+                if not dir_entry.is_file() or not dir_entry.name.endswith(ARTIFACT_SUFFIX):
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+                items.append(CacheItem(
+                    key=dir_entry.name[:-len(ARTIFACT_SUFFIX)], size=stat.st_size, last_used=stat.st_mtime
+                ))
+        return items
+
+    def size(self) -> int:
+        return sum(item.size for item in self.items())
+
+    def prune(self, max_size: Optional[int] = None) -> List[str]:
+        """Evict least recently used artifacts until the cache fits in max_size. Returns the evicted keys."""
+        limit = self.max_size if max_size is None else max_size
+        with self._lock:
+            items = sorted(self.items(), key=lambda item: item.last_used)
+            total = sum(item.size for item in items)
+            evicted = []
+            for item in items:
+                if limit is not None and total <= limit:
+                    break
+                self.evict(item.key)
+                total -= item.size
+                evicted.append(item.key)
+        return evicted
+
+    def clear(self) -> List[str]:
+        return self.prune(0)
+
+
+_default_cache = None
+_default_cache_disabled = False
+_default_cache_lock = threading.Lock()
+
+def get_default_artifact_cache() -> Optional[ArtifactCache]:
+    """
+    Return the process-wide build artifact cache used by download_entry(), or None if it was disabled with
+    set_default_artifact_cache(None) or cannot be created.
+    """
+    global _default_cache, _default_cache_disabled
+    if _default_cache_disabled:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None and not _default_cache_disabled:
+            try:
+                _default_cache = ArtifactCache()
+            except OSError as error:
+                logger.warning("Build artifact cache disabled, cannot create it under %s: %s", get_cache_root(), error)
+                _default_cache_disabled = True
+                return None
+        return _default_cache
+
+def set_default_artifact_cache(cache: Optional[ArtifactCache]) -> None:
+    global _default_cache, _default_cache_disabled
+    with _default_cache_lock:
+        _default_cache = cache
+        _default_cache_disabled = cache is None
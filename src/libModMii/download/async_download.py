@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+import libWiiPy
+from .http_async import AsyncHttpClient, HttpError
+from .transfer import atomic_write_bytes, download_file_async, fetch_bytes_async
+from .wiipy.nus import (NUS_ENDPOINT, NUS_ENDPOINT_WIIU, NUS_HEADERS, encrypted_content_size, strip_tmd, strip_ticket,
+                        assemble_cert_chain, _content_matches, _evict_title)
+from .nus_cache import NusCache, tmd_key, ticket_key, content_key, CERT_CHAIN_KEY, get_default_cache
+from .osc_download import OSC_URL
+from .database import get_database_entry, DatabaseEntry
+from .download import (_in_flight, _is_cached, is_built_entry, _build_entry, _download_tags, _record_file,
+                       _restore_artifact, _store_artifact, _verify)
+from .locking import FileLock, lock_path
+from .instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+async def _exclusive_async(file_path: str, fn):
+    # Same in-flight map and lock files as download._exclusive(), sync and async callers dedupe with each other
+    key = os.path.abspath(file_path)
+
+    async def locked():
+        async with FileLock(lock_path(key)):
+            return await fn()
+
+    return await _in_flight.do_async(key, locked)
+
+async def _cached_fetch(cache: Optional[NusCache], key: str, fetch) -> bytes:
+    # Cache reads and writes are disk I/O, keep them off the event loop
+    if cache is not None:
+        data = await asyncio.to_thread(cache.get, key)
+        if data is not None:
+            return data
+    data = await fetch()
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, data)
+    return data
+
+async def _fetch_content(client: AsyncHttpClient, cache: Optional[NusCache], tid: str, content_record,
+                         endpoint: str) -> bytes:
+    url = f"{endpoint}{tid}/{content_record.content_id:08x}"
+    expected_size = encrypted_content_size(content_record.content_size)
+    if cache is None:
+        return await fetch_bytes_async(client, url, NUS_HEADERS, expected_size)
+    # Downloaded straight into the cache, an interrupted transfer resumes from its .part file
+    return await cache.fetch_file_async(
+        content_key(tid, content_record),
+        lambda path: download_file_async(client, url, path, NUS_HEADERS, expected_size))
+
+async def _fetch_cert_chain(client: AsyncHttpClient, endpoint: str) -> bytes:
+    tmd, cetk = await asyncio.gather(
+        fetch_bytes_async(client, endpoint + "0000000100000002/tmd.513", NUS_HEADERS),
+        fetch_bytes_async(client, endpoint + "0000000100000002/cetk", NUS_HEADERS)
+    )
+    return assemble_cert_chain(tmd, cetk)
+
+async def nus_title_download_async(tid: str, version: Optional[int], wad: str, client: AsyncHttpClient,
+                                   cache: Optional[NusCache] = None, endpoint: Optional[str] = None,
+                                   wii: bool = False) -> str:
+    """
+    Download a title from the NUS and pack it as a WAD, with the ticket, cert chain and every content fetched
+    concurrently over client. version None downloads the latest version, like nus_title_download(). Returns the
+    WAD path.
+    """
+    endpoint = endpoint or (NUS_ENDPOINT if wii else NUS_ENDPOINT_WIIU)
+    title_url = f"{endpoint}{tid}/"
+
+    async def fetch_tmd() -> bytes:
+        # The latest TMD is never cached, its version is only known once it is downloaded
+        tmd_url = f"{title_url}tmd" if version is None else f"{title_url}tmd.{version}"
+        return strip_tmd(await fetch_bytes_async(client, tmd_url, NUS_HEADERS))
+
+    async def fetch_ticket() -> bytes:
+        return strip_ticket(await fetch_bytes_async(client, f"{title_url}cetk", NUS_HEADERS))
+
+    title = libWiiPy.title.Title()
+    with span("nus.tmd", tid=tid):
+        title.load_tmd(await _cached_fetch(cache if version is not None else None, tmd_key(tid, version), fetch_tmd))
+    title.load_content_records()
+    version = title.tmd.title_version
+
+    content_fetches = [_fetch_content(client, cache, tid, record, endpoint) for record in title.tmd.content_records]
+    try:
+        # Ticket and cert chain are fetched alongside the contents, they are part of this span
+        with span("nus.contents", contents=len(content_fetches)) as contents_span:
+            ticket, cert_chain, *contents = await asyncio.gather(
+                _cached_fetch(cache, ticket_key(tid), fetch_ticket),
+                _cached_fetch(cache, CERT_CHAIN_KEY, lambda: _fetch_cert_chain(client, endpoint)),
+                *content_fetches
+            )
+            contents_span.set(bytes=sum(len(data) for data in contents))
+    except HttpError as error:
+        raise ValueError(f"NUS download of {tid} v{version} failed: {error}") from error
+
+    def load() -> list:
+        title.load_ticket(ticket)
+        title.load_cert_chain(cert_chain)
+        if cache is None:
+            return []
+        title_key = title.ticket.get_title_key()
+        # Positions in contents, which follow the TMD records (a record's index is not necessarily its position)
+        return [position for position, (record, data) in enumerate(zip(title.tmd.content_records, contents))
+                if not _content_matches(record, data, title_key)]
+
+    mismatched = await asyncio.to_thread(load)
+    for position in mismatched:
+        record = title.tmd.content_records[position]
+        # Fetch it from the NUS again, once
+        await asyncio.to_thread(cache.evict, content_key(tid, record))
+        data = await _fetch_content(client, cache, tid, record, endpoint)
+        if not await asyncio.to_thread(_content_matches, record, data, title.ticket.get_title_key()):
+            await asyncio.to_thread(_evict_title, cache, tid, version, record)
+            raise ValueError(f"Content {record.content_id:08x} of {tid} does not match its TMD")
+        contents[position] = data
+
+    def pack() -> None:
+        title.content.content_list = list(contents)
+        atomic_write_bytes(wad, title.dump_wad())
+
+    with span("nus.pack"):
+        await asyncio.to_thread(pack)
+    return wad
+
+async def osc_download_async(database_entry: DatabaseEntry, file_path: str, client: AsyncHttpClient) -> str:
+    file_url = f"{OSC_URL}{database_entry.code1}/{database_entry.code1}.zip"
+    logger.info("Downloading %s from %s...", database_entry.wadname, file_url)
+    with span("osc.download"):
+        await download_file_async(client, file_url, file_path)
+    logger.info("OSC download process completed")
+    return file_path
+
+async def download_base_wad_async(database_entry: DatabaseEntry, output_path: str, client: AsyncHttpClient) -> str:
+    base_entry_path = os.path.join(output_path, database_entry.basewad) + ".wad"
+    with span("base", basewad=database_entry.basewad):
+        await _exclusive_async(base_entry_path,
+                               lambda: _download_base_wad_async(database_entry, base_entry_path, client))
+    await asyncio.to_thread(_record_file, base_entry_path, database_entry.basewad, database_entry, "base")
+    return base_entry_path
+
+async def _download_base_wad_async(database_entry: DatabaseEntry, base_entry_path: str,
+                                   client: AsyncHttpClient) -> str:
+    if await asyncio.to_thread(_is_cached, base_entry_path, database_entry.md5base, database_entry.md5basealt,
+                               "base"):
+        logger.info("Base WAD %s already exists in cache", database_entry.basewad)
+        return base_entry_path
+
+    await nus_title_download_async(f"{database_entry.code1}{database_entry.code2}", database_entry.version,
+                                   base_entry_path, client, cache=get_default_cache())
+    logger.info("Base WAD downloaded: %s", database_entry.basewad)
+    await asyncio.to_thread(_verify, base_entry_path, database_entry.md5base, database_entry.md5basealt, "base")
+    return base_entry_path
+
+async def download_entry_async(entry: str, output_path: str,
+                               client: Optional[AsyncHttpClient] = None) -> Dict[str, Any]:
+    """
+    asyncio counterpart of download_entry(). Network transfers share client's connection pool (a private client is
+    used when none is given); hashing and cIOS builds run in worker threads.
+    """
+    if client is None:
+        async with AsyncHttpClient() as own_client:
+            return await download_entry_async(entry, output_path, own_client)
+
+    database_entry = get_database_entry(entry)
+    if not database_entry:
+        raise Exception(f"No entry found in database for {entry}")
+
+    entry_path = os.path.join(output_path, database_entry.wadname)
+    with _download_tags(entry, database_entry), span("download") as download_span:
+        result = dict(await _exclusive_async(
+            entry_path, lambda: _download_entry_async(database_entry, output_path, entry_path, client, download_span)))
+    await asyncio.to_thread(_record_file, entry_path, entry, database_entry)
+    return result
+
+async def _download_entry_async(database_entry: DatabaseEntry, output_path: str, entry_path: str,
+                                client: AsyncHttpClient, download_span) -> Dict[str, Any]:
+    logger.info("Downloading: %s", database_entry.wadname)
+
+    if await asyncio.to_thread(_is_cached, entry_path, database_entry.md5, database_entry.md5alt):
+        logger.info("WAD %s already exists in cache", database_entry.wadname)
+        download_span.set(result="cached")
+        return {
+            "wadname": database_entry.wadname,
+            "outputPath": output_path
+        }
+
+    if not database_entry.category and not database_entry.ciosslot:
+        raise Exception(f"Unsupported category for download: {database_entry.category}")
+
+    built_from = None
+
+    if database_entry.category == "ios":
+        await nus_title_download_async(f"{database_entry.code1}{database_entry.code2}", database_entry.version,
+                                       entry_path, client, cache=get_default_cache())
+        download_span.set(result="downloaded")
+    elif database_entry.category == "OSC":
+        await osc_download_async(database_entry, entry_path, client)
+        download_span.set(result="downloaded")
+    elif is_built_entry(database_entry):
+        if await asyncio.to_thread(_restore_artifact, database_entry, entry_path):
+            download_span.set(result="restored")
+        else:
+            base_entry_path = await download_base_wad_async(database_entry, output_path, client)
+            if os.path.exists(entry_path):
+                os.remove(entry_path)
+            await asyncio.to_thread(_build_entry, database_entry, entry_path, base_entry_path)
+            built_from = base_entry_path
+            download_span.set(result="built")
+
+    if not entry_path or not os.path.exists(entry_path):
+        raise Exception(f"File was not created after download: {database_entry.wadname}")
+
+    if database_entry.md5:
+        await asyncio.to_thread(_verify, entry_path, database_entry.md5, database_entry.md5alt)
+
+    if built_from:
+        await asyncio.to_thread(_store_artifact, database_entry, entry_path, built_from)
+
+    logger.info("Download completed: %s", database_entry.wadname)
+    return {
+        "wadname": database_entry.wadname,
+        "outputPath": output_path
+    }
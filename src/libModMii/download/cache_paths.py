@@ -0,0 +1,10 @@
+import os
+
+DEFAULT_CACHE_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "libModMii")
+
+def get_cache_root() -> str:
+    # All persistent caches live under LIBMODMII_CACHE_DIR when it is set
+    return os.environ.get("LIBMODMII_CACHE_DIR") or DEFAULT_CACHE_ROOT
+
+def get_cache_path(name: str) -> str:
+    return os.path.join(get_cache_root(), name)
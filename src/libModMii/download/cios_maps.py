@@ -0,0 +1,103 @@
+import os
+import importlib.resources
+import threading
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+# Get the path to the d2xModules folder inside assets
+d2x_modules = str(importlib.resources.files('libModMii.assets').joinpath('d2xModules'))
+
+CIOS_MAP = os.path.join(d2x_modules, "ciosmaps.xml")
+CIOS_MAP_VWII = os.path.join(d2x_modules, "ciosmaps_vWii.xml")
+
+@dataclass(frozen=True, slots=True)
+class CiosPatch:
+    offset: int
+    originalBytes: bytes
+    newBytes: bytes
+
+@dataclass(frozen=True, slots=True)
+class CiosContent:
+    cid: int
+    patches: Tuple[CiosPatch, ...] = ()
+    # Name of the d2x module (without ".app") that replaces or is added as this content
+    module: Optional[str] = None
+    # TMD index of the content the module replaces, -1 when the module is added as a new content
+    tmdModuleId: Optional[int] = None
+
+@dataclass(frozen=True, slots=True)
+class CiosBase:
+    ios: int
+    version: int
+    # In map order, the build applies them in that order
+    contents: Tuple[CiosContent, ...]
+
+@dataclass(frozen=True)
+class CiosMap:
+    """
+    Parsed cIOS map: cIOS name -> base IOS number -> contents, with patch bytes already decoded.
+
+    Only holds plain tuples and bytes, so it pickles cheaply and can be handed to worker processes.
+    """
+    path: str
+    mtime_ns: int
+    cios: Dict[str, Dict[int, CiosBase]]
+
+    def get_base(self, cios_version: str, ios: int) -> Optional[CiosBase]:
+        return self.cios.get(cios_version, {}).get(ios)
+
+def decode_patch_bytes(value: str) -> bytes:
+    # "0x49,0x4F,0x53" -> b"IOS", decoded in a single call instead of byte by byte
+    return bytes.fromhex("".join(byte.strip()[2:] for byte in value.split(",")))
+
+def _parse_content(content: ET.Element) -> CiosContent:
+    tmd_module_id = content.get("tmdmoduleid")
+    return CiosContent(
+        cid=int(content.get("id"), 16),
+        patches=tuple(
+            CiosPatch(
+                offset=int(patch.get("offset"), 16),
+                originalBytes=decode_patch_bytes(patch.get("originalbytes")),
+                newBytes=decode_patch_bytes(patch.get("newbytes"))
+            )
+            for patch in content.findall("patch")
+        ),
+        module=content.get("module"),
+        tmdModuleId=int(tmd_module_id, 16) if tmd_module_id is not None else None
+    )
+
+def load_cios_map(path: str) -> CiosMap:
+    mtime_ns = os.stat(path).st_mtime_ns
+    cios = {}
+    for group in ET.parse(path).getroot():
+        bases = cios.setdefault(group.get("name"), {})
+        for base in group:
+            ios = int(base.get("ios"))
+            bases.setdefault(ios, CiosBase(
+                ios=ios,
+                version=int(base.get("version")),
+                contents=tuple(_parse_content(content) for content in base.findall("content"))
+            ))
+    return CiosMap(path=path, mtime_ns=mtime_ns, cios=cios)
+
+
+_cios_maps: Dict[str, CiosMap] = {}
+_cios_maps_lock = threading.Lock()
+
+def get_cios_map(path: str = CIOS_MAP) -> CiosMap:
+    """Parsed map for path, loaded once per process and reloaded when the file's mtime changes."""
+    path = os.path.abspath(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    cios_map = _cios_maps.get(path)
+    if cios_map is None or cios_map.mtime_ns != mtime_ns:
+        with _cios_maps_lock:
+            cios_map = _cios_maps.get(path)
+            if cios_map is None or cios_map.mtime_ns != mtime_ns:
+                cios_map = load_cios_map(path)
+                _cios_maps[path] = cios_map
+    return cios_map
+
+def get_d2x_cios_map(cios_version: str) -> CiosMap:
+    # vWii cIOS ("d2x-v11-beta3-vWii") are only described in the vWii map
+    return get_cios_map(CIOS_MAP_VWII if cios_version.endswith("-vWii") else CIOS_MAP)
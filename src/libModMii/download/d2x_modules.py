@@ -0,0 +1,88 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+from typing import Dict, Optional, Union
+from .cios_maps import d2x_modules
+
+MODULES_MANIFEST = "modules.json"
+
+ModuleBuffer = Union[bytes, memoryview]
+
+class ModuleStore:
+    """
+    Read-only store of the d2x .app modules found in a directory.
+
+    Each module is read (or mapped with use_mmap) once, checked against the size and md5 listed in the
+    directory's modules.json manifest, then served from memory to every build.
+    """
+
+    def __init__(self, path: str = d2x_modules, use_mmap: bool = False):
+        self.path = path
+        self.use_mmap = use_mmap
+        self.manifest = self._load_manifest()
+        self._modules: Dict[str, ModuleBuffer] = {}
+        self._md5s: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        manifest_path = os.path.join(self.path, MODULES_MANIFEST)
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)["modules"]
+
+    def _load(self, name: str) -> ModuleBuffer:
+        module_path = os.path.join(self.path, name + ".app")
+        if not os.path.exists(module_path):
+            raise Exception(f"A required module \"{name}\" could not be found!")
+
+        with open(module_path, "rb") as f:
+            if self.use_mmap and os.fstat(f.fileno()).st_size:
+                data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            else:
+                data = f.read()
+
+        expected = self.manifest.get(name)
+        if expected is not None:
+            if len(data) != expected["size"] or hashlib.md5(data).hexdigest() != expected["md5"]:
+                raise Exception(f"Module \"{name}\" does not match its manifest entry, the d2x modules are corrupted")
+        return data
+
+    def get(self, name: str) -> ModuleBuffer:
+        """Module content as an immutable buffer (bytes, or a read-only memoryview when use_mmap is set)."""
+        module = self._modules.get(name)
+        if module is None:
+            with self._lock:
+                module = self._modules.get(name)
+                if module is None:
+                    module = self._load(name)
+                    self._modules[name] = module
+        return module
+
+    def md5(self, name: str) -> str:
+        module_md5 = self._md5s.get(name)
+        if module_md5 is None:
+            module_md5 = hashlib.md5(self.get(name)).hexdigest()
+            self._md5s[name] = module_md5
+        return module_md5
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._modules or os.path.exists(os.path.join(self.path, name + ".app"))
+
+
+_module_stores: Dict[str, ModuleStore] = {}
+_module_stores_lock = threading.Lock()
+
+def get_module_store(path: Optional[str] = None) -> ModuleStore:
+    """Process-wide ModuleStore for path (the packaged d2x modules by default)."""
+    path = os.path.abspath(path or d2x_modules)
+    store = _module_stores.get(path)
+    if store is None:
+        with _module_stores_lock:
+            store = _module_stores.get(path)
+            if store is None:
+                store = ModuleStore(path)
+                _module_stores[path] = store
+    return store
@@ -1,9 +1,33 @@
 import os
-import importlib.resources
+import hashlib
+from typing import Any, Dict
+from .cios_maps import get_d2x_cios_map
+from .d2x_modules import get_module_store
 from .wiipy.ciosbuild import build_cios
 
-# Get the path to the d2xModules folder inside assets
-d2x_modules = str(importlib.resources.files('libModMii.assets').joinpath('d2xModules'))
+def _d2x_cios_version(entry) -> str:
+    return entry.wadname[12:].replace('.wad', '')
+
+def d2x_build_inputs(entry, base_md5: str) -> Dict[str, Any]:
+    """Everything a d2x cIOS build depends on, the key of the build in the artifact cache."""
+    cios_version = _d2x_cios_version(entry)
+    cios_base = get_d2x_cios_map(cios_version).get_base(cios_version, int(entry.code2, 16))
+    if cios_base is None:
+        raise Exception(f"No cIOS map entry for {cios_version} on base IOS{int(entry.code2, 16)}")
+    module_store = get_module_store()
+    return {
+        "type": "d2x",
+        "ciosVersion": cios_version,
+        "baseMd5": base_md5,
+        # The parsed base entry only holds ints, strings and bytes, its repr is stable across runs
+        "mapEntry": hashlib.sha1(repr(cios_base).encode()).hexdigest(),
+        "modules": {
+            content.module: module_store.md5(content.module)
+            for content in cios_base.contents if content.module is not None
+        },
+        "slot": entry.ciosslot,
+        "version": entry.ciosversion,
+    }
 
 def buildD2XCios(entry, output_path, base_wad_path):
     if not entry.ciosslot or not entry.ciosversion:
@@ -11,7 +35,7 @@ def buildD2XCios(entry, output_path, base_wad_path):
     if not os.path.exists(base_wad_path):
         raise Exception(f"Base WAD file not found: {base_wad_path}")
     
-    cios_map_path = os.path.join(d2x_modules, "ciosmaps.xml")
-    cios_version = entry.wadname[12:].replace('.wad', '')
+    cios_version = _d2x_cios_version(entry)
+    cios_map = get_d2x_cios_map(cios_version)
 
-    return build_cios(base_wad_path, cios_map_path, cios_version, d2x_modules, output_path, entry.ciosslot, entry.ciosversion)
\ No newline at end of file
+    return build_cios(base_wad_path, cios_map, cios_version, get_module_store(), output_path, entry.ciosslot, entry.ciosversion)
\ No newline at end of file
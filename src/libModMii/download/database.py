@@ -1,10 +1,13 @@
 import json
+import hashlib
 import importlib.resources
 import os
-from dataclasses import dataclass
-from typing import Optional, Union
+import pickle
+import threading
+from dataclasses import dataclass, field, fields
+from typing import Any, Optional, Union, Dict, List, Tuple
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DatabaseEntry:
     name: str
     wadname: str
@@ -29,18 +32,168 @@ class DatabaseEntry:
     cIOSversionNum: Optional[int] = None
 
 
-# Load the database.json from the assets folder using importlib.resources
-with importlib.resources.files('libModMii.assets').joinpath('database.json').open('r', encoding='utf-8') as f:
-    database = json.load(f)
+# Bump when the layout produced by build_database_index() changes, so stale precompiled indexes are ignored
+DATABASE_INDEX_VERSION = 1
+
+DATABASE_JSON = 'database.json'
+DATABASE_INDEX = 'database.pickle'
+
+_database = None
+_database_lock = threading.Lock()
+
+# DatabaseEntry objects are immutable, so each key is only built once per loaded database
+_entry_cache: Dict[str, DatabaseEntry] = {}
+_entry_fields = frozenset(field.name for field in fields(DatabaseEntry))
+
+def _normalize_wadname(wadname: str) -> str:
+    return wadname if os.path.splitext(wadname)[1] else wadname + '.wad'
+
+def _title_id(entry_data: dict) -> Optional[str]:
+    code1 = entry_data.get('code1')
+    code2 = entry_data.get('code2')
+    if not isinstance(code1, str) or not isinstance(code2, str):
+        return None
+    return f"{code1}{code2}".lower()
+
+def build_database_index(database: dict, source_hash: Optional[str] = None) -> dict:
+    """
+    Build the in-memory form of the database: the raw entries plus secondary indexes mapping a wadname,
+    category, title ID (code1 + code2) or basewad to the keys of the entries that use it.
+    """
+    by_wadname: Dict[str, List[str]] = {}
+    by_category: Dict[str, List[str]] = {}
+    by_title_id: Dict[str, List[str]] = {}
+    by_basewad: Dict[str, List[str]] = {}
+    for key, entry_data in database['entries'].items():
+        if entry_data.get('wadname'):
+            by_wadname.setdefault(_normalize_wadname(entry_data['wadname']), []).append(key)
+        if entry_data.get('category'):
+            by_category.setdefault(entry_data['category'], []).append(key)
+        title_id = _title_id(entry_data)
+        if title_id:
+            by_title_id.setdefault(title_id, []).append(key)
+        if entry_data.get('basewad'):
+            by_basewad.setdefault(entry_data['basewad'], []).append(key)
+
+    return {
+        'indexVersion': DATABASE_INDEX_VERSION,
+        'sourceHash': source_hash,
+        'meta': database.get('meta', {}),
+        'entries': database['entries'],
+        'byWadname': by_wadname,
+        'byCategory': by_category,
+        'byTitleId': by_title_id,
+        'byBasewad': by_basewad,
+    }
+
+def write_database_index(database_json_path: str, index_path: Optional[str] = None) -> str:
+    """Precompile a database.json into the pickled index loaded at runtime. Returns the index path."""
+    with open(database_json_path, 'rb') as f:
+        raw = f.read()
+    index = build_database_index(json.loads(raw), hashlib.sha1(raw).hexdigest())
+    if index_path is None:
+        index_path = os.path.join(os.path.dirname(database_json_path), DATABASE_INDEX)
+    with open(index_path, 'wb') as f:
+        pickle.dump(index, f, protocol=4)
+    return index_path
+
+def _load_database() -> dict:
+    assets = importlib.resources.files('libModMii.assets')
+    raw = assets.joinpath(DATABASE_JSON).read_bytes()
+    source_hash = hashlib.sha1(raw).hexdigest()
+
+    # Prefer the precompiled index generated by scripts/generate_database.py, as long as it was built from this
+    # exact database.json
+    index_file = assets.joinpath(DATABASE_INDEX)
+    if index_file.is_file():
+        try:
+            index = pickle.loads(index_file.read_bytes())
+            if index.get('indexVersion') == DATABASE_INDEX_VERSION and index.get('sourceHash') == source_hash:
+                return index
+        except Exception:
+            pass
+
+    return build_database_index(json.loads(raw), source_hash)
+
+def get_database() -> dict:
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _entry_cache.clear()
+                _database = _load_database()
+    return _database
+
+def _build_database_entry(entry_data: dict) -> DatabaseEntry:
+    # Only keep the fields modelled by DatabaseEntry, some entries carry extra DB.bat keys (mym1, path1, ...)
+    values = {key: value for key, value in entry_data.items() if key in _entry_fields}
+    if values.get('wadname'):
+        values['wadname'] = _normalize_wadname(values['wadname'])
+    return DatabaseEntry(**values)
 
 def get_database_entry(entry: str) -> DatabaseEntry:
-    entry_data = database['entries'].get(entry)
+    database_entry = _entry_cache.get(entry)
+    if database_entry is not None:
+        return database_entry
+
+    entry_data = get_database()['entries'].get(entry)
     if not entry_data:
         raise ValueError(f'Entry "{entry}" not found in the database.')
-    if entry_data and not os.path.splitext(entry_data['wadname'])[1]:
-        entry_data['wadname'] += '.wad'
-    return DatabaseEntry(**entry_data)
+    return _entry_cache.setdefault(entry, _build_database_entry(entry_data))
 
 
 def get_all_entries() -> dict:
-    return database['entries']
\ No newline at end of file
+    return get_database()['entries']
+
+def get_database_version() -> Optional[str]:
+    return get_database()['meta'].get('DBversion')
+
+def get_entry_keys_by_wadname(wadname: str) -> List[str]:
+    return list(get_database()['byWadname'].get(_normalize_wadname(wadname), []))
+
+def get_entry_keys_by_category(category: str) -> List[str]:
+    return list(get_database()['byCategory'].get(category, []))
+
+def get_entry_keys_by_title_id(title_id: str) -> List[str]:
+    return list(get_database()['byTitleId'].get(title_id.lower(), []))
+
+def get_entry_keys_by_basewad(basewad: str) -> List[str]:
+    if basewad.endswith('.wad'):
+        basewad = basewad[:-4]
+    return list(get_database()['byBasewad'].get(basewad, []))
+
+@dataclass
+class DatabaseDiff:
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # entry key -> field -> (old value, new value), a missing field is None
+    changed: Dict[str, Dict[str, Tuple[Any, Any]]] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def to_dict(self) -> dict:
+        return {
+            'added': self.added,
+            'removed': self.removed,
+            'changed': {key: {name: list(values) for name, values in changes.items()}
+                        for key, changes in self.changed.items()},
+        }
+
+def diff_databases(old: dict, new: dict) -> DatabaseDiff:
+    """Per-entry difference between two database.json structures (or indexes built from them)."""
+    old_entries, new_entries = old.get('entries', {}), new.get('entries', {})
+    diff = DatabaseDiff(
+        added=[key for key in new_entries if key not in old_entries],
+        removed=[key for key in old_entries if key not in new_entries],
+    )
+    for key, new_entry in new_entries.items():
+        old_entry = old_entries.get(key)
+        if old_entry is None or old_entry == new_entry:
+            continue
+        diff.changed[key] = {
+            name: (old_entry.get(name), new_entry.get(name))
+            for name in dict.fromkeys([*old_entry, *new_entry])
+            if old_entry.get(name) != new_entry.get(name)
+        }
+    return diff
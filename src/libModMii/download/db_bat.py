@@ -0,0 +1,149 @@
+import logging
+import re
+from datetime import datetime
+from typing import Dict, IO, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Commands and comments that never carry entry data
+_skipped_line = re.compile(r"goto:|if |call |move |exist |cls|echo")
+# Labels that end an entry instead of starting one
+_ignored_label = re.compile(r"[ :]|Rename|download")
+_variable = re.compile(r"%([^%]+)%")
+_hex_value = re.compile(r"[0-9A-Fa-f]+")
+
+def _parse_value(value: str) -> Union[str, int]:
+    if value.startswith('"'):
+        value = value[1:]
+    if value.endswith('"'):
+        value = value[:-1]
+    # Long hex strings (title IDs, hashes) stay strings even when they only contain digits
+    if len(value) > 4 and _hex_value.fullmatch(value):
+        return value
+    return int(value) if value.isdigit() else value
+
+def expand_variables(entry: dict) -> List[str]:
+    """
+    Replace the %VAR% references in an entry's values with the values of the entry's other keys, in place.
+
+    Every key is resolved once, after the keys it references (depth-first), so chains of any length resolve in a
+    single pass. References to unknown keys are left as is, and so are references that would close a cycle.
+    Returns the keys that are part of a cycle.
+    """
+    resolved: Dict[str, Union[str, int]] = {}
+    in_progress: List[str] = []
+    cycles: List[str] = []
+
+    def resolve(key: str) -> Union[str, int]:
+        if key in resolved:
+            return resolved[key]
+        value = entry[key]
+        if not isinstance(value, str) or "%" not in value:
+            resolved[key] = value
+            return value
+
+        in_progress.append(key)
+
+        def replace(match):
+            name = match.group(1)
+            if name not in entry:
+                return match.group(0)
+            if name in in_progress:
+                cycles.extend(k for k in in_progress[in_progress.index(name):] if k not in cycles)
+                return match.group(0)
+            return str(resolve(name))
+
+        value = _variable.sub(replace, value)
+        in_progress.pop()
+        resolved[key] = value
+        return value
+
+    for key in entry:
+        resolve(key)
+    entry.update(resolved)
+    return cycles
+
+def categorize_entry(entry_id: str, entry: dict) -> None:
+    """Set the category of entries DB.bat does not categorize: d2x, then cios for anything cIOS-like."""
+    if 'category' in entry:
+        return
+    name_lower = str(entry.get('name', '')).lower()
+    entry_id_lower = entry_id.lower()
+    if 'd2x' in name_lower or 'd2x' in entry_id_lower:
+        entry['category'] = 'd2x'
+        return
+    if (
+        'cios' in name_lower or
+        'cios' in entry_id_lower or
+        entry.get('ciosslot') or
+        entry.get('ciosversion') or
+        entry.get('cIOSFamilyName') or
+        entry.get('basecios') or
+        entry.get('diffpath')
+    ):
+        entry['category'] = 'cios'
+
+def _is_empty(entry: dict) -> bool:
+    return not entry or (len(entry) == 1 and entry.get('name') is None)
+
+def parse_db(lines: Iterable[str], source: str = 'DB.bat', converted: Optional[str] = None) -> dict:
+    """
+    Parse ModMii's DB.bat, from any iterable of lines (an open file, a list, a network stream), in one pass.
+
+    Returns the database.json structure: {"meta": {...}, "entries": {label: {key: value}}}. Each entry's %VAR%
+    references are expanded and its category set as soon as the entry ends.
+    """
+    meta = {
+        'DBversion': None,
+        'converted': converted or datetime.utcnow().isoformat() + 'Z',
+        'source': source,
+        'creator': "https://github.com/xflak",
+    }
+    entries: Dict[str, dict] = {}
+    label: Optional[str] = None
+    current: Optional[dict] = None
+
+    def finish() -> None:
+        if current is not None:
+            cycles = expand_variables(current)
+            if cycles:
+                logger.warning("Circular variable references in %s: %s", label, ", ".join(cycles))
+            categorize_entry(label, current)
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('set DBversion='):
+            meta['DBversion'] = line.split('=', 1)[1]
+            continue
+        if line.startswith('::') or _skipped_line.search(line):
+            continue
+        if line.startswith(':'):
+            finish()
+            label, current = line[1:], None
+            if label in ('skip', 'DBend') or _ignored_label.search(label):
+                label = None
+                continue
+            current = entries[label] = {}
+            continue
+        if current is not None and line.startswith('set '):
+            set_command = line[4:]
+            if set_command.startswith('"') and set_command.endswith('"') and '=' in set_command:
+                set_command = set_command[1:-1]
+            key, equal, value = set_command.partition('=')
+            if equal:
+                current[key] = _parse_value(value)
+    finish()
+
+    for entry_id in [entry_id for entry_id, entry in entries.items() if _is_empty(entry)]:
+        del entries[entry_id]
+
+    return {'meta': meta, 'entries': entries}
+
+def parse_db_file(file: Union[str, IO[str]], **kwargs) -> dict:
+    """parse_db() on a path or a text file object, read line by line."""
+    if isinstance(file, str):
+        with open(file, 'r', encoding='utf-8') as f:
+            return parse_db(f, **kwargs)
+    return parse_db(file, **kwargs)
@@ -1,75 +1,337 @@
+import logging
 import os
-from typing import  Dict, Any
-from .validation import verify_file
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import  Dict, Any, List, Iterable
+from .validation import verify_file, get_file_md5, get_default_hash_index
 from .osc_download import osc_download
 from .wiipy.nus import nus_title_download
-from .database import get_database_entry
-from .d2xbuild import buildD2XCios
+from .nus_cache import get_default_cache
+from .database import get_database_entry, DatabaseEntry
+from .d2xbuild import buildD2XCios, d2x_build_inputs
+from .patchios import buildPatchedIos, is_patched_ios, patchios_build_inputs
+from .artifact_cache import artifact_key, get_default_artifact_cache
+from .locking import FileLock, SingleFlight, lock_path
+from .manifest import entry_fields, get_default_manifest
+from .instrumentation import count, span, tags, get_instrumentation, set_instrumentation, _emit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+# Concurrent connections used to fetch the ticket, cert chain and contents of a single NUS title
+NUS_MAX_WORKERS = 8
+
+# Downloads in flight in this process, by output file
+_in_flight = SingleFlight()
+
+def _exclusive(file_path: str, fn):
+    # One download per output file: threads (and asyncio tasks, see async_download) of this process join the
+    # download in flight, other processes wait on the file lock and then find the verified file in place
+    key = os.path.abspath(file_path)
+
+    def locked():
+        with FileLock(lock_path(key)):
+            return fn()
+
+    return _in_flight.do(key, locked)
+
+def _is_cached(file_path: str, md5, md5alt, kind: str = "output") -> bool:
+    # kind is "output" or "base", the instrumentation prefix of the check
+    if not md5 or not os.path.exists(file_path):
+        count(f"{kind}.miss")
+        return False
+    try:
+        _verify(file_path, md5, md5alt, kind)
+    except Exception:
+        logger.warning("Cached file verification failed, re-downloading: %s", file_path)
+        count(f"{kind}.miss")
+        return False
+    count(f"{kind}.hit")
+    return True
+
+def _verify(file_path: str, md5, md5alt, kind: str = "output") -> None:
+    with span("verify", file=kind):
+        verify_file(file_path, md5, md5alt, get_default_hash_index())
+
+def _download_tags(entry: str, database_entry: DatabaseEntry):
+    # Attributes of every span and count made for this entry, whichever helper makes them
+    return tags(entry=entry, wadname=database_entry.wadname, category=database_entry.category)
+
+def is_built_entry(database_entry: DatabaseEntry) -> bool:
+    """Whether the entry is built locally from a base IOS WAD (d2x cIOS and patched IOS) instead of downloaded."""
+    return database_entry.category == "d2x" or is_patched_ios(database_entry)
+
+def _build_inputs(database_entry: DatabaseEntry, base_md5: str) -> Dict[str, Any]:
+    if database_entry.category == "d2x":
+        return d2x_build_inputs(database_entry, base_md5)
+    return patchios_build_inputs(database_entry, base_md5)
+
+def _build_entry(database_entry: DatabaseEntry, entry_path: str, base_entry_path: str) -> None:
+    if database_entry.category == "d2x":
+        with span("build", type="d2x"):
+            buildD2XCios(database_entry, entry_path, base_entry_path)
+    else:
+        with span("build", type="patchios"):
+            buildPatchedIos(database_entry, entry_path, base_entry_path)
+
+def _artifact_keys(database_entry: DatabaseEntry) -> List[str]:
+    # The base WAD is only known by its expected hashes before it is downloaded, any of them gives a valid build
+    base_md5s = dict.fromkeys(md5 for md5 in (database_entry.md5base, database_entry.md5basealt) if md5)
+    return [artifact_key(_build_inputs(database_entry, base_md5)) for base_md5 in base_md5s]
+
+def has_cached_artifact(database_entry: DatabaseEntry) -> bool:
+    """Whether the build cache holds a build of the entry, from any of the base WADs it accepts."""
+    artifact_cache = get_default_artifact_cache()
+    if artifact_cache is None:
+        return False
+    try:
+        return any(key in artifact_cache for key in _artifact_keys(database_entry))
+    except Exception:
+        return False
+
+def _restore_artifact(database_entry: DatabaseEntry, entry_path: str) -> bool:
+    artifact_cache = get_default_artifact_cache()
+    if artifact_cache is None:
+        return False
+    try:
+        with span("artifact.restore") as restore_span:
+            for key in _artifact_keys(database_entry):
+                method = artifact_cache.restore(key, entry_path)
+                if not method:
+                    continue
+                # The cache only checks the artifact's size, a corrupt artifact would otherwise fail the final
+                # verification on every run
+                if database_entry.md5:
+                    try:
+                        _verify(entry_path, database_entry.md5, database_entry.md5alt)
+                    except Exception as error:
+                        logger.warning("Evicting the build cache artifact of %s: %s", database_entry.wadname, error)
+                        artifact_cache.evict(key)
+                        os.remove(entry_path)
+                        continue
+                restore_span.set(method=method)
+                count("artifact_cache.hit")
+                logger.info("%s restored from the build cache (%s)", database_entry.wadname, method)
+                return True
+    except Exception as error:
+        logger.warning("Build cache lookup failed for %s: %s", database_entry.wadname, error)
+    count("artifact_cache.miss")
+    return False
+
+def _store_artifact(database_entry: DatabaseEntry, entry_path: str, base_entry_path: str) -> None:
+    artifact_cache = get_default_artifact_cache()
+    if artifact_cache is None:
+        return
+    try:
+        with span("artifact.store"):
+            inputs = _build_inputs(database_entry, get_file_md5(base_entry_path, get_default_hash_index()))
+            artifact_cache.put(artifact_key(inputs), entry_path,
+                               {**inputs, "wadname": database_entry.wadname, "basewad": database_entry.basewad})
+    except Exception as error:
+        logger.warning("Could not add %s to the build cache: %s", database_entry.wadname, error)
+
+def _record_file(file_path: str, entry: str, database_entry: DatabaseEntry, kind: str = "entry") -> None:
+    # Lets invalidate_stale() find this file once the fields it was verified against change in the database
+    manifest = get_default_manifest()
+    if manifest is None:
+        return
+    try:
+        manifest.record(file_path, entry, entry_fields(database_entry, kind), kind)
+    except Exception as error:
+        logger.warning("Could not record %s in the download manifest: %s", file_path, error)
+
+def download_base_wad(database_entry: DatabaseEntry, output_path: str) -> str:
+    base_entry_path = os.path.join(output_path, database_entry.basewad) + ".wad"
+    with span("base", basewad=database_entry.basewad):
+        _exclusive(base_entry_path, lambda: _download_base_wad(database_entry, base_entry_path))
+    _record_file(base_entry_path, database_entry.basewad, database_entry, "base")
+    return base_entry_path
+
+def _download_base_wad(database_entry: DatabaseEntry, base_entry_path: str) -> str:
+    if _is_cached(base_entry_path, database_entry.md5base, database_entry.md5basealt, "base"):
+        logger.info("Base WAD %s already exists in cache", database_entry.basewad)
+        return base_entry_path
+
+    nus_title_download(
+        tid=f"{database_entry.code1}{database_entry.code2}",
+        version=database_entry.version,
+        wad=base_entry_path,
+        verbose=False,
+        cache=get_default_cache(),
+        max_workers=NUS_MAX_WORKERS
+    )
+    logger.info("Base WAD downloaded: %s", database_entry.basewad)
+    _verify(base_entry_path, database_entry.md5base, database_entry.md5basealt, "base")
+    return base_entry_path
 
 def download_entry(entry: str, output_path: str) -> Dict[str, Any]:
     database_entry = get_database_entry(entry)
     if not database_entry:
         raise Exception(f"No entry found in database for {entry}")
 
-    print(f"Downloading: {database_entry.wadname}")
-
-        
     entry_path = os.path.join(output_path, database_entry.wadname)
-    
-    if os.path.exists(entry_path):
-        try:
-            if database_entry.md5:
-                verify_file(entry_path, database_entry.md5, database_entry.md5alt)
-                print(f"WAD {database_entry.wadname} already exists in cache")
-                return {
-                    "wadname": database_entry.wadname,
-                    "outputPath": output_path
-                }
-        except Exception:
-            print('Cached file verification failed, re-downloading')
+    with _download_tags(entry, database_entry), span("download") as download_span:
+        result = dict(_exclusive(entry_path,
+                                 lambda: _download_entry(database_entry, output_path, entry_path, download_span)))
+    _record_file(entry_path, entry, database_entry)
+    return result
+
+def _download_entry(database_entry: DatabaseEntry, output_path: str, entry_path: str,
+                    download_span) -> Dict[str, Any]:
+    logger.info("Downloading: %s", database_entry.wadname)
+
+    if _is_cached(entry_path, database_entry.md5, database_entry.md5alt):
+        logger.info("WAD %s already exists in cache", database_entry.wadname)
+        download_span.set(result="cached")
+        return {
+            "wadname": database_entry.wadname,
+            "outputPath": output_path
+        }
 
     if not database_entry.category and not database_entry.ciosslot:
         raise Exception(f"Unsupported category for download: {database_entry.category}")
 
+    # Built artifacts are only added to the build cache once they passed the final verification
+    built_from = None
+
     # Handle download based on category
     if database_entry.category == "ios":
         nus_title_download(
             tid=f"{database_entry.code1}{database_entry.code2}",
             version=database_entry.version,
             wad=entry_path,
-            verbose=False
+            verbose=False,
+            cache=get_default_cache(),
+            max_workers=NUS_MAX_WORKERS
         )
+        download_span.set(result="downloaded")
     elif database_entry.category == "OSC":
         osc_download(database_entry, entry_path)
-    elif database_entry.category == "d2x":
-        base_entry_path = os.path.join(output_path, database_entry.basewad) + ".wad"
-        nus_title_download(
-            tid=f"{database_entry.code1}{database_entry.code2}",
-            version=database_entry.version,
-            wad=base_entry_path,
-            verbose=False
-        )
-        print(f"Base WAD downloaded: {database_entry.basewad}")
-        verify_file(base_entry_path, database_entry.md5base, database_entry.md5basealt)
-        buildD2XCios(database_entry, entry_path, base_entry_path)
-        # elif database_entry["category"] == "patchios":
-        #     base_wad_path = f"/tmp/{database_entry['basewad']}.wad"
-        #     base_entry = get_database_entry_from_wadname(database_entry["basewad"])
-        #     if not base_entry:
-        #         raise Exception(f"Base WAD entry not found: {database_entry['basewad']}")
-        #     await nus_download(base_entry, base_wad_path)
-        #     await verify_file(base_wad_path, database_entry.get("md5base"), database_entry.get("md5basealt"))
-        #     await patch_ios(database_entry, output_path, base_wad_path)
+        download_span.set(result="downloaded")
+    elif is_built_entry(database_entry):
+        if _restore_artifact(database_entry, entry_path):
+            download_span.set(result="restored")
+        else:
+            base_entry_path = download_base_wad(database_entry, output_path)
+            # A stale output may be a hardlink into the build cache, unlink it instead of writing through it
+            if os.path.exists(entry_path):
+                os.remove(entry_path)
+            _build_entry(database_entry, entry_path, base_entry_path)
+            built_from = base_entry_path
+            download_span.set(result="built")
 
     # Verify the final output file
     if not entry_path or not os.path.exists(entry_path):
         raise Exception(f"File was not created after download: {database_entry.wadname}")
     
     if database_entry.md5:
-        verify_file(entry_path, database_entry.md5, database_entry.md5alt)
+        _verify(entry_path, database_entry.md5, database_entry.md5alt)
+
+    if built_from:
+        _store_artifact(database_entry, entry_path, built_from)
 
-    print(f"Download completed: {database_entry.wadname}")
+    logger.info("Download completed: %s", database_entry.wadname)
     return {
         "wadname": database_entry.wadname,
         "outputPath": output_path
-    }
\ No newline at end of file
+    }
+
+def _download_base_job(entry: str, output_path: str) -> str:
+    database_entry = get_database_entry(entry)
+    with _download_tags(entry, database_entry):
+        return download_base_wad(database_entry, output_path)
+
+def _instrumented_job(fn, *args):
+    # Process pool job: the parent's callback lives in the parent, the events are sent back with the result and
+    # replayed there by download_entries()
+    events = []
+    set_instrumentation(events.append)
+    try:
+        return fn(*args), events, None
+    except Exception as error:
+        return None, events, error
+    finally:
+        set_instrumentation(None)
+
+def download_entries(entries: Iterable[str], output_path: str, max_workers: int = DEFAULT_MAX_WORKERS,
+                     use_processes: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Download a batch of database entries on a bounded worker pool.
+
+    Runs in two phases: plain downloads and the base IOS of every d2x and patched IOS entry are fetched first
+    (each shared base WAD only once), then the dependent builds run in parallel. Failures are
+    collected per entry instead of aborting the batch.
+
+    With use_processes=True, the spans and counts of the worker processes are sent to the instrumentation callback
+    of this process once each job ends.
+
+    Returns a dict with "results" (entry -> download_entry() result) and "errors" (entry -> message).
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    errors: Dict[str, str] = {}
+
+    # Keep the caller's order but drop duplicate keys
+    keys: List[str] = list(dict.fromkeys(entries))
+
+    builds_by_base: Dict[str, List[str]] = {}
+    direct_keys: List[str] = []
+    for key in keys:
+        try:
+            database_entry = get_database_entry(key)
+        except Exception as error:
+            errors[key] = str(error)
+            continue
+        entry_path = os.path.join(output_path, database_entry.wadname)
+        if (is_built_entry(database_entry) and database_entry.basewad and not os.path.exists(entry_path)
+                and not has_cached_artifact(database_entry)):
+            builds_by_base.setdefault(database_entry.basewad, []).append(key)
+        else:
+            direct_keys.append(key)
+
+    callback = get_instrumentation() if use_processes else None
+
+    def submit(fn, *args):
+        if callback is None:
+            return executor.submit(fn, *args)
+        return executor.submit(_instrumented_job, fn, *args)
+
+    def result(future):
+        if callback is None:
+            return future.result()
+        value, events, error = future.result()
+        for event in events:
+            _emit(callback, event)
+        if error is not None:
+            raise error
+        return value
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=max_workers) as executor:
+        # Phase 1: standalone entries and one download per shared base WAD
+        entry_futures = {key: submit(download_entry, key, output_path) for key in direct_keys}
+        base_futures = {
+            basewad: submit(_download_base_job, dependents[0], output_path)
+            for basewad, dependents in builds_by_base.items()
+        }
+
+        build_futures = {}
+        for basewad, future in base_futures.items():
+            try:
+                result(future)
+            except Exception as error:
+                for key in builds_by_base[basewad]:
+                    errors[key] = f"Base WAD {basewad} failed: {error}"
+                continue
+            # Phase 2: every build on this base can now run in parallel
+            for key in builds_by_base[basewad]:
+                build_futures[key] = submit(download_entry, key, output_path)
+
+        for key, future in {**entry_futures, **build_futures}.items():
+            try:
+                results[key] = result(future)
+            except Exception as error:
+                errors[key] = str(error)
+
+    return {
+        "results": {key: results[key] for key in keys if key in results},
+        "errors": {key: errors[key] for key in keys if key in errors},
+    }
@@ -0,0 +1,279 @@
+import asyncio
+import ssl
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+DEFAULT_LIMIT = 100
+DEFAULT_LIMIT_PER_HOST = 8
+DEFAULT_TIMEOUT = 60.0
+CHUNK_SIZE = 64 * 1024
+MAX_REDIRECTS = 5
+# Idle keep-alive connections kept per host
+MAX_IDLE_PER_HOST = 8
+
+_redirect_statuses = (301, 302, 303, 307, 308)
+
+class HttpError(Exception):
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+
+_HostKey = Tuple[str, str, int]
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self) -> None:
+        self.writer.close()
+
+class AsyncResponse:
+    """Response whose body has not been read yet. Iterate over iter_chunks() or call read() exactly once."""
+
+    def __init__(self, client: "AsyncHttpClient", host: _HostKey, connection: _Connection, url: str, status: int,
+                 headers: Dict[str, str], head: bool = False):
+        self._client = client
+        self._host = host
+        self._connection = connection
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self._head = head
+        self._done = False
+
+    @property
+    def content_length(self) -> Optional[int]:
+        value = self.headers.get("content-length")
+        return int(value) if value is not None else None
+
+    def _keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+    async def _read(self, size: int) -> bytes:
+        # Every body read is bounded by the client timeout: a server that stalls after the headers raises
+        # asyncio.TimeoutError instead of hanging the download
+        return await asyncio.wait_for(self._connection.reader.read(size), self._client.timeout)
+
+    async def _readline(self) -> bytes:
+        return await asyncio.wait_for(self._connection.reader.readline(), self._client.timeout)
+
+    async def _body(self) -> AsyncIterator[bytes]:
+        chunk_size = self._client.chunk_size
+        if self._head or self.status in (204, 304):
+            return
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await self._readline()
+                if not size_line:
+                    raise ConnectionError(f"Connection closed while reading {self.url}")
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while (await self._readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                while size:
+                    chunk = await self._read(min(size, chunk_size))
+                    if not chunk:
+                        raise ConnectionError(f"Connection closed while reading {self.url}")
+                    size -= len(chunk)
+                    yield chunk
+                await self._readline()
+        elif self.content_length is not None:
+            remaining = self.content_length
+            while remaining:
+                chunk = await self._read(min(remaining, chunk_size))
+                if not chunk:
+                    raise ConnectionError(f"Connection closed while reading {self.url}")
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            # No length, the body ends with the connection
+            self.headers["connection"] = "close"
+            while True:
+                chunk = await self._read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._body():
+                yield chunk
+            self._done = True
+        finally:
+            self.release()
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_chunks()])
+
+    def release(self) -> None:
+        """Hand the connection back to the pool (or close it if the body was not fully read)."""
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        if self._done and self._keep_alive():
+            self._client._release(self._host, connection)
+        else:
+            connection.close()
+            self._client._release(self._host, None)
+
+    async def __aenter__(self) -> "AsyncResponse":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+class AsyncHttpClient:
+    """
+    Minimal asyncio HTTP/1.1 client with a shared keep-alive connection pool.
+
+    At most limit connections are open at once, and at most limit_per_host to a single host, so hundreds of
+    concurrent downloads queue on the pool instead of each holding a thread or a socket. Bodies are streamed in
+    chunk_size pieces. timeout bounds every network wait (connect, headers, each body read), not the whole request.
+    """
+
+    def __init__(self, limit: int = DEFAULT_LIMIT, limit_per_host: int = DEFAULT_LIMIT_PER_HOST,
+                 timeout: float = DEFAULT_TIMEOUT, chunk_size: int = CHUNK_SIZE,
+                 headers: Optional[Dict[str, str]] = None):
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.headers = headers or {}
+        self._limit = asyncio.Semaphore(limit)
+        self._host_limits: Dict[_HostKey, asyncio.Semaphore] = {}
+        self._idle: Dict[_HostKey, List[_Connection]] = {}
+        self._ssl_context = None
+
+    def _host_limit(self, host: _HostKey) -> asyncio.Semaphore:
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = self._host_limits[host] = asyncio.Semaphore(self.limit_per_host)
+        return semaphore
+
+    async def _acquire(self, host: _HostKey) -> _Connection:
+        await self._limit.acquire()
+        try:
+            await self._host_limit(host).acquire()
+        except BaseException:
+            self._limit.release()
+            raise
+        idle = self._idle.get(host)
+        while idle:
+            connection = idle.pop()
+            if not connection.reader.at_eof() and not connection.writer.is_closing():
+                return connection
+            connection.close()
+        scheme, hostname, port = host
+        try:
+            if scheme == "https":
+                if self._ssl_context is None:
+                    self._ssl_context = ssl.create_default_context()
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(hostname, port, ssl=self._ssl_context), self.timeout)
+            else:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(hostname, port), self.timeout)
+        except BaseException:
+            self._release(host, None)
+            raise
+        return _Connection(reader, writer)
+
+    def _release(self, host: _HostKey, connection: Optional[_Connection]) -> None:
+        if connection is not None:
+            idle = self._idle.setdefault(host, [])
+            if len(idle) < MAX_IDLE_PER_HOST:
+                idle.append(connection)
+            else:
+                connection.close()
+        self._host_limit(host).release()
+        self._limit.release()
+
+    async def request(self, url: str, headers: Optional[Dict[str, str]] = None, method: str = "GET",
+                      follow_redirects: bool = True) -> AsyncResponse:
+        """Send a request and return once the response headers are in. The caller must consume the body."""
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._request_once(url, headers, method)
+            if not follow_redirects or response.status not in _redirect_statuses or "location" not in response.headers:
+                return response
+            await response.read()
+            url = urljoin(url, response.headers["location"])
+        raise HttpError(response.status, f"{url} (too many redirects)")
+
+    async def _request_once(self, url: str, headers: Optional[Dict[str, str]], method: str) -> AsyncResponse:
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        host = (scheme, parts.hostname, port)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+        request_headers = {"Host": parts.netloc, "Connection": "keep-alive", "Accept-Encoding": "identity",
+                           **self.headers, **(headers or {})}
+        head = f"{method} {target} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in request_headers.items())
+
+        # A pooled connection may have been closed by the server while idle, retry once on a fresh one
+        for attempt in range(2):
+            connection = await self._acquire(host)
+            try:
+                connection.writer.write((head + "\r\n").encode("latin-1"))
+                await asyncio.wait_for(connection.writer.drain(), self.timeout)
+                status, response_headers = await asyncio.wait_for(self._read_head(connection.reader), self.timeout)
+                return AsyncResponse(self, host, connection, url, status, response_headers, head=method == "HEAD")
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection.close()
+                self._release(host, None)
+                if attempt:
+                    raise
+            except BaseException:
+                connection.close()
+                self._release(host, None)
+                raise
+
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str]]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed before the response")
+        status = int(status_line.split(None, 2)[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return status, headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> bytes:
+        response = await self.request(url, headers)
+        if response.status != 200:
+            response.release()
+            raise HttpError(response.status, url)
+        return await response.read()
+
+    async def download(self, url: str, file_path: str, headers: Optional[Dict[str, str]] = None) -> int:
+        """Stream url to file_path chunk by chunk. Returns the number of bytes written."""
+        response = await self.request(url, headers)
+        if response.status != 200:
+            response.release()
+            raise HttpError(response.status, url)
+        written = 0
+        with open(file_path, "wb") as f:
+            async for chunk in response.iter_chunks():
+                f.write(chunk)
+                written += len(chunk)
+        return written
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    async def __aenter__(self) -> "AsyncHttpClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
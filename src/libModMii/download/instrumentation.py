@@ -0,0 +1,187 @@
+import contextvars
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Spans (name: what is timed):
+#   download         a whole download_entry(), "result" is cached, downloaded, restored or built
+#   base             getting the base IOS WAD of a built entry, download or cached copy
+#   verify           MD5 check of an output ("file": "output") or base WAD ("file": "base")
+#   nus.tmd, nus.ticket, nus.cert_chain, nus.contents ("bytes"), nus.pack (WAD dump and write)
+#   osc.download
+#   artifact.restore, artifact.store
+#   build            a d2x cIOS or patched IOS build ("type"), made of build.load, build.patch, build.modules,
+#                    build.fakesign and build.dump
+# Counts:
+#   transfer.bytes                        bytes received over HTTP ("url")
+#   nus_cache.hit, nus_cache.miss         NUS cache lookups ("item": tmd, tik, cert_chain or content)
+#   hash_index.hit, hash_index.miss       MD5s served by the hash index or computed
+#   artifact_cache.hit, artifact_cache.miss
+#   output.hit, output.miss               output files already in place and valid, or (re)made
+#   base.hit, base.miss                   same for the base IOS WAD of a built entry
+# Every event also carries the attributes of the download it belongs to: entry, wadname and category.
+
+@dataclass(frozen=True)
+class Span:
+    name: str
+    # Seconds
+    duration: float
+    attributes: Dict[str, Any]
+    # Message of the exception that ended the span, None when it succeeded
+    error: Optional[str] = None
+
+@dataclass(frozen=True)
+class Count:
+    name: str
+    value: int
+    attributes: Dict[str, Any]
+
+InstrumentationCallback = Callable[[Union[Span, Count]], None]
+
+_callback: Optional[InstrumentationCallback] = None
+_callback_lock = threading.Lock()
+# Attributes of the download in progress in this thread or task, added to every event
+_attributes: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("libModMii_instrumentation", default={})
+
+def get_instrumentation() -> Optional[InstrumentationCallback]:
+    return _callback
+
+def set_instrumentation(callback: Optional[InstrumentationCallback]) -> None:
+    """
+    Send every Span and Count of the download functions to callback (e.g. a MetricsCollector), from whichever
+    thread they happen in. None, the default, turns instrumentation off: spans and counts are then no-ops.
+    """
+    global _callback
+    with _callback_lock:
+        _callback = callback
+
+def _emit(callback: InstrumentationCallback, event: Union[Span, Count]) -> None:
+    # Monitoring must never break a download
+    try:
+        callback(event)
+    except Exception:
+        logger.exception("Instrumentation callback failed")
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class _ActiveSpan:
+    __slots__ = ("name", "attributes", "start")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.start = 0.0
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        duration = time.perf_counter() - self.start
+        callback = _callback
+        if callback is not None:
+            _emit(callback, Span(self.name, duration, {**_attributes.get(), **self.attributes},
+                                 None if exc is None else str(exc) or exc_type.__name__))
+        return False
+
+def span(name: str, **attributes):
+    """Context manager timing its block as a Span. set(**attributes) on it adds attributes before it ends."""
+    if _callback is None:
+        return _NOOP_SPAN
+    return _ActiveSpan(name, attributes)
+
+def count(name: str, value: int = 1, **attributes) -> None:
+    callback = _callback
+    if callback is not None:
+        _emit(callback, Count(name, value, {**_attributes.get(), **attributes}))
+
+class _Tags:
+    __slots__ = ("attributes", "token")
+
+    def __init__(self, attributes: Dict[str, Any]):
+        self.attributes = attributes
+        self.token = None
+
+    def __enter__(self):
+        self.token = _attributes.set({**_attributes.get(), **self.attributes})
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _attributes.reset(self.token)
+        return False
+
+def tags(**attributes):
+    """Context manager adding attributes to every span and count made inside its block, in this thread or task."""
+    if _callback is None:
+        return _NOOP_SPAN
+    return _Tags(attributes)
+
+def _new_stat() -> Dict[str, float]:
+    return {"count": 0, "total": 0.0, "max": 0.0, "errors": 0}
+
+@dataclass
+class MetricsCollector:
+    """
+    Thread-safe instrumentation callback aggregating spans (count, total and max duration, errors) and counts per
+    category and name. The raw events are kept as well, unless keep_events is False.
+    """
+    keep_events: bool = True
+    events: List[Union[Span, Count]] = field(default_factory=list)
+    spans: Dict[str, Dict[str, Dict[str, float]]] = field(default_factory=dict)
+    counts: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Union[Span, Count]) -> None:
+        category = event.attributes.get("category") or "other"
+        with self._lock:
+            if self.keep_events:
+                self.events.append(event)
+            if isinstance(event, Span):
+                stat = self.spans.setdefault(category, {}).setdefault(event.name, _new_stat())
+                stat["count"] += 1
+                stat["total"] += event.duration
+                stat["max"] = max(stat["max"], event.duration)
+                if event.error is not None:
+                    stat["errors"] += 1
+            else:
+                category_counts = self.counts.setdefault(category, {})
+                category_counts[event.name] = category_counts.get(event.name, 0) + event.value
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """category -> {"spans": {name: stats}, "counts": {name: total}}, JSON-serializable."""
+        with self._lock:
+            categories = dict.fromkeys([*self.spans, *self.counts])
+            return {
+                category: {
+                    "spans": {name: dict(stat) for name, stat in self.spans.get(category, {}).items()},
+                    "counts": dict(self.counts.get(category, {})),
+                }
+                for category in categories
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.events.clear()
+            self.spans.clear()
+            self.counts.clear()
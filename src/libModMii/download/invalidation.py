@@ -0,0 +1,183 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .database import DatabaseEntry, _build_database_entry, diff_databases, get_database
+from .manifest import DownloadManifest, entry_fields, get_default_manifest
+from .artifact_cache import get_default_artifact_cache
+from .validation import get_default_hash_index
+from .download import DEFAULT_MAX_WORKERS, _artifact_keys, _exclusive, is_built_entry, download_entries
+
+@dataclass
+class StaleFile:
+    path: str
+    # Entry key for "entry" files, basewad for "base" files
+    entry: str
+    kind: str
+    # field -> (value the file was made with, current value); empty when the entry was removed from the database
+    changes: Dict[str, Tuple[Any, Any]] = field(default_factory=dict)
+
+def _entries(database: dict) -> Dict[str, DatabaseEntry]:
+    # Entries without a file (no wadname or title ID) are never downloaded, so never stale
+    return {key: _build_database_entry(entry_data) for key, entry_data in database['entries'].items()
+            if entry_data.get('wadname') and entry_data.get('code1')}
+
+def _changes(recorded: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+    return {name: (recorded.get(name), current.get(name))
+            for name in current if recorded.get(name) != current.get(name)}
+
+def _base_users(entries: Dict[str, DatabaseEntry]) -> Dict[str, List[Dict[str, Any]]]:
+    users: Dict[str, List[Dict[str, Any]]] = {}
+    for database_entry in entries.values():
+        if database_entry.basewad:
+            users.setdefault(database_entry.basewad, []).append(entry_fields(database_entry, "base"))
+    return users
+
+def _stale_base(basewad: str, recorded: Dict[str, Any],
+                users: Dict[str, List[Dict[str, Any]]]) -> Optional[Dict[str, Tuple[Any, Any]]]:
+    # A base WAD is shared, it stays valid as long as one entry still expects it exactly as it was verified
+    current = users.get(basewad, [])
+    if any(fields == recorded for fields in current):
+        return None
+    return _changes(recorded, current[0]) if current else {}
+
+def stale_between(old_database: dict, new_database: dict, output_path: str) -> List[StaleFile]:
+    """
+    Files in output_path made from old_database that new_database no longer accepts: entries that were removed or
+    whose md5, md5alt, version, basewad, ciosversion, ciosslot or wadname changed, and base WADs no entry expects
+    anymore. Only the two databases are compared, no file is hashed.
+    """
+    old_entries, new_entries = _entries(old_database), _entries(new_database)
+    diff = diff_databases(old_database, new_database)
+    stale: List[StaleFile] = []
+
+    for key in [*diff.removed, *diff.changed]:
+        old_entry = old_entries.get(key)
+        if old_entry is None:
+            continue
+        old_fields = entry_fields(old_entry)
+        new_entry = new_entries.get(key)
+        changes = _changes(old_fields, entry_fields(new_entry)) if new_entry is not None else {}
+        if new_entry is None or changes:
+            stale.append(StaleFile(os.path.join(output_path, old_entry.wadname), key, "entry", changes))
+
+    users = _base_users(new_entries)
+    for basewad, old_users in _base_users(old_entries).items():
+        for recorded in {tuple(sorted(fields.items())): fields for fields in old_users}.values():
+            changes = _stale_base(basewad, recorded, users)
+            if changes is not None:
+                stale.append(StaleFile(os.path.join(output_path, basewad) + ".wad", basewad, "base", changes))
+                break
+
+    return [stale_file for stale_file in stale if os.path.exists(stale_file.path)]
+
+def find_stale_files(output_path: Optional[str] = None, manifest: Optional[DownloadManifest] = None,
+                     database: Optional[dict] = None) -> List[StaleFile]:
+    """
+    Files recorded in the download manifest (only those in output_path if given) whose entry was removed from
+    database (the current database by default) or whose recorded fields no longer match it.
+    """
+    manifest = manifest or get_default_manifest()
+    if manifest is None:
+        return []
+    entries = _entries(database if database is not None else get_database())
+    users = _base_users(entries)
+
+    stale = []
+    for record in manifest.records(output_path):
+        if record.kind == "base":
+            changes = _stale_base(record.entry, record.fields, users)
+            if changes is not None:
+                stale.append(StaleFile(record.path, record.entry, record.kind, changes))
+            continue
+        database_entry = entries.get(record.entry)
+        if database_entry is None:
+            stale.append(StaleFile(record.path, record.entry, record.kind))
+            continue
+        changes = _changes(record.fields, entry_fields(database_entry))
+        if changes:
+            stale.append(StaleFile(record.path, record.entry, record.kind, changes))
+    return stale
+
+def _current_artifact_keys(wadnames: set) -> set:
+    # Artifacts the current database would still restore: a stale file shares its wadname with them when only
+    # its base WAD or md5 changed, they must survive the invalidation
+    keys = set()
+    for database_entry in _entries(get_database()).values():
+        if database_entry.wadname in wadnames and is_built_entry(database_entry):
+            try:
+                keys.update(_artifact_keys(database_entry))
+            except Exception:
+                continue
+    return keys
+
+def _evict_artifacts(wadnames: Iterable[str]) -> List[str]:
+    artifact_cache = get_default_artifact_cache()
+    wadnames = set(wadnames)
+    if artifact_cache is None or not wadnames:
+        return []
+    keep = _current_artifact_keys(wadnames)
+    evicted = []
+    for item in artifact_cache.items():
+        if item.key in keep:
+            continue
+        metadata = artifact_cache.metadata(item.key) or {}
+        if metadata.get("inputs", {}).get("wadname") in wadnames:
+            artifact_cache.evict(item.key)
+            evicted.append(item.key)
+    return evicted
+
+def _remove_stale(stale_file: StaleFile, hash_index, manifest) -> bool:
+    # Runs under the download lock of the file: a download of it has either finished or not started
+    if manifest is not None and stale_file.changes:
+        record = manifest.get(stale_file.path)
+        if record is not None and all(record.fields.get(name) == current
+                                      for name, (_, current) in stale_file.changes.items()):
+            # Downloaded again for the current database since it was found stale
+            return False
+    removed = os.path.exists(stale_file.path)
+    if removed:
+        os.remove(stale_file.path)
+    if hash_index is not None:
+        hash_index.forget(stale_file.path)
+    if manifest is not None:
+        manifest.forget(stale_file.path)
+    return removed
+
+def invalidate(stale_files: Iterable[StaleFile], rebuild: bool = False,
+               max_workers: int = DEFAULT_MAX_WORKERS) -> Dict[str, Any]:
+    """
+    Delete stale files, drop their hash index and manifest records and evict the build cache artifacts made for
+    them (artifacts the current database still builds are kept). With rebuild=True the entries that still exist
+    in the current database are then downloaded again, in the directory their stale file was in.
+
+    Returns a dict with "removed" (paths), "evicted" (artifact keys) and "rebuilt" (output path ->
+    download_entries() result).
+    """
+    stale_files = list(stale_files)
+    hash_index = get_default_hash_index()
+    manifest = get_default_manifest()
+    removed = []
+    for stale_file in stale_files:
+        # Same lock as the downloads, a concurrent download_entry() of this file is never deleted halfway
+        if _exclusive(stale_file.path, lambda: _remove_stale(stale_file, hash_index, manifest)):
+            removed.append(stale_file.path)
+
+    evicted = _evict_artifacts(os.path.basename(stale_file.path) for stale_file in stale_files
+                               if stale_file.kind == "entry")
+
+    rebuilt = {}
+    if rebuild:
+        current = get_database()['entries']
+        keys_by_output: Dict[str, List[str]] = {}
+        for stale_file in stale_files:
+            if stale_file.kind == "entry" and stale_file.entry in current:
+                keys_by_output.setdefault(os.path.dirname(stale_file.path), []).append(stale_file.entry)
+        for output_path, keys in keys_by_output.items():
+            rebuilt[output_path] = download_entries(keys, output_path, max_workers)
+
+    return {"removed": removed, "evicted": evicted, "rebuilt": rebuilt}
+
+def invalidate_stale(output_path: Optional[str] = None, rebuild: bool = False,
+                     max_workers: int = DEFAULT_MAX_WORKERS) -> Dict[str, Any]:
+    """invalidate() every file find_stale_files() reports for the current database."""
+    return invalidate(find_stale_files(output_path), rebuild, max_workers)
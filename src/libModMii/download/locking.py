@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from .cache_paths import get_cache_path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+LOCK_POLL_INTERVAL = 0.05
+
+# Lock files that could not be created (read-only or missing cache root): locked within this process only
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_lock = threading.Lock()
+_warned_dirs = set()
+
+def _local_lock(path: str) -> threading.Lock:
+    with _local_locks_lock:
+        return _local_locks.setdefault(path, threading.Lock())
+
+def _open_lock_file(path: str) -> Optional[int]:
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError as error:
+        lock_dir = os.path.dirname(os.path.abspath(path))
+        with _local_locks_lock:
+            warn = lock_dir not in _warned_dirs
+            _warned_dirs.add(lock_dir)
+        if warn:
+            logger.warning("Cannot create lock files in %s (%s), locking within this process only", lock_dir, error)
+        return None
+
+def lock_path(key: str) -> str:
+    """Lock file for key, kept under the cache root so output directories stay clean."""
+    return os.path.join(get_cache_path("locks"), hashlib.sha1(key.encode()).hexdigest() + ".lock")
+
+class FileLock:
+    """
+    Exclusive inter-process lock on a file (flock on POSIX, msvcrt.locking on Windows).
+
+    Each FileLock opens its own file descriptor, so two FileLocks on the same path also exclude each other inside a
+    single process. When the lock file cannot be created, e.g. under a read-only cache root, the lock falls back to
+    a lock shared by the FileLocks of this process only.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._local: Optional[threading.Lock] = None
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> None:
+        fd = _open_lock_file(self.path)
+        if fd is None:
+            local = _local_lock(self.path)
+            if not local.acquire(timeout=-1 if timeout is None else timeout):
+                raise TimeoutError(f"Timed out waiting for lock {self.path}")
+            self._local = local
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            if fcntl is not None and timeout is None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                while not self._try_lock(fd):
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError(f"Timed out waiting for lock {self.path}")
+                    time.sleep(LOCK_POLL_INTERVAL)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> None:
+        # Poll without blocking the event loop instead of parking a thread on flock()
+        fd = _open_lock_file(self.path)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if fd is None:
+            local = _local_lock(self.path)
+            while not local.acquire(blocking=False):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for lock {self.path}")
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+            self._local = local
+            return
+        try:
+            while not self._try_lock(fd):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for lock {self.path}")
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self) -> None:
+        local, self._local = self._local, None
+        if local is not None:
+            local.release()
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    async def __aenter__(self) -> "FileLock":
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one: the first caller runs the work, every caller that arrives
+    while it is in flight waits and gets the same result (or exception). Threads and asyncio tasks share the same
+    in-flight map, so a task can wait on a download a thread started and the other way around.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def _join(self, key: str) -> Tuple[_Call, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def _finish(self, key: str, call: _Call) -> None:
+        with self._lock:
+            del self._calls[key]
+            waiters, call.waiters = call.waiters, []
+            call.done.set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future, call)
+
+    @staticmethod
+    def _outcome(call: _Call) -> Any:
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        call, leader = self._join(key)
+        if not leader:
+            call.done.wait()
+            return self._outcome(call)
+        try:
+            call.result = fn()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call, leader = self._join(key)
+        if not leader:
+            future = asyncio.get_running_loop().create_future()
+            with self._lock:
+                finished = call.done.is_set()
+                if not finished:
+                    call.waiters.append((asyncio.get_running_loop(), future))
+            if not finished:
+                await future
+            return self._outcome(call)
+        try:
+            call.result = await fn()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result
+
+    def in_flight(self) -> List[str]:
+        with self._lock:
+            return list(self._calls)
+
+def _resolve(future: asyncio.Future, call: _Call) -> None:
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from .cache_paths import get_cache_path, get_cache_root
+
+logger = logging.getLogger(__name__)
+
+# Database fields a downloaded or built file depends on, a change to any of them makes the file stale
+ENTRY_FIELDS = ("wadname", "md5", "md5alt", "version", "basewad", "ciosversion", "ciosslot")
+# Fields a base IOS WAD (output_path/basewad.wad) depends on
+BASE_FIELDS = ("basewad", "md5base", "md5basealt", "version", "code1", "code2")
+
+@dataclass
+class ManifestRecord:
+    path: str
+    entry: str
+    # "entry" for the entry's own file, "base" for the base WAD it was built from
+    kind: str
+    fields: Dict[str, Any]
+
+def entry_fields(database_entry, kind: str = "entry") -> Dict[str, Any]:
+    return {name: getattr(database_entry, name) for name in (BASE_FIELDS if kind == "base" else ENTRY_FIELDS)}
+
+class DownloadManifest:
+    """
+    Persistent record of the files download_entry() produced: which database entry each file came from and the
+    values of the fields it depends on at that time. Comparing it with the current database tells which files are
+    stale without hashing them. Backed by SQLite so that several processes can share it.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_cache_path("manifest.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(path TEXT PRIMARY KEY, entry TEXT NOT NULL, kind TEXT NOT NULL, fields TEXT NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record(self, file_path: str, entry: str, fields: Dict[str, Any], kind: str = "entry") -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO files (path, entry, kind, fields) VALUES (?, ?, ?, ?)",
+                (os.path.abspath(file_path), entry, kind, json.dumps(fields, sort_keys=True))
+            )
+
+    def get(self, file_path: str) -> Optional[ManifestRecord]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT path, entry, kind, fields FROM files WHERE path = ?", (os.path.abspath(file_path),)
+            ).fetchone()
+        return ManifestRecord(row[0], row[1], row[2], json.loads(row[3])) if row else None
+
+    def records(self, directory: Optional[str] = None) -> List[ManifestRecord]:
+        """Every record, or only the records of files directly inside directory."""
+        with self._connect() as connection:
+            rows = connection.execute("SELECT path, entry, kind, fields FROM files ORDER BY path").fetchall()
+        if directory is not None:
+            directory = os.path.abspath(directory)
+            rows = [row for row in rows if os.path.dirname(row[0]) == directory]
+        return [ManifestRecord(path, entry, kind, json.loads(fields)) for path, entry, kind, fields in rows]
+
+    def forget(self, file_path: str) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM files WHERE path = ?", (os.path.abspath(file_path),))
+
+    def prune(self) -> int:
+        """Drop records for files that no longer exist. Returns the number of removed records."""
+        with self._connect() as connection:
+            paths = [row[0] for row in connection.execute("SELECT path FROM files")]
+            missing = [(path,) for path in paths if not os.path.exists(path)]
+            connection.executemany("DELETE FROM files WHERE path = ?", missing)
+        return len(missing)
+
+
+_default_manifest = None
+_default_manifest_disabled = False
+_default_manifest_lock = threading.Lock()
+
+def get_default_manifest() -> Optional[DownloadManifest]:
+    global _default_manifest, _default_manifest_disabled
+    if _default_manifest_disabled:
+        return None
+    with _default_manifest_lock:
+        if _default_manifest is None and not _default_manifest_disabled:
+            try:
+                _default_manifest = DownloadManifest()
+            except (OSError, sqlite3.Error) as error:
+                logger.warning("Download manifest disabled, cannot create it under %s: %s", get_cache_root(), error)
+                _default_manifest_disabled = True
+                return None
+        return _default_manifest
+
+def set_default_manifest(manifest: Optional[DownloadManifest]) -> None:
+    global _default_manifest, _default_manifest_disabled
+    with _default_manifest_lock:
+        _default_manifest = manifest
+        _default_manifest_disabled = manifest is None
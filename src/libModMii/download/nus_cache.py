@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Optional
+from .cache_paths import get_cache_path, get_cache_root
+from .instrumentation import count
+from .locking import FileLock, SingleFlight, lock_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 2 * 1024 * 1024 * 1024  # 2 GiB
+
+CERT_CHAIN_KEY = "cert_chain"
+
+_unsafe_key_chars = re.compile(r'[^0-9A-Za-z._-]')
+
+# Items being downloaded into a cache by this process, by item path
+_fetches = SingleFlight()
+
+@dataclass
+class CacheItem:
+    key: str
+    size: int
+    last_used: float
+
+def tmd_key(tid: str, version: int) -> str:
+    return f"tmd-{tid.lower()}-v{version}"
+
+def ticket_key(tid: str) -> str:
+    return f"tik-{tid.lower()}"
+
+def content_key(tid: str, content_record) -> str:
+    # Content blobs are stored encrypted with the title key and the content index as IV, so the Title ID and the
+    # index are part of the key alongside the Content ID and the SHA-1 of the decrypted content from the TMD.
+    content_hash = content_record.content_hash
+    if isinstance(content_hash, bytes):
+        content_hash = content_hash.hex() if len(content_hash) == 20 else content_hash.decode()
+    return f"content-{tid.lower()}-{content_record.content_id:08x}-{content_record.index}-{content_hash.lower()}"
+
+class NusCache:
+    """
+    Persistent on-disk cache for NUS downloads (TMDs, tickets, content blobs and the cert chain).
+
+    Items are stored as one file per key. Reads refresh the file's mtime, which is used as the LRU order when the
+    total size goes over max_size.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: int = DEFAULT_MAX_SIZE):
+        self.path = path or get_cache_path("nus")
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(self.path, exist_ok=True)
+
+    def item_path(self, key: str) -> str:
+        return os.path.join(self.path, _unsafe_key_chars.sub('_', key))
+
+    def _read(self, key: str) -> Optional[bytes]:
+        item_path = self.item_path(key)
+        try:
+            with open(item_path, 'rb') as f:
+                data = f.read()
+            os.utime(item_path)
+        except OSError:
+            return None
+        return data
+
+    def peek(self, key: str) -> Optional[bytes]:
+        """Read an item without marking it as used or counting the lookup, for dry runs."""
+        try:
+            with open(self.item_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._read(key)
+        count("nus_cache.miss" if data is None else "nus_cache.hit", item=key.split("-", 1)[0])
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        item_path = self.item_path(key)
+        tmp_path = f"{item_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, item_path)
+        self._added(len(data))
+
+    def _added(self, size: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += size
+            over_limit = self.max_size is not None and self._size > self.max_size
+        if over_limit:
+            self.prune()
+
+    def fetch_file(self, key: str, download: Callable[[str], Any]) -> bytes:
+        """
+        Return the item, calling download(path) to create it first when it is missing. download must create the
+        file atomically (e.g. transfer.download_file(), which can then resume a .part file next to it).
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+        item_path = os.path.abspath(self.item_path(key))
+
+        # One download per item: threads of this process join the one in flight, other processes wait on the
+        # lock, and whoever gets it second finds the item in place instead of writing the same .part file again
+        def locked_download() -> bytes:
+            with FileLock(lock_path(item_path)):
+                data = self._read(key)
+                if data is not None:
+                    return data
+                download(item_path)
+                return self.added_file(key)
+
+        return _fetches.do(item_path, locked_download)
+
+    async def fetch_file_async(self, key: str, download: Callable[[str], Awaitable[Any]]) -> bytes:
+        """fetch_file() with an asyncio download(path), deduplicated with the threads and tasks of fetch_file()."""
+        data = await asyncio.to_thread(self.get, key)
+        if data is not None:
+            return data
+        item_path = os.path.abspath(self.item_path(key))
+
+        async def locked_download() -> bytes:
+            async with FileLock(lock_path(item_path)):
+                data = await asyncio.to_thread(self._read, key)
+                if data is not None:
+                    return data
+                await download(item_path)
+                return await asyncio.to_thread(self.added_file, key)
+
+        return await _fetches.do_async(item_path, locked_download)
+
+    def added_file(self, key: str) -> bytes:
+        """Account for an item file written directly to item_path(key) and return its content."""
+        with open(self.item_path(key), 'rb') as f:
+            data = f.read()
+        self._added(len(data))
+        return data
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.item_path(key))
+
+    def evict(self, key: str) -> None:
+        try:
+            os.remove(self.item_path(key))
+        except OSError:
+            return
+        with self._lock:
+            # Recomputed on the next addition
+            self._size = None
+
+    def items(self) -> List[CacheItem]:
+        items = []
+        with os.scandir(self.path) as it:
+            for dir_entry in it:
+                # Skip in-progress writes and resumable partial downloads
+                if not dir_entry.is_file() or dir_entry.name.endswith(('.tmp', '.part', '.validator')):
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+                items.append(CacheItem(key=dir_entry.name, size=stat.st_size, last_used=stat.st_mtime))
+        return items
+
+    def size(self) -> int:
+        return sum(item.size for item in self.items())
+
+    def prune(self, max_size: Optional[int] = None) -> List[str]:
+        """Evict least recently used items until the cache fits in max_size. Returns the evicted keys."""
+        limit = self.max_size if max_size is None else max_size
+        with self._lock:
+            items = sorted(self.items(), key=lambda item: item.last_used)
+            total = sum(item.size for item in items)
+            evicted = []
+            for item in items:
+                if limit is not None and total <= limit:
+                    break
+                try:
+                    os.remove(os.path.join(self.path, item.key))
+                except OSError:
+                    continue
+                total -= item.size
+                evicted.append(item.key)
+            self._size = total
+        return evicted
+
+    def clear(self) -> List[str]:
+        return self.prune(0)
+
+
+_default_cache = None
+_default_cache_disabled = False
+_default_cache_lock = threading.Lock()
+
+def get_default_cache() -> Optional[NusCache]:
+    """
+    Return the process-wide NUS cache used by download_entry().
+
+    The location can be set with the LIBMODMII_CACHE_DIR environment variable. Returns None if the cache was
+    disabled with set_default_cache(None) or cannot be created there.
+    """
+    global _default_cache, _default_cache_disabled
+    if _default_cache_disabled:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None and not _default_cache_disabled:
+            try:
+                _default_cache = NusCache()
+            except OSError as error:
+                # Unusable cache root (read-only, not a directory...): work without it rather than fail downloads
+                logger.warning("NUS cache disabled, cannot create it under %s: %s", get_cache_root(), error)
+                _default_cache_disabled = True
+                return None
+        return _default_cache
+
+def set_default_cache(cache: Optional[NusCache]) -> None:
+    global _default_cache, _default_cache_disabled
+    with _default_cache_lock:
+        _default_cache = cache
+        _default_cache_disabled = cache is None
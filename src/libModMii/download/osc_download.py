@@ -1,19 +1,20 @@
-import os
-import requests
+import logging
+from .transfer import download_file
+from .instrumentation import span
+
+logger = logging.getLogger(__name__)
 
 OSC_URL = 'https://hbb1.oscwii.org/api/contents/'
 
 def osc_download(database_entry, file_path):
     try:
         file_url = f"{OSC_URL}{database_entry.code1}/{database_entry.code1}.zip"
-        print(f"Downloading {database_entry.wadname} from {file_url}...")
-
-        response = requests.get(file_url)
-        response.raise_for_status()
+        logger.info("Downloading %s from %s...", database_entry.wadname, file_url)
 
-        with open(file_path, 'wb') as f:
-            f.write(response.content)
-        print('OSC download process completed')
+        # Streamed to a .part file, resumed on retry and renamed into place once complete
+        with span("osc.download"):
+            download_file(file_url, file_path)
+        logger.info("OSC download process completed")
     except Exception as error:
-        print('OSC download failed:', error)
+        logger.error("OSC download failed: %s", error)
         raise
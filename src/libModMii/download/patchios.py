@@ -0,0 +1,44 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+from .wiipy.iospatch import ES_PATCHES, patch_ios
+
+# What ModMii's patchios entries get when their name does not list the patches, e.g. "IOS60v65535(ModMii-IOS60-v6174)"
+DEFAULT_PATCHES = ("FS", "ES", "NP", "VP")
+
+# Patch list at the end of a patched IOS name, e.g. "IOS236v65535(IOS36v3351[FS-ES-NP-VP])"
+_patch_tags = re.compile(r"\[([A-Z]+(?:-[A-Z]+)*)\]\)?(?:-vWii)?$")
+
+def _name_patches(entry) -> Optional[List[str]]:
+    match = _patch_tags.search(entry.name)
+    return match.group(1).split("-") if match else None
+
+def is_patched_ios(entry) -> bool:
+    """patchios entries, and cios entries that are a plain patched IOS (e.g. IOS236) rather than a diff-built cIOS."""
+    if entry.category == "patchios":
+        return True
+    patches = _name_patches(entry)
+    return entry.category == "cios" and patches is not None and all(patch in ES_PATCHES for patch in patches)
+
+def ios_patches(entry) -> List[str]:
+    return _name_patches(entry) or list(DEFAULT_PATCHES)
+
+def _int_or_none(value) -> Optional[int]:
+    return int(value) if value not in (None, "", "unchanged") else None
+
+def patchios_build_inputs(entry, base_md5: str) -> Dict[str, Any]:
+    """Everything a patched IOS depends on, the key of the build in the artifact cache."""
+    return {
+        "type": "patchios",
+        "baseMd5": base_md5,
+        "patches": ios_patches(entry),
+        "slot": _int_or_none(entry.ciosslot),
+        "version": _int_or_none(entry.ciosversion),
+    }
+
+def buildPatchedIos(entry, output_path, base_wad_path):
+    if not os.path.exists(base_wad_path):
+        raise Exception(f"Base WAD file not found: {base_wad_path}")
+
+    return patch_ios(base_wad_path, output_path, ios_patches(entry), _int_or_none(entry.ciosslot),
+                     _int_or_none(entry.ciosversion))
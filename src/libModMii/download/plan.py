@@ -0,0 +1,158 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+import libWiiPy
+from .database import DatabaseEntry, get_database_entry
+from .nus_cache import NusCache, tmd_key, content_key, get_default_cache
+from .validation import md5_file, get_default_hash_index
+from .wiipy.nus import encrypted_content_size
+from .download import has_cached_artifact, is_built_entry
+
+@dataclass
+class PlanStep:
+    id: str
+    # "nus" (title download), "osc" (archive download), "build" (d2x cIOS/patched IOS) or "restore" (from build cache)
+    kind: str
+    path: str
+    # Entry keys this step produces or is needed for
+    entries: List[str] = field(default_factory=list)
+    dependsOn: List[str] = field(default_factory=list)
+    # Bytes left to fetch, None when unknown (no cached TMD, OSC archive size)
+    estimatedBytes: Optional[int] = None
+
+@dataclass
+class DownloadPlan:
+    # Steps in dependency order, every step comes after the steps it depends on
+    steps: List[PlanStep] = field(default_factory=list)
+    # entry key -> reason it needs no work or cannot be planned
+    skipped: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def estimatedBytes(self) -> int:
+        """Sum of the known byte estimates, see unknownSizes for steps that could not be estimated."""
+        return sum(step.estimatedBytes or 0 for step in self.steps)
+
+    @property
+    def unknownSizes(self) -> List[str]:
+        return [step.id for step in self.steps if step.kind in ("nus", "osc") and step.estimatedBytes is None]
+
+    @property
+    def builds(self) -> List[PlanStep]:
+        return [step for step in self.steps if step.kind == "build"]
+
+    def get_step(self, step_id: str) -> Optional[PlanStep]:
+        return next((step for step in self.steps if step.id == step_id), None)
+
+def _is_valid(file_path: str, md5: Optional[str], md5alt: Optional[str]) -> bool:
+    # Read-only counterpart of verify_file(): the hash index is looked up but a hash computed here is not recorded
+    if not md5 or not os.path.exists(file_path):
+        return False
+    try:
+        hash_index = get_default_hash_index()
+        hash_val = hash_index.lookup(file_path, os.stat(file_path)) if hash_index is not None else None
+        if hash_val is None:
+            hash_val = md5_file(file_path)
+    except Exception:
+        return False
+    return hash_val in (md5, md5alt)
+
+def estimate_nus_bytes(tid: str, version: Optional[int], cache: Optional[NusCache]) -> Optional[int]:
+    """Bytes left to download for a title, from its cached TMD minus the contents already cached. None if unknown."""
+    if cache is None or version is None:
+        return None
+    raw_tmd = cache.peek(tmd_key(tid, version))
+    if raw_tmd is None:
+        return None
+    tmd = libWiiPy.title.TMD()
+    tmd.load(raw_tmd)
+    return sum(
+        encrypted_content_size(record.content_size)
+        for record in tmd.content_records if content_key(tid, record) not in cache
+    )
+
+class _Planner:
+    def __init__(self, output_path: str, cache: Optional[NusCache]):
+        self.output_path = output_path
+        self.cache = cache
+        self.plan = DownloadPlan()
+        self.steps: Dict[str, PlanStep] = {}
+
+    def _add_step(self, step: PlanStep, key: str) -> PlanStep:
+        existing = self.steps.get(step.id)
+        if existing is not None:
+            if key not in existing.entries:
+                existing.entries.append(key)
+            return existing
+        step.entries.append(key)
+        self.steps[step.id] = step
+        # Dependencies are always planned before their dependents, so insertion order is a topological order
+        self.plan.steps.append(step)
+        return step
+
+    def _base_step(self, key: str, database_entry: DatabaseEntry) -> Optional[PlanStep]:
+        base_path = os.path.join(self.output_path, database_entry.basewad) + ".wad"
+        if _is_valid(base_path, database_entry.md5base, database_entry.md5basealt):
+            return None
+        tid = f"{database_entry.code1}{database_entry.code2}"
+        return self._add_step(PlanStep(
+            id=f"nus:{database_entry.basewad}.wad",
+            kind="nus",
+            path=base_path,
+            estimatedBytes=estimate_nus_bytes(tid, database_entry.version, self.cache)
+        ), key)
+
+    def add(self, key: str) -> Optional[PlanStep]:
+        try:
+            database_entry = get_database_entry(key)
+        except Exception as error:
+            self.plan.skipped[key] = str(error)
+            return None
+
+        entry_path = os.path.join(self.output_path, database_entry.wadname)
+        if _is_valid(entry_path, database_entry.md5, database_entry.md5alt):
+            self.plan.skipped[key] = "already downloaded"
+            return None
+
+        category = database_entry.category
+        if category == "ios":
+            tid = f"{database_entry.code1}{database_entry.code2}"
+            return self._add_step(PlanStep(
+                id=f"nus:{database_entry.wadname}",
+                kind="nus",
+                path=entry_path,
+                estimatedBytes=estimate_nus_bytes(tid, database_entry.version, self.cache)
+            ), key)
+        if category == "OSC":
+            return self._add_step(PlanStep(id=f"osc:{database_entry.wadname}", kind="osc", path=entry_path), key)
+        if not is_built_entry(database_entry):
+            self.plan.skipped[key] = f"unsupported category: {category}"
+            return None
+
+        if has_cached_artifact(database_entry):
+            return self._add_step(PlanStep(
+                id=f"restore:{database_entry.wadname}", kind="restore", path=entry_path, estimatedBytes=0
+            ), key)
+
+        # Every slot of a cIOS family is built straight from the base IOS WAD, basecios (the family's reference
+        # build) is not an input, so builds sharing a base only depend on that base and can run in parallel
+        base_step = self._base_step(key, database_entry)
+        return self._add_step(PlanStep(
+            id=f"build:{database_entry.wadname}",
+            kind="build",
+            path=entry_path,
+            dependsOn=[base_step.id] if base_step is not None else [],
+            estimatedBytes=0
+        ), key)
+
+def plan_downloads(entry_keys: Iterable[str], output_path: str, cache: Optional[NusCache] = None) -> DownloadPlan:
+    """
+    Dry run of download_entries(): resolve every key, expand the base IOS WAD of built entries (d2x cIOS, patched
+    IOS) and return the deduplicated steps still needed, in dependency order, with the bytes left to fetch where the
+    NUS cache knows the title's TMD. Nothing is downloaded, and no output, cache item or hash index record is
+    written or touched; the default NUS cache, build cache and hash index are only created (empty directories and
+    database) if they did not exist yet.
+    """
+    planner = _Planner(output_path, cache if cache is not None else get_default_cache())
+    for key in dict.fromkeys(entry_keys):
+        planner.add(key)
+    return planner.plan
@@ -0,0 +1,309 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Tuple
+import requests
+from .http_async import AsyncHttpClient, HttpError
+from .instrumentation import count
+
+CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = ".part"
+# Next to a .part file: the ETag or Last-Modified of the response it holds, sent back as If-Range on resume
+VALIDATOR_SUFFIX = ".validator"
+REQUEST_TIMEOUT = 60
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter: attempt n waits a random time in [0, min(max_delay, base_delay * 2**n)]."""
+    attempts: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+
+    def delays(self) -> Iterator[float]:
+        for attempt in range(self.attempts - 1):
+            yield random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+class _Retryable(Exception):
+    pass
+
+def _is_retryable_status(status: int) -> bool:
+    return status == 429 or status >= 500
+
+def part_path(file_path: str) -> str:
+    return file_path + PART_SUFFIX
+
+def validator_path(part: str) -> str:
+    return part + VALIDATOR_SUFFIX
+
+def atomic_write_bytes(file_path: str, data: bytes) -> None:
+    """Write data next to file_path and rename it in place, readers never see a partially written file."""
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _range_headers(headers: Optional[Dict[str, str]], offset: int, validator: Optional[str] = None) -> Dict[str, str]:
+    headers = dict(headers or {})
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        if validator is not None:
+            # The server sends the whole file (200) instead of the range if it changed since
+            headers["If-Range"] = validator
+    return headers
+
+def _response_validator(headers) -> Optional[str]:
+    # If-Range only takes a strong ETag or a Last-Modified date. Header names are lowercase in AsyncResponse,
+    # requests looks them up case-insensitively.
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("last-modified")
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _discard_part(part: str) -> None:
+    _remove(part)
+    _remove(validator_path(part))
+
+def _save_validator(part: str, headers) -> None:
+    validator = _response_validator(headers)
+    if validator is None:
+        _remove(validator_path(part))
+    else:
+        with open(validator_path(part), "w", encoding="utf-8") as f:
+            f.write(validator)
+
+def _resume_state(part: str, expected_size: Optional[int]) -> Tuple[int, Optional[str]]:
+    """Offset to resume part from, and the If-Range validator to send with the Range request."""
+    try:
+        offset = os.path.getsize(part)
+    except OSError:
+        return 0, None
+    try:
+        with open(validator_path(part), encoding="utf-8") as f:
+            validator = f.read().strip() or None
+    except OSError:
+        validator = None
+    # Without a validator nor an expected size, nothing tells whether the part file still matches the file on
+    # the server: appending to it could mix two versions, start over
+    if (expected_size is not None and offset > expected_size) or (expected_size is None and validator is None):
+        _discard_part(part)
+        return 0, None
+    return offset, validator
+
+def _finish_part(part: str, file_path: str) -> None:
+    os.replace(part, file_path)
+    _remove(validator_path(part))
+
+def _download_once(session, url: str, part: str, headers: Optional[Dict[str, str]],
+                   expected_size: Optional[int]) -> None:
+    offset, validator = _resume_state(part, expected_size)
+    if expected_size is not None and offset == expected_size:
+        return
+    try:
+        with session.get(url, headers=_range_headers(headers, offset, validator), stream=True,
+                         timeout=REQUEST_TIMEOUT) as response:
+            if response.status_code == 416 and offset:
+                # Nothing left to fetch past the end of the part file (If-Range matched), or the file changed on
+                # the server
+                if expected_size is None or offset == expected_size:
+                    return
+                _discard_part(part)
+                raise _Retryable(f"Range not satisfiable for {url}, restarting")
+            if _is_retryable_status(response.status_code):
+                raise _Retryable(f"HTTP {response.status_code} for {url}")
+            response.raise_for_status()
+            # 200 instead of 206: the server ignored the Range header or the file changed, start over
+            mode = "ab" if response.status_code == 206 else "wb"
+            if mode == "wb":
+                _save_validator(part, response.headers)
+            received = 0
+            try:
+                with open(part, mode) as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        received += len(chunk)
+            finally:
+                count("transfer.bytes", received, url=url)
+    except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as error:
+        raise _Retryable(str(error)) from error
+
+    if expected_size is not None and os.path.getsize(part) != expected_size:
+        raise _Retryable(f"Incomplete download of {url}: {os.path.getsize(part)} of {expected_size} bytes")
+
+def download_file(url: str, file_path: str, headers: Optional[Dict[str, str]] = None,
+                  expected_size: Optional[int] = None, retry: RetryPolicy = DEFAULT_RETRY_POLICY,
+                  session=None) -> str:
+    """
+    Download url to file_path through a .part file that is renamed in place once complete.
+
+    A .part file left by an interrupted run is resumed with an HTTP Range request, conditional (If-Range) on the
+    ETag or Last-Modified of the response it came from; without either it is only resumed when expected_size is
+    known. Connection errors, 429 and 5xx responses are retried with exponential backoff and jitter, each retry
+    resuming where the last one stopped.
+    """
+    part = part_path(file_path)
+    session = session or requests
+    delays = retry.delays()
+    while True:
+        try:
+            _download_once(session, url, part, headers, expected_size)
+            break
+        except _Retryable as error:
+            delay = next(delays, None)
+            if delay is None:
+                raise Exception(f"Download failed after {retry.attempts} attempts: {error}") from error
+            time.sleep(delay)
+    _finish_part(part, file_path)
+    return file_path
+
+def fetch_bytes(url: str, headers: Optional[Dict[str, str]] = None, expected_size: Optional[int] = None,
+                retry: RetryPolicy = DEFAULT_RETRY_POLICY, session=None) -> bytes:
+    """In-memory download(), a retry after a dropped connection only requests the missing bytes."""
+    session = session or requests
+    data = bytearray()
+    validator = None
+    delays = retry.delays()
+    while True:
+        try:
+            if validator is None and expected_size is None:
+                # Same rule as download_file(): no way to tell the bytes received so far are still current
+                del data[:]
+            try:
+                with session.get(url, headers=_range_headers(headers, len(data), validator), stream=True,
+                                 timeout=REQUEST_TIMEOUT) as response:
+                    if response.status_code == 416 and data:
+                        if expected_size is None or len(data) == expected_size:
+                            return bytes(data)
+                        del data[:]
+                        raise _Retryable(f"Range not satisfiable for {url}, restarting")
+                    if _is_retryable_status(response.status_code):
+                        raise _Retryable(f"HTTP {response.status_code} for {url}")
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        del data[:]
+                        validator = _response_validator(response.headers)
+                    received = len(data)
+                    try:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            data += chunk
+                    finally:
+                        count("transfer.bytes", len(data) - received, url=url)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as error:
+                raise _Retryable(str(error)) from error
+            if expected_size is not None and len(data) != expected_size:
+                raise _Retryable(f"Incomplete download of {url}: {len(data)} of {expected_size} bytes")
+            return bytes(data)
+        except _Retryable as error:
+            delay = next(delays, None)
+            if delay is None:
+                raise Exception(f"Download failed after {retry.attempts} attempts: {error}") from error
+            time.sleep(delay)
+
+async def _download_once_async(client: AsyncHttpClient, url: str, part: str, headers: Optional[Dict[str, str]],
+                               expected_size: Optional[int]) -> None:
+    offset, validator = _resume_state(part, expected_size)
+    if expected_size is not None and offset == expected_size:
+        return
+    try:
+        response = await client.request(url, _range_headers(headers, offset, validator))
+        if response.status == 416 and offset:
+            response.release()
+            if expected_size is None or offset == expected_size:
+                return
+            _discard_part(part)
+            raise _Retryable(f"Range not satisfiable for {url}, restarting")
+        if response.status not in (200, 206):
+            response.release()
+            if _is_retryable_status(response.status):
+                raise _Retryable(f"HTTP {response.status} for {url}")
+            raise HttpError(response.status, url)
+        if response.status != 206:
+            _save_validator(part, response.headers)
+        received = 0
+        try:
+            with open(part, "ab" if response.status == 206 else "wb") as f:
+                async for chunk in response.iter_chunks():
+                    f.write(chunk)
+                    received += len(chunk)
+        finally:
+            count("transfer.bytes", received, url=url)
+    except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError) as error:
+        raise _Retryable(str(error) or type(error).__name__) from error
+
+    if expected_size is not None and os.path.getsize(part) != expected_size:
+        raise _Retryable(f"Incomplete download of {url}: {os.path.getsize(part)} of {expected_size} bytes")
+
+async def download_file_async(client: AsyncHttpClient, url: str, file_path: str,
+                              headers: Optional[Dict[str, str]] = None, expected_size: Optional[int] = None,
+                              retry: RetryPolicy = DEFAULT_RETRY_POLICY) -> str:
+    """asyncio counterpart of download_file()."""
+    part = part_path(file_path)
+    delays = retry.delays()
+    while True:
+        try:
+            await _download_once_async(client, url, part, headers, expected_size)
+            break
+        except _Retryable as error:
+            delay = next(delays, None)
+            if delay is None:
+                raise Exception(f"Download failed after {retry.attempts} attempts: {error}") from error
+            await asyncio.sleep(delay)
+    _finish_part(part, file_path)
+    return file_path
+
+async def fetch_bytes_async(client: AsyncHttpClient, url: str, headers: Optional[Dict[str, str]] = None,
+                            expected_size: Optional[int] = None, retry: RetryPolicy = DEFAULT_RETRY_POLICY) -> bytes:
+    """asyncio counterpart of fetch_bytes()."""
+    data = bytearray()
+    validator = None
+    delays = retry.delays()
+    while True:
+        try:
+            if validator is None and expected_size is None:
+                del data[:]
+            try:
+                response = await client.request(url, _range_headers(headers, len(data), validator))
+                if response.status == 416 and data:
+                    response.release()
+                    if expected_size is None or len(data) == expected_size:
+                        return bytes(data)
+                    del data[:]
+                    raise _Retryable(f"Range not satisfiable for {url}, restarting")
+                if response.status not in (200, 206):
+                    response.release()
+                    if _is_retryable_status(response.status):
+                        raise _Retryable(f"HTTP {response.status} for {url}")
+                    raise HttpError(response.status, url)
+                if response.status != 206:
+                    del data[:]
+                    validator = _response_validator(response.headers)
+                received = len(data)
+                try:
+                    async for chunk in response.iter_chunks():
+                        data += chunk
+                finally:
+                    count("transfer.bytes", len(data) - received, url=url)
+            except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError) as error:
+                raise _Retryable(str(error) or type(error).__name__) from error
+            if expected_size is not None and len(data) != expected_size:
+                raise _Retryable(f"Incomplete download of {url}: {len(data)} of {expected_size} bytes")
+            return bytes(data)
+        except _Retryable as error:
+            delay = next(delays, None)
+            if delay is None:
+                raise Exception(f"Download failed after {retry.attempts} attempts: {error}") from error
+            await asyncio.sleep(delay)
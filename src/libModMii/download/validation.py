@@ -1,14 +1,96 @@
 import hashlib
+import logging
+import os
+import sqlite3
+import threading
 from typing import Optional
+from .cache_paths import get_cache_path, get_cache_root
+from .instrumentation import count
 
-def verify_file(file_path: str, md5: Optional[str], md5alt: Optional[str] = None) -> None:
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+class HashIndex:
+    """
+    Persistent index of (path, size, mtime_ns, md5) for files that were already hashed.
+
+    A file whose size and mtime_ns still match its record is not read again. Backed by SQLite so that several
+    processes can share it.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_cache_path("md5index.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS hashes "
+                "(path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, md5 TEXT NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def lookup(self, file_path: str, stat: os.stat_result) -> Optional[str]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT md5 FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+            ).fetchone()
+        return row[0] if row else None
+
+    def record(self, file_path: str, stat: os.stat_result, md5: str) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, md5) VALUES (?, ?, ?, ?)",
+                (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, md5)
+            )
+
+    def forget(self, file_path: str) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM hashes WHERE path = ?", (os.path.abspath(file_path),))
+
+    def prune(self) -> int:
+        """Drop records for files that no longer exist. Returns the number of removed records."""
+        with self._connect() as connection:
+            paths = [row[0] for row in connection.execute("SELECT path FROM hashes")]
+            missing = [(path,) for path in paths if not os.path.exists(path)]
+            connection.executemany("DELETE FROM hashes WHERE path = ?", missing)
+        return len(missing)
+
+
+def md5_file(file_path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    file_hash = hashlib.md5()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            file_hash.update(view[:read])
+    return file_hash.hexdigest()
+
+def get_file_md5(file_path: str, hash_index: Optional[HashIndex] = None) -> str:
+    if hash_index is None:
+        return md5_file(file_path)
+
+    stat = os.stat(file_path)
+    hash_val = hash_index.lookup(file_path, stat)
+    if hash_val is None:
+        count("hash_index.miss", bytes=stat.st_size)
+        hash_val = md5_file(file_path)
+        hash_index.record(file_path, stat, hash_val)
+    else:
+        count("hash_index.hit")
+    return hash_val
+
+def verify_file(file_path: str, md5: Optional[str], md5alt: Optional[str] = None,
+                hash_index: Optional[HashIndex] = None) -> None:
     if not md5 and not md5alt:
         raise Exception(f"No MD5 hash provided for file verification: {file_path}")
 
-    with open(file_path, "rb") as f:
-        file_buffer = f.read()
-
-    hash_val = hashlib.md5(file_buffer).hexdigest()
+    hash_val = get_file_md5(file_path, hash_index)
     if hash_val == md5:
         return
 
@@ -18,3 +100,28 @@ def verify_file(file_path: str, md5: Optional[str], md5alt: Optional[str] = None
     raise Exception(
         f"File verification failed for {file_path}, expected MD5: {md5}, got: {hash_val}, alternative MD5: {md5alt}"
     )
+
+
+_default_hash_index = None
+_default_hash_index_disabled = False
+_default_hash_index_lock = threading.Lock()
+
+def get_default_hash_index() -> Optional[HashIndex]:
+    global _default_hash_index, _default_hash_index_disabled
+    if _default_hash_index_disabled:
+        return None
+    with _default_hash_index_lock:
+        if _default_hash_index is None and not _default_hash_index_disabled:
+            try:
+                _default_hash_index = HashIndex()
+            except (OSError, sqlite3.Error) as error:
+                logger.warning("Hash index disabled, cannot create it under %s: %s", get_cache_root(), error)
+                _default_hash_index_disabled = True
+                return None
+        return _default_hash_index
+
+def set_default_hash_index(hash_index: Optional[HashIndex]) -> None:
+    global _default_hash_index, _default_hash_index_disabled
+    with _default_hash_index_lock:
+        _default_hash_index = hash_index
+        _default_hash_index_disabled = hash_index is None
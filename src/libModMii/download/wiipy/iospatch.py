@@ -0,0 +1,92 @@
+# "commands/title/iospatcher.py" from WiiPy by NinjaCheetah
+# https://github.com/NinjaCheetah/WiiPy
+
+import logging
+import pathlib
+from typing import Iterable, Optional
+import libWiiPy
+from ..instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# Patch name -> (sequence to find in the ES module, offset into the sequence, replacement), the same patches as
+# libWiiPy.title.IOSPatcher
+ES_PATCHES = {
+    # Trucha bug, ES accepts fakesigned TMDs and tickets
+    "FS": [(b'\x20\x07\x23\xa2', 1, b'\x00'), (b'\x20\x07\x4b\x0b', 1, b'\x00')],
+    # ES_Identify
+    "ES": [(b'\x28\x03\xd1\x23', 2, b'\x00\x00')],
+    # /dev/flash access (NAND permissions)
+    "NP": [(b'\x42\x8b\xd0\x01\x25\x66', 2, b'\xe0')],
+    # Version downgrading
+    "VP": [(b'\xd2\x01\x4e\x56', 0, b'\xe0')],
+}
+
+# IOS live under 00000001 on the Wii and under 00000007 in vWii
+_IOS_TID_HIGH = ("00000001", "00000007")
+
+def _find_es_module(title: libWiiPy.title.Title):
+    for record in title.content.content_records:
+        dec_content = title.get_content_by_index(record.index)
+        if dec_content.find(b'\x45\x53\x3A') != -1:  # "ES:"
+            return record.index, dec_content
+    raise Exception("ES module could not be found! Please ensure that this is an intact copy of an IOS.")
+
+def _apply_es_patches(dec_content: bytearray, patches: Iterable[str]) -> int:
+    patch_count = 0
+    for patch in patches:
+        for sequence, offset, new_data in ES_PATCHES[patch]:
+            start_offset = dec_content.find(sequence)
+            if start_offset != -1:
+                dec_content[start_offset + offset:start_offset + offset + len(new_data)] = new_data
+                patch_count += 1
+    return patch_count
+
+def patch_ios(
+    base,
+    output,
+    patches: Iterable[str] = ("FS", "ES", "NP", "VP"),
+    slot: Optional[int] = None,
+    version: Optional[int] = None
+) -> int:
+    """
+    Apply ES patches to an IOS WAD and optionally move it to another slot and/or version, without an external
+    patcher. The ES module is decrypted once, patched in place and re-encrypted once. Returns the number of patches
+    applied.
+    """
+    patches = list(patches)
+    unknown = [patch for patch in patches if patch not in ES_PATCHES]
+    if unknown:
+        raise Exception(f"Unsupported IOS patches: {', '.join(unknown)}")
+
+    with span("build.load"):
+        title = libWiiPy.title.Title()
+        title.load_wad(pathlib.Path(base).read_bytes())
+
+    tid = title.tmd.title_id
+    if tid[:8] not in _IOS_TID_HIGH or tid[8:] in ("00000001", "00000002"):
+        raise ValueError("This WAD does not appear to contain an IOS! Patching cannot continue.")
+
+    if version is not None:
+        title.set_title_version(version)
+    if slot is not None:
+        if not 3 <= slot <= 255:
+            raise ValueError(f"The specified slot \"{slot}\" is not valid!")
+        title.set_title_id(tid[:-2] + f"{slot:02X}")
+
+    with span("build.patch"):
+        es_index, dec_content = _find_es_module(title)
+        dec_content = bytearray(dec_content)
+        patch_count = _apply_es_patches(dec_content, patches)
+        if patch_count:
+            title.set_content(dec_content, es_index)
+
+    if patch_count or version is not None or slot is not None:
+        with span("build.fakesign"):
+            title.fakesign()
+
+    with span("build.dump"):
+        pathlib.Path(output).write_bytes(title.dump_wad())
+    logger.info("Applied %s patches to IOS%s, saved as \"%s\"", patch_count, int(tid[8:], 16),
+                pathlib.Path(output).name)
+    return patch_count
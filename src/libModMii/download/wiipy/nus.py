@@ -1,10 +1,97 @@
 # "commands/title/nus.py" from WiiPy by NinjaCheetah
 # https://github.com/NinjaCheetah/WiiPy
 
+import contextvars
+import hashlib
 import pathlib
+from concurrent.futures import ThreadPoolExecutor
 import libWiiPy
+import requests
+from ..nus_cache import tmd_key, ticket_key, content_key, CERT_CHAIN_KEY
+from ..transfer import atomic_write_bytes, download_file, fetch_bytes
+from ..instrumentation import span
 
-def nus_title_download(tid, version=None, output=None, wad=None, wii=False, endpoint=None, verbose=True):
+NUS_ENDPOINT = "http://nus.cdn.shop.wii.com/ccs/download/"
+NUS_ENDPOINT_WIIU = "http://ccs.cdn.wup.shop.nintendo.net/ccs/download/"
+NUS_HEADERS = {"User-Agent": "wii libnup/1.0"}
+
+
+def encrypted_content_size(content_size):
+    # Contents are served encrypted, padded to the AES block size
+    return (content_size + 15) & ~15
+
+
+def strip_tmd(raw_tmd):
+    # Drop the certificates appended to the TMD served by the NUS, like libWiiPy.title.download_tmd()
+    tmd = libWiiPy.title.TMD()
+    tmd.load(raw_tmd)
+    return tmd.dump()
+
+
+def strip_ticket(cetk):
+    ticket = libWiiPy.title.Ticket()
+    ticket.load(cetk)
+    return ticket.dump()
+
+
+def assemble_cert_chain(tmd, cetk):
+    # Same layout as libWiiPy.title.download_cert_chain(), from the System Menu 4.3U TMD and ticket
+    return cetk[0x2A4 + 768:] + tmd[0x328:0x328 + 768] + cetk[0x2A4:0x2A4 + 768]
+
+
+def _nus_get(url):
+    # libWiiPy reports missing titles and tickets with a ValueError, keep that contract
+    try:
+        return fetch_bytes(url, NUS_HEADERS)
+    except requests.HTTPError as error:
+        raise ValueError(f"The NUS returned an error for {url}: {error}") from error
+
+
+def _fetch_content(cache, tid, content_record, endpoint_url):
+    # Fetched directly instead of through libWiiPy so that a dropped connection is retried and resumed with a Range
+    # request. With a cache, the content is downloaded straight into it and a .part file survives between runs.
+    url = f"{endpoint_url}{tid}/{content_record.content_id:08x}"
+    expected_size = encrypted_content_size(content_record.content_size)
+    if cache is None:
+        return fetch_bytes(url, NUS_HEADERS, expected_size)
+    return cache.fetch_file(content_key(tid, content_record),
+                            lambda path: download_file(url, path, NUS_HEADERS, expected_size))
+
+
+def _content_matches(content_record, data, title_key):
+    # Cached blobs are checked against the TMD before use, a corrupt one would otherwise end up in every WAD built
+    # from the cache. Without a title key only the size can be checked.
+    if len(data) != encrypted_content_size(content_record.content_size):
+        return False
+    if title_key is None:
+        return True
+    content_hash = content_record.content_hash
+    if isinstance(content_hash, bytes):
+        content_hash = content_hash.hex() if len(content_hash) == 20 else content_hash.decode()
+    dec_content = libWiiPy.title.decrypt_content(data, title_key, content_record.index, content_record.content_size)
+    return hashlib.sha1(dec_content).hexdigest() == content_hash.lower()
+
+
+def _evict_title(cache, tid, title_version, content_record):
+    # The content, and the TMD and ticket it was checked with, one of them is corrupt
+    for key in (content_key(tid, content_record), tmd_key(tid, title_version), ticket_key(tid)):
+        cache.evict(key)
+
+
+def _cached_download(cache, key, fetch):
+    # Serve the item from the cache when possible, otherwise fetch it from the NUS and store it.
+    if cache is not None and key is not None:
+        data = cache.get(key)
+        if data is not None:
+            return data
+    data = fetch()
+    if cache is not None and key is not None:
+        cache.put(key, data)
+    return data
+
+
+def nus_title_download(tid, version=None, output=None, wad=None, wii=False, endpoint=None, verbose=True, cache=None,
+                       max_workers=1):
     title_version = None
     wad_file = None
     output_dir = None
@@ -47,86 +134,128 @@ def nus_title_download(tid, version=None, output=None, wad=None, wii=False, endp
         else:
             print(f"Downloading title {tid} vLatest, please wait...")
         print(" - Downloading and parsing TMD...")
+    # Everything is fetched with retries instead of libWiiPy's single-shot requests.
+    endpoint_url = endpoint_override or (NUS_ENDPOINT_WIIU if wiiu_nus_enabled else NUS_ENDPOINT)
     # Download a specific TMD version if a version was specified, otherwise just download the latest TMD.
-    if title_version is not None:
-        title.load_tmd(libWiiPy.title.download_tmd(tid, title_version, wiiu_endpoint=wiiu_nus_enabled,
-                                                   endpoint_override=endpoint_override))
-    else:
-        title.load_tmd(libWiiPy.title.download_tmd(tid, wiiu_endpoint=wiiu_nus_enabled,
-                                                   endpoint_override=endpoint_override))
-        title_version = title.tmd.title_version
+    with span("nus.tmd", tid=tid):
+        if title_version is not None:
+            title.load_tmd(_cached_download(cache, tmd_key(tid, title_version),
+                                            lambda: strip_tmd(_nus_get(f"{endpoint_url}{tid}/tmd.{title_version}"))))
+        else:
+            title.load_tmd(strip_tmd(_nus_get(f"{endpoint_url}{tid}/tmd")))
+            title_version = title.tmd.title_version
     # Write out the TMD to a file.
     if output_dir is not None:
-        output_dir.joinpath(f"tmd.{title_version}").write_bytes(title.tmd.dump())
+        atomic_write_bytes(str(output_dir.joinpath(f"tmd.{title_version}")), title.tmd.dump())
+
+    # Build the fetchers for everything that only depends on the TMD. With max_workers > 1 they are all submitted to
+    # a thread pool right away and each fetcher becomes the matching future's result(), so the code below still
+    # consumes them in a fixed order. Each fetcher runs in a copy of the caller's context, so that its
+    # instrumentation events keep the caller's attributes.
+    title.load_content_records()
+    content_records = title.tmd.content_records
+    fetch_ticket = lambda: _cached_download(cache, ticket_key(tid),
+                                            lambda: strip_ticket(_nus_get(f"{endpoint_url}{tid}/cetk")))
+    fetch_cert_chain = lambda: _cached_download(cache, CERT_CHAIN_KEY,
+                                                lambda: assemble_cert_chain(
+                                                    _nus_get(f"{endpoint_url}0000000100000002/tmd.513"),
+                                                    _nus_get(f"{endpoint_url}0000000100000002/cetk")))
+    fetch_contents = [
+        lambda record=record: _fetch_content(cache, tid, record, endpoint_url)
+        for record in content_records
+    ]
+    executor = None
+    if max_workers is not None and max_workers > 1:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        submit = lambda fetch: executor.submit(contextvars.copy_context().run, fetch).result
+        fetch_ticket = submit(fetch_ticket)
+        if wad_file is not None:
+            fetch_cert_chain = submit(fetch_cert_chain)
+        fetch_contents = [submit(fetch) for fetch in fetch_contents]
 
-    # Download the ticket, if we can.
-    if verbose:
-        print(" - Downloading and parsing Ticket...")
     try:
-        title.load_ticket(libWiiPy.title.download_ticket(tid, wiiu_endpoint=wiiu_nus_enabled,
-                                                         endpoint_override=endpoint_override))
-        can_decrypt = True
-        if output_dir is not None:
-            output_dir.joinpath("tik").write_bytes(title.ticket.dump())
-    except ValueError:
-        # If libWiiPy returns an error, then no ticket is available. Log this, and disable options requiring a
-        # ticket so that they aren't attempted later.
+        # Download the ticket, if we can.
         if verbose:
-            print("  - No Ticket is available!")
-        if wad_file is not None and output_dir is None:
+            print(" - Downloading and parsing Ticket...")
+        try:
+            with span("nus.ticket"):
+                title.load_ticket(fetch_ticket())
+            can_decrypt = True
+            if output_dir is not None:
+                atomic_write_bytes(str(output_dir.joinpath("tik")), title.ticket.dump())
+        except ValueError:
+            # If libWiiPy returns an error, then no ticket is available. Log this, and disable options requiring a
+            # ticket so that they aren't attempted later.
             if verbose:
-                print("--wad was passed, but this title has no common ticket and cannot be packed into a WAD!")
-
-    # Load the content records from the TMD, and begin iterating over the records.
-    title.load_content_records()
-    content_list = []
-    for content in range(len(title.tmd.content_records)):
-        # Generate the content file name by converting the Content ID to hex and then removing the 0x.
-        content_file_name = hex(title.tmd.content_records[content].content_id)[2:]
-        while len(content_file_name) < 8:
-            content_file_name = "0" + content_file_name
-        if verbose:
-            print(f" - Downloading content {content + 1} of {len(title.tmd.content_records)} "
-                  f"(Content ID: {title.tmd.content_records[content].content_id}, "
-                  f"Size: {title.tmd.content_records[content].content_size} bytes)...")
-        content_list.append(libWiiPy.title.download_content(tid, title.tmd.content_records[content].content_id,
-                                                            wiiu_endpoint=wiiu_nus_enabled,
-                                                            endpoint_override=endpoint_override))
-        if verbose:
-            print("   - Done!")
-        # If we're supposed to be outputting to a folder, then write these files out.
-        if output_dir is not None:
-            output_dir.joinpath(content_file_name).write_bytes(content_list[content])
-    title.content.content_list = content_list
+                print("  - No Ticket is available!")
+            if wad_file is not None and output_dir is None:
+                if verbose:
+                    print("--wad was passed, but this title has no common ticket and cannot be packed into a WAD!")
 
-    # Try to decrypt the contents for this title if a ticket was available.
-    if output_dir is not None:
-        if can_decrypt is True:
+        # Iterate over the content records loaded from the TMD.
+        content_list = []
+        with span("nus.contents", contents=len(title.tmd.content_records)) as contents_span:
             for content in range(len(title.tmd.content_records)):
+                # Generate the content file name by converting the Content ID to hex and then removing the 0x.
+                content_file_name = hex(title.tmd.content_records[content].content_id)[2:]
+                while len(content_file_name) < 8:
+                    content_file_name = "0" + content_file_name
                 if verbose:
-                    print(f" - Decrypting content {content + 1} of {len(title.tmd.content_records)} "
-                          f"(Content ID: {title.tmd.content_records[content].content_id})...")
-                dec_content = title.get_content_by_index(content)
-                content_file_name = f"{title.tmd.content_records[content].content_id:08X}".lower() + ".app"
-                output_dir.joinpath(content_file_name).write_bytes(dec_content)
-        else:
-            if verbose:
-                print("Title has no Ticket, so content will not be decrypted!")
+                    print(f" - Downloading content {content + 1} of {len(title.tmd.content_records)} "
+                          f"(Content ID: {title.tmd.content_records[content].content_id}, "
+                          f"Size: {title.tmd.content_records[content].content_size} bytes)...")
+                data = fetch_contents[content]()
+                if cache is not None:
+                    record = title.tmd.content_records[content]
+                    title_key = title.ticket.get_title_key() if can_decrypt else None
+                    if not _content_matches(record, data, title_key):
+                        # Fetch it from the NUS again, once
+                        cache.evict(content_key(tid, record))
+                        data = _fetch_content(cache, tid, record, endpoint_url)
+                        if not _content_matches(record, data, title_key):
+                            _evict_title(cache, tid, title_version, record)
+                            raise ValueError(f"Content {record.content_id:08x} of {tid} does not match its TMD")
+                content_list.append(data)
+                if verbose:
+                    print("   - Done!")
+                # If we're supposed to be outputting to a folder, then write these files out.
+                if output_dir is not None:
+                    atomic_write_bytes(str(output_dir.joinpath(content_file_name)), content_list[content])
+            contents_span.set(bytes=sum(len(data) for data in content_list))
+        title.content.content_list = content_list
 
-    # If wad was passed, pack a WAD and output that.
-    if wad_file is not None:
-        # Get the WAD certificate chain.
-        if verbose:
-            print(" - Building certificate...")
-        title.load_cert_chain(libWiiPy.title.download_cert_chain(wiiu_endpoint=wiiu_nus_enabled,
-                                                                 endpoint_override=endpoint_override))
-        # Ensure that the path ends in .wad, and add that if it doesn't.
-        if verbose:
-            print("Packing WAD...")
-        if wad_file.suffix != ".wad":
-            wad_file = wad_file.with_suffix(".wad")
-        # Have libWiiPy dump the WAD, and write that data out.
-        pathlib.Path(wad_file).write_bytes(title.dump_wad())
+        # Try to decrypt the contents for this title if a ticket was available.
+        if output_dir is not None:
+            if can_decrypt is True:
+                for content in range(len(title.tmd.content_records)):
+                    if verbose:
+                        print(f" - Decrypting content {content + 1} of {len(title.tmd.content_records)} "
+                              f"(Content ID: {title.tmd.content_records[content].content_id})...")
+                    dec_content = title.get_content_by_index(content)
+                    content_file_name = f"{title.tmd.content_records[content].content_id:08X}".lower() + ".app"
+                    atomic_write_bytes(str(output_dir.joinpath(content_file_name)), dec_content)
+            else:
+                if verbose:
+                    print("Title has no Ticket, so content will not be decrypted!")
+
+        # If wad was passed, pack a WAD and output that.
+        if wad_file is not None:
+            # Get the WAD certificate chain.
+            if verbose:
+                print(" - Building certificate...")
+            with span("nus.cert_chain"):
+                title.load_cert_chain(fetch_cert_chain())
+            # Ensure that the path ends in .wad, and add that if it doesn't.
+            if verbose:
+                print("Packing WAD...")
+            if wad_file.suffix != ".wad":
+                wad_file = wad_file.with_suffix(".wad")
+            # Have libWiiPy dump the WAD, and write that data out. The WAD only appears once it is complete.
+            with span("nus.pack"):
+                atomic_write_bytes(str(wad_file), title.dump_wad())
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
 
     if verbose:
         print(f"Downloaded title with Title ID \"{tid}\"!")
@@ -1,2 +1,4 @@
 # syscheck package
 from .syscheck_updater import *
+from .batch import analyse_many, SyscheckBatchResult
+from .analysis_cache import AnalysisCache, get_default_analysis_cache, set_default_analysis_cache
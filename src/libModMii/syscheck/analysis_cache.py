@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+from .rules import SyscheckRules
+from .translation import KeywordTranslator, get_translator
+
+DEFAULT_MAX_ENTRIES = 1024
+
+# "Report generated on 2025/07/30.", "Rapport genere le 2025/07/30." - changes on every SysCheck run
+_report_date_line = re.compile(r'\D*\d{4}/\d{2}/\d{2}\.?')
+
+def normalize_report(data: str) -> str:
+    """
+    Strip what differs between two runs of SysCheck on the same console: BOM, line endings, trailing
+    whitespace, blank lines and the trailing report date.
+    """
+    lines = [line.rstrip() for line in data.lstrip('\ufeff').splitlines()]
+    lines = [line for line in lines if line]
+    if lines and _report_date_line.fullmatch(lines[-1]):
+        lines.pop()
+    return '\n'.join(lines)
+
+def analysis_key(data: str, activeIOS: bool, extraProtection: bool, rules: SyscheckRules,
+                 translator: Optional[KeywordTranslator] = None) -> str:
+    """
+    Cache key of the analysis of normalize_report(data), get_syscheck_analysis() analyses the normalized report so
+    that reports with the same key get the same result.
+    """
+    translator = translator or get_translator()
+    digest = hashlib.sha256(normalize_report(data).encode('utf-8', errors='surrogatepass')).hexdigest()
+    return (f'{digest}-{int(activeIOS)}{int(extraProtection)}-r{rules.version}-{rules.latestd2xVersion}'
+            f'-{rules.fingerprint}-t{translator.version}')
+
+class AnalysisCache:
+    """
+    LRU cache of get_syscheck_analysis() results.
+
+    Keeps at most max_entries results in memory. With a path, results are also stored in a SQLite file so
+    they survive restarts and can be shared by several processes.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS analyses "
+                    "(key TEXT PRIMARY KEY, result TEXT NOT NULL, last_used REAL NOT NULL)"
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _remember(self, key: str, result: List[str]) -> None:
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                return list(result)
+        if not self.path:
+            return None
+
+        with self._connect() as connection:
+            row = connection.execute("SELECT result FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (time.time(), key))
+        result = json.loads(row[0])
+        self._remember(key, result)
+        return list(result)
+
+    def put(self, key: str, result: List[str]) -> None:
+        result = list(result)
+        self._remember(key, result)
+        if self.path:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO analyses (key, result, last_used) VALUES (?, ?, ?)",
+                    (key, json.dumps(result), time.time())
+                )
+
+    def prune(self, max_entries: Optional[int] = None) -> int:
+        """Keep the max_entries most recently used results on disk. Returns the number of removed results."""
+        if not self.path:
+            return 0
+        max_entries = self.max_entries if max_entries is None else max_entries
+        with self._connect() as connection:
+            removed = connection.execute(
+                "DELETE FROM analyses WHERE key NOT IN "
+                "(SELECT key FROM analyses ORDER BY last_used DESC LIMIT ?)",
+                (max_entries,)
+            ).rowcount
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            with self._connect() as connection:
+                connection.execute("DELETE FROM analyses")
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_analysis_cache() -> Optional[AnalysisCache]:
+    return _default_cache
+
+def set_default_analysis_cache(cache: Optional[AnalysisCache]) -> None:
+    """Enable result caching for get_syscheck_analysis(), None (the default) disables it."""
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
@@ -0,0 +1,87 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from .rules import SyscheckRules, load_syscheck_rules, set_syscheck_rules
+from .syscheck_updater import get_syscheck_analysis
+
+DEFAULT_CHUNK_SIZE = 64
+
+ReportSource = Union[str, os.PathLike]
+
+@dataclass
+class SyscheckBatchResult:
+    index: int
+    # File path the report was read from, None when the report text was passed directly
+    path: Optional[str]
+    result: Optional[list] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def _init_worker(rules_path: Optional[str]) -> None:
+    if rules_path:
+        set_syscheck_rules(load_syscheck_rules(rules_path))
+
+def _analyse_chunk(chunk: List[Tuple[int, ReportSource, bool]], activeIOS: bool, extraProtection: bool,
+                   rules: Optional[SyscheckRules] = None) -> List[SyscheckBatchResult]:
+    results = []
+    for index, source, is_path in chunk:
+        path = os.fspath(source) if is_path else None
+        item = SyscheckBatchResult(index=index, path=path)
+        try:
+            if is_path:
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    data = f.read()
+            else:
+                data = source
+            item.result = get_syscheck_analysis(data, activeIOS=activeIOS, extraProtection=extraProtection,
+                                                rules=rules)
+        except Exception as error:
+            item.error = error
+        results.append(item)
+    return results
+
+def _chunks(reports: Iterable[ReportSource], from_files: bool,
+            chunk_size: int) -> Iterator[List[Tuple[int, ReportSource, bool]]]:
+    items = ((index, source, from_files or isinstance(source, os.PathLike)) for index, source in enumerate(reports))
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def analyse_many(reports: Iterable[ReportSource], workers: Optional[int] = None, activeIOS: bool = False,
+                 extraProtection: bool = False, from_files: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 rules_path: Optional[str] = None) -> Iterator[SyscheckBatchResult]:
+    """
+    Run get_syscheck_analysis() over many reports on a process pool, yielding results in input order.
+
+    reports may be report texts or file paths (os.PathLike items, or any item when from_files is True); files are
+    read inside the workers. Only a bounded number of chunks is in flight at a time, so memory stays flat for any
+    corpus size. Errors (SyscheckError, CustomError, unreadable files...) are returned on the result instead of
+    stopping the batch. workers=1 runs everything in the calling process.
+    """
+    chunks = _chunks(reports, from_files, chunk_size)
+
+    if workers == 1:
+        # Passed down explicitly: the process-wide rules must not change while this generator is suspended
+        rules = load_syscheck_rules(rules_path) if rules_path else None
+        for chunk in chunks:
+            yield from _analyse_chunk(chunk, activeIOS, extraProtection, rules)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rules_path,)) as executor:
+        max_in_flight = 2 * workers
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_analyse_chunk, chunk, activeIOS, extraProtection))
+            if len(pending) >= max_in_flight:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
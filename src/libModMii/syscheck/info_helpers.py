@@ -4,11 +4,25 @@ from typing import Optional
 class CustomError(Exception):
     pass
 
+def is_region_line(line: str) -> bool:
+    return line.strip().lower().startswith('region:')
+
+def is_hbc_line(line: str) -> bool:
+    return 'Homebrew Channel' in line
+
+def is_system_menu_line(line: str) -> bool:
+    return 'System Menu' in line
+
+def is_console_type_line(line: str) -> bool:
+    return 'Console Type' in line
+
 def get_console_region(data: str) -> Optional[str]:
-    region_line = next((line for line in data.split('\n') if line.strip().lower().startswith('region:')), None)
+    region_line = next((line for line in data.split('\n') if is_region_line(line)), None)
     if not region_line:
         return None
+    return parse_console_region(region_line)
 
+def parse_console_region(region_line: str) -> Optional[str]:
     region = region_line.split(':', 1)[1].strip().upper()
 
     if region == 'PAL':
@@ -35,18 +49,22 @@ def get_region_short_code(region: str) -> str:
         return region
 
 def get_hbc_version(data: str) -> Optional[str]:
-    hbc_line = next((line for line in data.split('\n') if 'Homebrew Channel' in line), None)
+    hbc_line = next((line for line in data.split('\n') if is_hbc_line(line)), None)
     if not hbc_line:
         return None
+    return parse_hbc_version(hbc_line)
 
+def parse_hbc_version(hbc_line: str) -> Optional[str]:
     match = re.search(r'Homebrew Channel\s+([0-9.]+)', hbc_line)
     return match.group(1) if match else None
 
 def get_system_menu_version(data: str) -> Optional[str]:
-    system_menu_line = next((line for line in data.split('\n') if 'System Menu' in line), None)
+    system_menu_line = next((line for line in data.split('\n') if is_system_menu_line(line)), None)
     if not system_menu_line:
         return None
+    return parse_system_menu_version(system_menu_line)
 
+def parse_system_menu_version(system_menu_line: str) -> Optional[str]:
     version = re.sub(r'^.*System Menu\s*', '', system_menu_line)
     version = version.strip().replace(',', '')
     return version or None
@@ -81,9 +99,11 @@ def get_latest_sm_version(data: dict[str, object]) -> str:
         return data['firmware']
 
 def get_console_type(data: str) -> Optional[str]:
-    console_type_line = next((line for line in data.split('\n') if 'Console Type' in line), None)
+    console_type_line = next((line for line in data.split('\n') if is_console_type_line(line)), None)
     if not console_type_line:
         return None
+    return parse_console_type(console_type_line)
 
+def parse_console_type(console_type_line: str) -> Optional[str]:
     console_type = console_type_line.split(':', 1)[1].strip()
     return console_type
@@ -0,0 +1,78 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from . import info_helpers as info
+
+# "IOS249[56] (rev 65535, Info: d2x-v11beta3): Trucha Bug, NAND Access"
+_ios_line = re.compile(r'(?P<name>v?IOS\d+(?:\[\d+\])?) \(rev (?P<revision>\d+)(?:, Info:\s*(?P<info>[^)]*))?\)(?P<tail>.*)')
+# "BC v6", "MIOS v10 (DIOS MIOS 2.0)"
+_component_line = re.compile(r'(?P<name>BC|MIOS) (?P<value>.*)')
+
+@dataclass(frozen=True)
+class IOSRecord:
+    name: str
+    revision: int
+    info: Optional[str]
+    # Text after "): ", empty when the line has no patch list (e.g. "IOS60 (rev 65535, Info: ...)")
+    patches: str
+
+@dataclass
+class SyscheckReport:
+    data: str
+    region: Optional[str] = None
+    hbcVersion: Optional[str] = None
+    systemMenuVersion: Optional[str] = None
+    consoleType: Optional[str] = None
+    ios: Dict[str, IOSRecord] = field(default_factory=dict)
+    components: Dict[str, str] = field(default_factory=dict)
+
+def _parse_ios_line(line: str) -> Optional[IOSRecord]:
+    match = _ios_line.match(line)
+    if not match:
+        return None
+    tail = match.group('tail')
+    return IOSRecord(
+        name=match.group('name'),
+        revision=int(match.group('revision')),
+        info=match.group('info'),
+        patches=tail[2:] if tail.startswith(': ') else tail
+    )
+
+def parse_syscheck_report(data: str) -> SyscheckReport:
+    """
+    Tokenize an (already translated) SysCheck report in a single pass.
+
+    Header fields keep the "first matching line wins" behaviour of the info helpers; IOS lines are indexed by
+    their slot name ("IOS58", "vIOS80", "IOS249[56]").
+    """
+    report = SyscheckReport(data=data)
+    region_line = hbc_line = system_menu_line = console_type_line = None
+
+    for line in data.split('\n'):
+        if line.startswith('IOS') or line.startswith('vIOS'):
+            record = _parse_ios_line(line)
+            if record:
+                report.ios.setdefault(record.name, record)
+        elif line.startswith('BC') or line.startswith('MIOS'):
+            match = _component_line.match(line)
+            if match:
+                report.components.setdefault(match.group('name'), match.group('value'))
+
+        if region_line is None and info.is_region_line(line):
+            region_line = line
+        if hbc_line is None and info.is_hbc_line(line):
+            hbc_line = line
+        if system_menu_line is None and info.is_system_menu_line(line):
+            system_menu_line = line
+        if console_type_line is None and info.is_console_type_line(line):
+            console_type_line = line
+
+    if region_line:
+        report.region = info.parse_console_region(region_line)
+    if hbc_line:
+        report.hbcVersion = info.parse_hbc_version(hbc_line)
+    if system_menu_line:
+        report.systemMenuVersion = info.parse_system_menu_version(system_menu_line)
+    if console_type_line:
+        report.consoleType = info.parse_console_type(console_type_line)
+    return report
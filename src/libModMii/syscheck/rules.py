@@ -0,0 +1,118 @@
+import hashlib
+import json
+import importlib.resources
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from .report_parser import SyscheckReport
+
+# Rule tables for the SysCheck checks. New IOS revisions or d2x releases only need an edit of
+# assets/syscheck_rules.json (or a custom file passed to load_syscheck_rules()).
+SYSCHECK_RULES = 'syscheck_rules.json'
+
+_ANY = object()
+
+@dataclass(frozen=True)
+class _Expectation:
+    revision: object
+    info: object
+    patches: object
+
+    def matches(self, record) -> bool:
+        return ((self.revision is _ANY or record.revision == self.revision) and
+                (self.info is _ANY or record.info == self.info) and
+                (self.patches is _ANY or record.patches == self.patches))
+
+@dataclass(frozen=True)
+class SyscheckCheck:
+    ios: str
+    # All alternatives of the check merged by slot, so a check costs one dict lookup per slot it mentions
+    slots: Tuple[Tuple[str, Tuple[_Expectation, ...]], ...]
+    components: Tuple[Tuple[str, str], ...]
+    regions: Optional[Tuple[str, ...]] = None
+
+    def applies_to(self, region: str) -> bool:
+        return self.regions is None or region.upper() in self.regions
+
+    def is_satisfied(self, report: SyscheckReport) -> bool:
+        for slot, expectations in self.slots:
+            record = report.ios.get(slot)
+            if record is not None and any(expectation.matches(record) for expectation in expectations):
+                return True
+        return any(report.components.get(name) == value for name, value in self.components)
+
+@dataclass(frozen=True)
+class D2XCheck:
+    ios: str
+    slot: str
+
+@dataclass(frozen=True)
+class SyscheckRules:
+    version: int
+    latestd2xVersion: str
+    d2x: Dict[str, Tuple[D2XCheck, ...]]
+    activeIOS: Dict[str, Tuple[SyscheckCheck, ...]]
+    extraProtection: Tuple[SyscheckCheck, ...]
+    # Identifies the rule table it was compiled from, edits that keep the same version included
+    fingerprint: str = ''
+
+def _compile_check(check: dict) -> SyscheckCheck:
+    slots: Dict[str, List[_Expectation]] = {}
+    components = []
+    for expected in check['expected']:
+        if 'component' in expected:
+            components.append((expected['component'], expected['value']))
+            continue
+        slots.setdefault(expected['slot'], []).append(_Expectation(
+            revision=expected.get('revision', _ANY),
+            info=expected.get('info', _ANY),
+            patches=expected.get('patches', _ANY)
+        ))
+    regions = tuple(region.upper() for region in check['regions']) if 'regions' in check else None
+    return SyscheckCheck(
+        ios=check['ios'],
+        slots=tuple((slot, tuple(expectations)) for slot, expectations in slots.items()),
+        components=tuple(components),
+        regions=regions
+    )
+
+def compile_syscheck_rules(rules: dict) -> SyscheckRules:
+    return SyscheckRules(
+        version=rules['version'],
+        latestd2xVersion=rules['latestd2xVersion'],
+        d2x={
+            console_type: tuple(D2XCheck(ios=check['ios'], slot=check['slot']) for check in checks)
+            for console_type, checks in rules['d2x'].items()
+        },
+        activeIOS={
+            console_type: tuple(_compile_check(check) for check in checks)
+            for console_type, checks in rules['activeIOS'].items()
+        },
+        extraProtection=tuple(_compile_check(check) for check in rules['extraProtection']),
+        fingerprint=hashlib.sha1(json.dumps(rules, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:12]
+    )
+
+def load_syscheck_rules(path: Optional[str] = None) -> SyscheckRules:
+    if path is None:
+        with importlib.resources.files('libModMii.assets').joinpath(SYSCHECK_RULES).open('r', encoding='utf-8') as f:
+            return compile_syscheck_rules(json.load(f))
+    with open(path, 'r', encoding='utf-8') as f:
+        return compile_syscheck_rules(json.load(f))
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+def get_syscheck_rules() -> SyscheckRules:
+    global _rules
+    if _rules is None:
+        with _rules_lock:
+            if _rules is None:
+                _rules = load_syscheck_rules()
+    return _rules
+
+def set_syscheck_rules(rules: Optional[SyscheckRules]) -> None:
+    """Replace the active rule set, None goes back to the packaged rules."""
+    global _rules
+    with _rules_lock:
+        _rules = rules
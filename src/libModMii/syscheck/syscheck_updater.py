@@ -1,7 +1,10 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 from dataclasses import dataclass
 from . import info_helpers as info
 from . import validation_helpers as validation
+from .report_parser import SyscheckReport, parse_syscheck_report
+from .analysis_cache import analysis_key, get_default_analysis_cache, normalize_report
+from .rules import SyscheckRules, get_syscheck_rules
 
 class SyscheckError(Exception):
     pass
@@ -14,17 +17,22 @@ class SyscheckInfos:
     firmware: Dict[str, str]
     consoleType: str
 
-def get_syscheck_infos(data: str) -> SyscheckInfos:
+def parse_syscheck(data: str) -> SyscheckReport:
     data = validation.translate_keywords_to_english(data)
-    
+
     if not validation.validate_syscheck_data(data):
         raise SyscheckError('The CSV file is not a valid SysCheck report')
 
-    region = info.get_console_region(data)
-    hbc_version = info.get_hbc_version(data)
-    system_menu_version = info.get_system_menu_version(data)
+    return parse_syscheck_report(data)
+
+def get_syscheck_infos(data: Union[str, SyscheckReport]) -> SyscheckInfos:
+    report = data if isinstance(data, SyscheckReport) else parse_syscheck(data)
+
+    region = report.region
+    hbc_version = report.hbcVersion
+    system_menu_version = report.systemMenuVersion
     firmware = info.get_firmware(system_menu_version) if system_menu_version else None
-    console_type = info.get_console_type(data)
+    console_type = report.consoleType
 
     if not region or not system_menu_version or not firmware:
         raise SyscheckError('Could not extract necessary information from the CSV file')
@@ -50,18 +58,38 @@ def get_syscheck_infos(data: str) -> SyscheckInfos:
         consoleType=console_type
     )
 
-def get_syscheck_analysis(data: str, activeIOS: bool = False, extraProtection: bool = False) -> Dict[str, Any]:
-    infos = get_syscheck_infos(data)
+def get_syscheck_analysis(data: str, activeIOS: bool = False, extraProtection: bool = False,
+                          rules: Optional[SyscheckRules] = None) -> Dict[str, Any]:
+    # rules defaults to the process-wide rules (get_syscheck_rules())
+    rules = rules or get_syscheck_rules()
+    # Line endings, BOM, blank lines and the report date do not change the result, with or without the cache
+    data = normalize_report(data)
+    cache = get_default_analysis_cache()
+    if cache is None:
+        return _analyse_syscheck(data, activeIOS, extraProtection, rules)
+
+    key = analysis_key(data, activeIOS, extraProtection, rules)
+    result = cache.get(key)
+    if result is None:
+        result = _analyse_syscheck(data, activeIOS, extraProtection, rules)
+        cache.put(key, result)
+    return result
+
+def _analyse_syscheck(data: str, activeIOS: bool, extraProtection: bool, rules: SyscheckRules) -> Dict[str, Any]:
+    # Translate and tokenize the report once, every check below is a lookup in the parsed report
+    report = parse_syscheck(data)
+    infos = get_syscheck_infos(report)
     
     wad_to_install = []
 
     # Check system components
-    is_bootmii_installed = validation.check_if_bootmii_installed(data)
-    is_priiloader_installed = validation.check_if_priiloader_installed(data)
+    is_bootmii_installed = validation.check_if_bootmii_installed(report)
+    is_priiloader_installed = validation.check_if_priiloader_installed(report)
     is_hbc_outdated = validation.check_if_hbc_is_outdated(infos.hbcVersion, infos.consoleType) if infos.hbcVersion else False
-    outdated_d2xcios = validation.check_d2x_cios(data, infos.consoleType)
-    missing_ios = validation.check_for_missing_ios(data, infos.region, infos.consoleType) if activeIOS else []
-    needs_extra_protection = validation.check_extra_protection(data) if extraProtection else []
+    outdated_d2xcios = validation.check_d2x_cios(report, infos.consoleType, rules)
+    missing_ios = (validation.check_for_missing_ios(report, infos.region, infos.consoleType, rules)
+                   if activeIOS else [])
+    needs_extra_protection = validation.check_extra_protection(report, rules) if extraProtection else []
 
     if not is_bootmii_installed:
         wad_to_install.append('HM')
@@ -69,7 +97,7 @@ def get_syscheck_analysis(data: str, activeIOS: bool = False, extraProtection: b
         if not infos.hbcVersion:
             wad_to_install.append('OHBC113')
             # also check if IOS58 is installed
-            is_ios58_installed = 'IOS58' in data
+            is_ios58_installed = 'IOS58' in report.data
             if not is_ios58_installed and is_bootmii_installed:
                 wad_to_install.append('IOS58')
         else:
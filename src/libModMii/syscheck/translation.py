@@ -0,0 +1,104 @@
+import hashlib
+import json
+import importlib.resources
+import re
+import threading
+from typing import Dict, Optional
+
+# Keyword translations per language, extend the file (or call register_translations()) to support a new
+# SysCheck language without code changes
+SYSCHECK_TRANSLATIONS = 'syscheck_translations.json'
+
+# Below this many keywords one str.replace() per keyword (each a fast scan in C) beats the single-pass regex, which
+# matches character by character but does not slow down as keywords are added
+LOOP_MAX_KEYWORDS = 64
+
+def _trie_pattern(keywords) -> str:
+    # Factor common prefixes ("Menu d(?:e Sistema|i sistema)") so the regex engine tries each position once
+    # instead of once per keyword
+    trie: dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = None
+
+    def build(node: dict) -> str:
+        if list(node) == ['']:
+            return ''
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        optional = '' in node
+        pattern = branches[0] if len(branches) == 1 and not optional else '(?:' + '|'.join(branches) + ')'
+        # Greedy, so the longest keyword wins at a given position
+        return pattern + '?' if optional else pattern
+
+    return build(trie)
+
+class KeywordTranslator:
+    """
+    Replaces every known keyword with its English equivalent, the longest keyword winning where several match.
+
+    Small tables are applied with one str.replace() per keyword, longest first. From LOOP_MAX_KEYWORDS keywords on,
+    all languages are merged into one prefix-factored regex applied in a single pass over the report, so the cost
+    stays flat as languages are added where chained str.replace() calls rescan the whole report once per keyword.
+    """
+
+    def __init__(self, languages: Dict[str, Dict[str, str]]):
+        self.languages = {language: dict(keywords) for language, keywords in languages.items()}
+        self._compile()
+
+    def _compile(self) -> None:
+        self._replacements = {}
+        for keywords in self.languages.values():
+            for keyword, replacement in keywords.items():
+                self._replacements.setdefault(keyword, replacement)
+        keywords = sorted(self._replacements, key=len, reverse=True)
+        # Chained replacements would also rewrite a keyword that an earlier replacement introduced, the single pass
+        # never does: such tables always go through the regex
+        introduces_keyword = any(keyword in replacement
+                                 for keyword in keywords for replacement in self._replacements.values())
+        if len(keywords) < LOOP_MAX_KEYWORDS and not introduces_keyword:
+            self._loop = [(keyword, self._replacements[keyword]) for keyword in keywords]
+            self._pattern = None
+        else:
+            self._loop = None
+            self._pattern = re.compile(_trie_pattern(self._replacements))
+        # Identifies the translation table, the same in every process that loaded the same keywords
+        self.version = hashlib.sha1(
+            json.dumps(self.languages, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:12]
+
+    def register(self, language: str, keywords: Dict[str, str]) -> None:
+        self.languages.setdefault(language, {}).update(keywords)
+        self._compile()
+
+    def translate(self, text: str) -> str:
+        if self._loop is not None:
+            for keyword, replacement in self._loop:
+                text = text.replace(keyword, replacement)
+            return text
+        replacements = self._replacements
+        return self._pattern.sub(lambda match: replacements[match.group(0)], text)
+
+def load_translations(path: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+    if path is None:
+        with importlib.resources.files('libModMii.assets').joinpath(SYSCHECK_TRANSLATIONS).open('r', encoding='utf-8') as f:
+            return json.load(f)['languages']
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['languages']
+
+
+_translator = None
+_translator_lock = threading.Lock()
+
+def get_translator() -> KeywordTranslator:
+    global _translator
+    if _translator is None:
+        with _translator_lock:
+            if _translator is None:
+                _translator = KeywordTranslator(load_translations())
+    return _translator
+
+def register_translations(language: str, keywords: Dict[str, str]) -> None:
+    translator = get_translator()
+    with _translator_lock:
+        translator.register(language, keywords)
@@ -0,0 +1,127 @@
+"""Local HTTP servers for the download tests: a raw one whose responses are scripted byte by byte, and a file server."""
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    headers: Dict[str, str]
+
+class RawServer:
+    """
+    Accepts connections on 127.0.0.1 and hands each request to handler(request, sock), which writes the whole
+    response itself (status line, headers, body, stalls...). The connection is closed after every response.
+    """
+
+    def __init__(self, handler: Callable[[Request, socket.socket], None]):
+        self.handler = handler
+        self.requests: List[Request] = []
+        self._socket = socket.socket()
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen(16)
+        self.url = f"http://127.0.0.1:{self._socket.getsockname()[1]}/"
+        self._closed = False
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self) -> None:
+        while not self._closed:
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection: socket.socket) -> None:
+        with connection:
+            head = b""
+            while b"\r\n\r\n" not in head:
+                data = connection.recv(4096)
+                if not data:
+                    return
+                head += data
+            lines = head.split(b"\r\n\r\n", 1)[0].decode("latin-1").split("\r\n")
+            method, path, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            request = Request(method, path, headers)
+            self.requests.append(request)
+            try:
+                self.handler(request, connection)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        self._closed = True
+        self._socket.close()
+
+    def __enter__(self) -> "RawServer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def response(status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> bytes:
+    headers = {"Content-Length": str(len(body)), "Connection": "close", **(headers or {})}
+    head = f"HTTP/1.1 {status} X\r\n" + "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    return (head + "\r\n").encode("latin-1") + body
+
+@dataclass
+class ServedFile:
+    data: bytes
+    etag: Optional[str] = None
+    # Honour Range requests (206), otherwise always answer 200 with the whole file
+    ranges: bool = True
+    # Responses still to cut off halfway through the body
+    drops: int = 0
+
+@dataclass
+class FileServer:
+    """RawServer serving files with Range, If-Range and ETag support, and connections dropped on demand."""
+    files: Dict[str, ServedFile] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.server = RawServer(self._handle)
+        self.url = self.server.url
+        self.requests = self.server.requests
+
+    def _handle(self, request: Request, connection: socket.socket) -> None:
+        served = self.files.get(request.path.lstrip("/"))
+        if served is None:
+            connection.sendall(response(404))
+            return
+        headers = {"ETag": served.etag} if served.etag else {}
+        start = 0
+        status = 200
+        if served.ranges and "range" in request.headers:
+            if_range = request.headers.get("if-range")
+            if if_range is None or if_range == served.etag:
+                start = int(request.headers["range"].split("=")[1].split("-")[0])
+                if start >= len(served.data):
+                    connection.sendall(response(416, headers=headers))
+                    return
+                status = 206
+        body = served.data[start:]
+        if served.drops and len(body) > 1:
+            served.drops -= 1
+            connection.sendall(response(status, body, headers)[:-(len(body) // 2)])
+            # Give the client time to read what was sent before the reset
+            time.sleep(0.05)
+            connection.shutdown(socket.SHUT_RDWR)
+            return
+        connection.sendall(response(status, body, headers))
+
+    def close(self) -> None:
+        self.server.close()
+
+    def __enter__(self) -> "FileServer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
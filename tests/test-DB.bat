@@ -0,0 +1,57 @@
+@echo off
+set DBversion=25.06.19
+
+::Entries below are trimmed down from ModMii's DB.bat
+goto:DBend
+
+:IOS60P60
+set name=IOS60v65535(ModMii-IOS60-v6174)
+set code1=00000001
+set code2=0000003C
+set version=6174
+set basewad=IOS60-64-v6174
+set wadname=%name%.wad
+set md5=2bbd5b0bb7b1b2bfe2a6dd0d08d0a56f
+set category=patchios
+goto:skip
+
+:IOS11P60
+set cIOSFamilyName=ModMii-IOS60
+set cIOSversionNum=6174
+set ciosslot=11
+set ciosversion=65535
+set name=IOS%ciosslot%v%ciosversion%(%cIOSFamilyName%-v%cIOSversionNum%)
+set wadname=%name%.wad
+set code1=00000001
+set code2=0000003C
+set version=6174
+set "basewad=IOS60-64-v%version%"
+set md5=d752f4bc191a3c3120447bb3ad34e470
+set category=patchios
+goto:skip
+
+:cIOS249[56]-d2x-v11-beta3
+set name=cIOS249[56]-d2x-v11-beta3
+set wadname=%name%.wad
+set code1=00000001
+set code2=00000038
+set version=5661
+set ciosslot=249
+if exist temp\%wadname% goto:skip
+
+:LOOP1
+set name=Broken loop
+set first=%second%-a
+set second=%third%-b
+set third=%first%-c
+set wadname=%name%.wad
+set code1=00010001
+set code2=4C4F4F50
+
+:EMPTY
+
+:download
+set name=Not an entry
+
+:skip
+:DBend
@@ -0,0 +1,67 @@
+import copy
+import importlib.resources
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from libModMii.syscheck.analysis_cache import AnalysisCache, analysis_key
+from libModMii.syscheck.rules import SYSCHECK_RULES, compile_syscheck_rules, get_syscheck_rules
+from libModMii.syscheck.translation import KeywordTranslator, load_translations
+
+with open(os.path.join(os.path.dirname(__file__), 'test-syscheck.csv'), encoding='utf-8') as f:
+    REPORT = f.read()
+
+def raw_rules():
+    return json.loads(importlib.resources.files('libModMii.assets').joinpath(SYSCHECK_RULES).read_text('utf-8'))
+
+def key(data, rules=None, translator=None, activeIOS=True, extraProtection=False):
+    return analysis_key(data, activeIOS, extraProtection, rules or get_syscheck_rules(),
+                        translator or KeywordTranslator(load_translations()))
+
+@pytest.mark.parametrize('variant', [
+    REPORT.replace('\n', '\r\n'),
+    '\ufeff' + REPORT,
+    REPORT.replace('\n', '  \n'),
+    REPORT.replace('\n', '\n\n'),
+    REPORT + '\n\n',
+    REPORT.replace('2025/07/30', '2026/01/02'),
+], ids=['crlf', 'bom', 'trailing spaces', 'blank lines', 'trailing newlines', 'report date'])
+def test_formatting_does_not_change_the_key(variant):
+    assert key(variant) == key(REPORT)
+
+def test_content_changes_the_key():
+    assert key(REPORT.replace('IOS9 (rev 1034)', 'IOS9 (rev 1035)')) != key(REPORT)
+    assert key(REPORT, activeIOS=False) != key(REPORT)
+    assert key(REPORT, extraProtection=True) != key(REPORT)
+
+def test_rules_change_the_key():
+    rules = raw_rules()
+    assert key(REPORT, compile_syscheck_rules(rules)) == key(REPORT)
+    edited = copy.deepcopy(rules)
+    # Rule table edited without bumping its version
+    edited['extraProtection'] = edited['extraProtection'][1:]
+    assert key(REPORT, compile_syscheck_rules(edited)) != key(REPORT)
+    bumped = copy.deepcopy(rules)
+    bumped['latestd2xVersion'] = 'next'
+    assert key(REPORT, compile_syscheck_rules(bumped)) != key(REPORT)
+
+def test_translation_table_changes_the_key():
+    translator = KeywordTranslator(load_translations())
+    before = key(REPORT, translator=translator)
+    assert key(REPORT, translator=KeywordTranslator(load_translations())) == before
+    translator.register('fr', {'Pays de la chaine boutique': 'Shop Channel country'})
+    assert key(REPORT, translator=translator) != before
+
+def test_cache_keeps_the_most_recently_used(tmp_path):
+    cache = AnalysisCache(max_entries=2, path=str(tmp_path / 'analyses.sqlite'))
+    cache.put('a', ['HM'])
+    cache.put('b', ['prii'])
+    assert cache.get('a') == ['HM']
+    cache.put('c', ['yawm'])
+    assert list(cache._entries) == ['a', 'c']
+    # Still on disk, and shared with a new cache on the same file
+    assert AnalysisCache(path=cache.path).get('b') == ['prii']
+    assert cache.prune(1) == 2
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+from libModMii.download.async_download import nus_title_download_async
+from libModMii.download.http_async import AsyncHttpClient
+from libModMii.download.nus_cache import NusCache, content_key
+from title_fixtures import FakeNus, make_title
+
+TID = '0001000141424344'
+
+def make_swapped_title():
+    # TMD records listed out of index order: record index 1 comes first
+    title = make_title(TID, 3, [os.urandom(5000), os.urandom(70000)])
+    title.tmd.content_records.reverse()
+    if title.content.content_records is not title.tmd.content_records:
+        title.content.content_records.reverse()
+    title.content.content_list.reverse()
+    return title
+
+def download(nus, wad, version, cache=None):
+    async def run():
+        async with AsyncHttpClient() as client:
+            return await nus_title_download_async(TID, version, wad, client, cache=cache, endpoint=nus.url)
+    return asyncio.run(run())
+
+def test_latest_version(tmp_path):
+    title = make_title(TID, 3, [os.urandom(1000)])
+    nus = FakeNus([title])
+    try:
+        wad = download(nus, str(tmp_path / 'title.wad'), None, NusCache(str(tmp_path / 'cache')))
+    finally:
+        nus.close()
+    with open(wad, 'rb') as f:
+        assert f.read() == title.dump_wad()
+
+def test_corrupt_cached_content_is_refetched_into_its_slot(tmp_path):
+    title = make_swapped_title()
+    record = title.tmd.content_records[0]
+    assert record.index == 1
+    cache = NusCache(str(tmp_path / 'cache'))
+    wad = str(tmp_path / 'title.wad')
+    nus = FakeNus([title])
+    # FakeNus looks contents up by record index, which libWiiPy takes as the position in the content list
+    for position, content_record in enumerate(title.tmd.content_records):
+        nus.files[f'/{TID}/{content_record.content_id:08x}'] = title.content.content_list[position]
+    try:
+        download(nus, wad, 3, cache)
+        item_path = cache.item_path(content_key(TID, record))
+        with open(item_path, 'rb') as f:
+            data = bytearray(f.read())
+        data[100] ^= 0xFF
+        with open(item_path, 'wb') as f:
+            f.write(data)
+        os.remove(wad)
+        download(nus, wad, 3, cache)
+    finally:
+        nus.close()
+    with open(wad, 'rb') as f:
+        assert f.read() == title.dump_wad()
@@ -0,0 +1,61 @@
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from libModMii.download.db_bat import expand_variables, parse_db, parse_db_file
+
+fixture_path = os.path.join(os.path.dirname(__file__), 'test-DB.bat')
+
+def parse_fixture():
+    return parse_db_file(fixture_path, converted='2025-01-01T00:00:00Z')
+
+def test_meta():
+    meta = parse_fixture()['meta']
+    assert meta['DBversion'] == '25.06.19'
+    assert meta['converted'] == '2025-01-01T00:00:00Z'
+
+def test_entries():
+    entries = parse_fixture()['entries']
+    # Ignored labels (download), jump targets (skip, DBend) and entries without any value are not entries
+    assert list(entries) == ['IOS60P60', 'IOS11P60', 'cIOS249[56]-d2x-v11-beta3', 'LOOP1']
+    assert entries['IOS60P60']['code2'] == '0000003C'
+    assert entries['IOS60P60']['version'] == 6174
+    assert entries['IOS11P60']['basewad'] == 'IOS60-64-v6174'
+    assert entries['cIOS249[56]-d2x-v11-beta3']['category'] == 'd2x'
+    assert 'category' not in entries['LOOP1']
+
+def test_chained_variables():
+    entry = parse_fixture()['entries']['IOS11P60']
+    assert entry['name'] == 'IOS11v65535(ModMii-IOS60-v6174)'
+    # wadname references name, which references four other keys
+    assert entry['wadname'] == 'IOS11v65535(ModMii-IOS60-v6174).wad'
+
+def test_chain_order_does_not_matter():
+    entry = {'c': '%b%!', 'b': '%a%-b', 'a': 'a'}
+    assert expand_variables(entry) == []
+    assert entry == {'c': 'a-b!', 'b': 'a-b', 'a': 'a'}
+
+def test_unknown_variables_are_kept():
+    entry = {'wadname': '%name%-%unknown%.wad', 'name': 'IOS36'}
+    assert expand_variables(entry) == []
+    assert entry['wadname'] == 'IOS36-%unknown%.wad'
+
+def test_cyclic_variables(caplog):
+    with caplog.at_level(logging.WARNING, logger='libModMii.download.db_bat'):
+        entry = parse_fixture()['entries']['LOOP1']
+    assert 'Circular variable references in LOOP1: first, second, third' in caplog.text
+    # The reference closing the cycle is left as is, everything else resolves
+    assert entry['first'] == '%first%-c-b-a'
+    assert entry['third'] == '%first%-c'
+    assert entry['wadname'] == 'Broken loop.wad'
+
+def test_self_reference():
+    entry = {'name': 'x%name%'}
+    assert expand_variables(entry) == ['name']
+    assert entry['name'] == 'x%name%'
+
+def test_parse_from_lines():
+    with open(fixture_path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert parse_db(lines, converted='2025-01-01T00:00:00Z') == parse_fixture()
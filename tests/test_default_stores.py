@@ -0,0 +1,35 @@
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from libModMii.download import artifact_cache, manifest, nus_cache, validation
+
+STORES = [
+    (nus_cache, '_default_cache', nus_cache.get_default_cache),
+    (artifact_cache, '_default_cache', artifact_cache.get_default_artifact_cache),
+    (validation, '_default_hash_index', validation.get_default_hash_index),
+    (manifest, '_default_manifest', manifest.get_default_manifest),
+]
+
+@pytest.mark.parametrize('module, name, get_default', STORES)
+def test_unusable_cache_root_disables_the_store(monkeypatch, caplog, module, name, get_default):
+    # Nothing can be created under a path below a file, like under a read-only cache root
+    monkeypatch.setenv('LIBMODMII_CACHE_DIR', os.path.join(os.devnull, 'cache'))
+    monkeypatch.setattr(module, name, None)
+    monkeypatch.setattr(module, name + '_disabled', False)
+    with caplog.at_level(logging.WARNING, logger=module.__name__):
+        assert get_default() is None
+        assert get_default() is None
+    assert len(caplog.records) == 1
+
+@pytest.mark.parametrize('module, name, get_default', STORES)
+def test_default_store_is_created_once(monkeypatch, tmp_path, module, name, get_default):
+    monkeypatch.setenv('LIBMODMII_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(module, name, None)
+    monkeypatch.setattr(module, name + '_disabled', False)
+    store = get_default()
+    assert store is not None
+    assert get_default() is store
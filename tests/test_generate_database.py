@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+from libModMii.download.database import DATABASE_INDEX, DATABASE_INDEX_VERSION
+from generate_database import process_db_file
+
+fixture_path = os.path.join(os.path.dirname(__file__), 'test-DB.bat')
+
+def setup(tmp_path):
+    db_file = str(tmp_path / 'DB.bat')
+    shutil.copyfile(fixture_path, db_file)
+    assets = tmp_path / 'assets'
+    assets.mkdir()
+    return db_file, str(tmp_path / 'out' / 'database.json'), str(assets)
+
+def read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def source_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def assert_installed(output, assets):
+    installed = os.path.join(assets, 'database.json')
+    assert read_json(installed) == read_json(output)
+    # The index libModMii loads is only used when it was built from the installed database.json
+    with open(os.path.join(assets, DATABASE_INDEX), 'rb') as f:
+        index = pickle.load(f)
+    assert index['indexVersion'] == DATABASE_INDEX_VERSION
+    assert index['sourceHash'] == source_hash(installed)
+
+def test_first_run_writes_and_installs(tmp_path):
+    db_file, output, assets = setup(tmp_path)
+    diff = process_db_file(db_file, output, assets_path=assets)
+    assert diff.added and not diff.removed
+    assert read_json(output)['meta']['sourceHash'] == source_hash(db_file)
+    assert_installed(output, assets)
+
+def test_unchanged_db_file_is_not_parsed_again(tmp_path, capsys):
+    db_file, output, assets = setup(tmp_path)
+    process_db_file(db_file, output, assets_path=assets)
+    assert process_db_file(db_file, output, assets_path=assets) is None
+    assert 'DB.bat unchanged' in capsys.readouterr().out
+
+def test_comment_only_change_records_the_new_source_hash(tmp_path, capsys):
+    db_file, output, assets = setup(tmp_path)
+    process_db_file(db_file, output, assets_path=assets)
+    before = read_json(output)
+    with open(db_file, 'a', encoding='utf-8') as f:
+        f.write('\n:: a comment\n')
+
+    diff = process_db_file(db_file, output, assets_path=assets)
+    assert not diff
+    after = read_json(output)
+    assert after['entries'] == before['entries']
+    # The conversion date of the entries is kept, only the hash of the DB.bat they match changes
+    assert after['meta'] == {**before['meta'], 'sourceHash': source_hash(db_file)}
+    assert_installed(output, assets)
+    capsys.readouterr()
+    assert process_db_file(db_file, output, assets_path=assets) is None
+    assert 'DB.bat unchanged' in capsys.readouterr().out
+
+def test_without_assets_the_index_is_next_to_the_output(tmp_path):
+    db_file, output, assets = setup(tmp_path)
+    process_db_file(db_file, output, assets_path=None)
+    assert os.listdir(assets) == []
+    with open(os.path.join(os.path.dirname(output), DATABASE_INDEX), 'rb') as f:
+        assert pickle.load(f)['sourceHash'] == source_hash(output)
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from libModMii.download.http_async import AsyncHttpClient, HttpError
+from http_fixtures import RawServer, response
+
+def fetch(url, timeout=5.0, **kwargs):
+    async def run():
+        async with AsyncHttpClient(timeout=timeout, **kwargs) as client:
+            return await client.get(url)
+    return asyncio.run(run())
+
+def test_content_length():
+    body = os.urandom(200_000)
+    with RawServer(lambda request, sock: sock.sendall(response(200, body))) as server:
+        assert fetch(server.url + 'file', chunk_size=4096) == body
+
+def test_chunked():
+    parts = [b'first chunk', os.urandom(10_000), b'!']
+
+    def handler(request, sock):
+        sock.sendall(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+        for part in parts:
+            sock.sendall(f'{len(part):x};ext=1\r\n'.encode() + part + b'\r\n')
+        sock.sendall(b'0\r\nX-Trailer: yes\r\n\r\n')
+
+    with RawServer(handler) as server:
+        assert fetch(server.url + 'file') == b''.join(parts)
+
+def test_body_until_close():
+    def handler(request, sock):
+        sock.sendall(b'HTTP/1.1 200 OK\r\n\r\nno length')
+
+    with RawServer(handler) as server:
+        assert fetch(server.url + 'file') == b'no length'
+
+def test_truncated_body():
+    def handler(request, sock):
+        sock.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\nshort')
+
+    with RawServer(handler) as server:
+        with pytest.raises(ConnectionError):
+            fetch(server.url + 'file')
+
+@pytest.mark.parametrize('head', [
+    b'HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\npartial',
+    b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n64\r\npartial',
+])
+def test_stalled_body_times_out(head):
+    release = []
+
+    def handler(request, sock):
+        sock.sendall(head)
+        # Headers and a bit of the body, then nothing until the test is over
+        while not release:
+            time.sleep(0.05)
+
+    with RawServer(handler) as server:
+        started = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            fetch(server.url + 'file', timeout=0.3)
+        release.append(True)
+    assert time.monotonic() - started < 5
+
+def test_error_status():
+    with RawServer(lambda request, sock: sock.sendall(response(404))) as server:
+        with pytest.raises(HttpError) as error:
+            fetch(server.url + 'missing')
+    assert error.value.status == 404
+
+def test_redirect():
+    def handler(request, sock):
+        if request.path == '/old':
+            sock.sendall(response(302, headers={'Location': '/new'}))
+        else:
+            sock.sendall(response(200, request.path.encode()))
+
+    with RawServer(handler) as server:
+        assert fetch(server.url + 'old') == b'/new'
@@ -0,0 +1,153 @@
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from libModMii.download import artifact_cache, invalidation, manifest, validation
+from libModMii.download.artifact_cache import ArtifactCache
+from libModMii.download.database import _build_database_entry
+from libModMii.download.download import _artifact_keys
+from libModMii.download.invalidation import find_stale_files, invalidate, stale_between
+from libModMii.download.manifest import DownloadManifest, entry_fields
+from libModMii.download.validation import HashIndex, get_file_md5
+
+def ios(wadname, md5, **fields):
+    return {'name': wadname, 'code1': '00000001', 'code2': '00000050', 'wadname': wadname, 'md5': md5,
+            'version': 7200, 'category': 'ios', **fields}
+
+def patched(wadname, md5, md5base, slot):
+    return ios(wadname, md5, category='patchios', basewad='IOS80-64-v7200', md5base=md5base, ciosslot=slot,
+               ciosversion='65535')
+
+OLD = {'entries': {
+    'PATCHED': patched('IOS80P.wad', 'aa' * 16, '01' * 16, 80),
+    'OTHER_PATCHED': patched('IOS81P.wad', 'ab' * 16, '01' * 16, 81),
+    'RENAMED': ios('IOS58.wad', 'bb' * 16),
+    'SAME': ios('IOS61.wad', 'cc' * 16),
+    'REMOVED': ios('IOS70.wad', 'dd' * 16),
+    'NO_FILE': {'name': 'No file', 'code1': 'TOOL', 'category': 'app'},
+}}
+
+def new_database():
+    database = copy.deepcopy(OLD)
+    entries = database['entries']
+    entries['PATCHED'].update(md5='ee' * 16, md5base='02' * 16)
+    # Neither the name nor the download name are part of what a file is made from
+    entries['RENAMED'].update(name='IOS58 (renamed)', dlname='other')
+    del entries['REMOVED']
+    return database
+
+def make_files(output_path, database):
+    for entry_data in database['entries'].values():
+        if entry_data.get('wadname'):
+            with open(os.path.join(output_path, entry_data['wadname']), 'wb') as f:
+                f.write(entry_data['wadname'].encode())
+    with open(os.path.join(output_path, 'IOS80-64-v7200.wad'), 'wb') as f:
+        f.write(b'base')
+
+def summary(stale_files):
+    return {(os.path.basename(stale_file.path), stale_file.kind): stale_file.changes for stale_file in stale_files}
+
+def test_stale_between_flags_only_changed_fields(tmp_path):
+    make_files(str(tmp_path), OLD)
+    assert summary(stale_between(OLD, new_database(), str(tmp_path))) == {
+        ('IOS80P.wad', 'entry'): {'md5': ('aa' * 16, 'ee' * 16)},
+        ('IOS70.wad', 'entry'): {},
+    }
+
+def test_base_stays_valid_while_one_entry_expects_it(tmp_path):
+    make_files(str(tmp_path), OLD)
+    new = new_database()
+    new['entries']['OTHER_PATCHED']['md5base'] = '02' * 16
+    assert summary(stale_between(OLD, new, str(tmp_path)))[('IOS80-64-v7200.wad', 'base')] == {
+        'md5base': ('01' * 16, '02' * 16)}
+    # Only files that exist are reported
+    os.remove(str(tmp_path / 'IOS80-64-v7200.wad'))
+    assert ('IOS80-64-v7200.wad', 'base') not in summary(stale_between(OLD, new, str(tmp_path)))
+
+def record_downloads(output_path, database, downloads):
+    for key, entry_data in database['entries'].items():
+        if entry_data.get('wadname'):
+            database_entry = _build_database_entry(entry_data)
+            downloads.record(os.path.join(output_path, database_entry.wadname), key, entry_fields(database_entry))
+            if database_entry.basewad:
+                downloads.record(os.path.join(output_path, database_entry.basewad + '.wad'), database_entry.basewad,
+                                 entry_fields(database_entry, 'base'), 'base')
+
+def test_find_stale_files_from_the_manifest(tmp_path):
+    output_path = str(tmp_path / 'out')
+    os.makedirs(output_path)
+    downloads = DownloadManifest(str(tmp_path / 'manifest.sqlite'))
+    record_downloads(output_path, OLD, downloads)
+    assert summary(find_stale_files(output_path, downloads, new_database())) == {
+        ('IOS80P.wad', 'entry'): {'md5': ('aa' * 16, 'ee' * 16)},
+        ('IOS70.wad', 'entry'): {},
+    }
+    assert find_stale_files(output_path, downloads, OLD) == []
+    assert find_stale_files(str(tmp_path / 'elsewhere'), downloads, new_database()) == []
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setenv('LIBMODMII_CACHE_DIR', str(tmp_path / 'cache'))
+    downloads = DownloadManifest(str(tmp_path / 'manifest.sqlite'))
+    hash_index = HashIndex(str(tmp_path / 'index.sqlite'))
+    artifacts = ArtifactCache(str(tmp_path / 'artifacts'))
+    monkeypatch.setattr(manifest, '_default_manifest', downloads)
+    monkeypatch.setattr(validation, '_default_hash_index', hash_index)
+    monkeypatch.setattr(artifact_cache, '_default_cache', artifacts)
+    monkeypatch.setattr(invalidation, 'get_database', new_database)
+    return downloads, hash_index, artifacts
+
+def put_artifact(artifacts, tmp_path, entry_data):
+    database_entry = _build_database_entry(entry_data)
+    build = str(tmp_path / 'build.wad')
+    with open(build, 'wb') as f:
+        f.write(entry_data['md5'].encode())
+    key = _artifact_keys(database_entry)[0]
+    artifacts.put(key, build, {'wadname': database_entry.wadname})
+    return key
+
+def test_invalidate_removes_only_stale_outputs(tmp_path, stores):
+    downloads, hash_index, artifacts = stores
+    output_path = str(tmp_path / 'out')
+    os.makedirs(output_path)
+    make_files(output_path, OLD)
+    record_downloads(output_path, OLD, downloads)
+    for name in os.listdir(output_path):
+        get_file_md5(os.path.join(output_path, name), hash_index)
+    old_artifact = put_artifact(artifacts, tmp_path, OLD['entries']['PATCHED'])
+    current_artifact = put_artifact(artifacts, tmp_path, new_database()['entries']['PATCHED'])
+    unrelated_artifact = put_artifact(artifacts, tmp_path, OLD['entries']['OTHER_PATCHED'])
+
+    stale_paths = {os.path.join(output_path, name) for name in ('IOS80P.wad', 'IOS70.wad')}
+    stats = {path: os.stat(path) for path in stale_paths}
+    assert all(hash_index.lookup(path, stat) for path, stat in stats.items())
+
+    stale_files = find_stale_files(output_path, downloads, new_database())
+    result = invalidate(stale_files)
+
+    assert set(result['removed']) == stale_paths
+    assert result['evicted'] == [old_artifact]
+    assert result['rebuilt'] == {}
+    assert sorted(os.listdir(output_path)) == ['IOS58.wad', 'IOS61.wad', 'IOS80-64-v7200.wad', 'IOS81P.wad']
+    assert {record.path for record in downloads.records()} == {
+        os.path.join(output_path, name) for name in os.listdir(output_path)}
+    for path, stat in stats.items():
+        assert hash_index.lookup(path, stat) is None
+    assert current_artifact in artifacts and unrelated_artifact in artifacts
+    assert old_artifact not in artifacts
+
+def test_invalidate_keeps_a_file_downloaded_again_since(tmp_path, stores):
+    downloads, _, _ = stores
+    output_path = str(tmp_path / 'out')
+    os.makedirs(output_path)
+    make_files(output_path, OLD)
+    record_downloads(output_path, OLD, downloads)
+    stale_files = find_stale_files(output_path, downloads, new_database())
+    # A download for the current database finished between the scan and the invalidation
+    record_downloads(output_path, new_database(), downloads)
+    result = invalidate(stale_files)
+    assert result['removed'] == [os.path.join(output_path, 'IOS70.wad')]
+    assert os.path.exists(os.path.join(output_path, 'IOS80P.wad'))
@@ -0,0 +1,89 @@
+import os
+import random
+import sys
+
+import libWiiPy
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+from libModMii.download.wiipy.iospatch import ES_PATCHES, patch_ios
+from title_fixtures import make_title
+
+TID = '0000000100000050'
+
+def es_module(rnd, patches):
+    # Random code with the "ES:" marker and the byte sequences each patch looks for
+    parts = [rnd.randbytes(0x400), b'ES:']
+    for patch in patches:
+        for sequence, _, _ in ES_PATCHES[patch]:
+            parts += [rnd.randbytes(rnd.randrange(16, 256)), sequence]
+    parts.append(rnd.randbytes(0x400))
+    return b''.join(parts)
+
+def make_ios(path, seed=0, present=tuple(ES_PATCHES)):
+    rnd = random.Random(seed)
+    contents = [rnd.randbytes(0x2000), es_module(rnd, present), rnd.randbytes(0x1000)]
+    title = make_title(TID, 7200, contents, [0x10, 0x11, 0x12])
+    with open(path, 'wb') as f:
+        f.write(title.dump_wad())
+
+def reference(base, patches, slot, version):
+    # What WiiPy's iospatcher command does with libWiiPy's IOSPatcher, one patch method at a time
+    title = libWiiPy.title.Title()
+    with open(base, 'rb') as f:
+        title.load_wad(f.read())
+    if version is not None:
+        title.set_title_version(version)
+    if slot is not None:
+        title.set_title_id(title.tmd.title_id[:-2] + f'{slot:02X}')
+    patcher = libWiiPy.title.IOSPatcher()
+    patcher.load(title)
+    methods = {'FS': patcher.patch_fakesigning, 'ES': patcher.patch_es_identify, 'NP': patcher.patch_nand_access,
+               'VP': patcher.patch_version_downgrading}
+    patch_count = sum(methods[patch]() for patch in patches)
+    title = patcher.dump()
+    if patch_count or version is not None or slot is not None:
+        title.fakesign()
+    return title.dump_wad(), patch_count
+
+@pytest.mark.parametrize('patches, slot, version', [
+    (['FS', 'ES', 'NP', 'VP'], None, None),
+    (['FS', 'ES', 'NP', 'VP'], 236, 65535),
+    (['FS'], 80, None),
+    (['ES', 'NP'], None, 7201),
+    ([], 11, 65535),
+])
+def test_same_output_as_iospatcher(tmp_path, patches, slot, version):
+    base, output = str(tmp_path / 'base.wad'), str(tmp_path / 'patched.wad')
+    make_ios(base)
+    patch_count = patch_ios(base, output, patches, slot, version)
+    expected, expected_count = reference(base, patches, slot, version)
+    assert patch_count == expected_count
+    with open(output, 'rb') as f:
+        assert f.read() == expected
+
+def test_missing_sequences_are_skipped_like_iospatcher(tmp_path):
+    base, output = str(tmp_path / 'base.wad'), str(tmp_path / 'patched.wad')
+    make_ios(base, seed=1, present=('FS', 'VP'))
+    patches = ['FS', 'ES', 'NP', 'VP']
+    patch_count = patch_ios(base, output, patches)
+    expected, expected_count = reference(base, patches, None, None)
+    assert patch_count == expected_count == 3
+    with open(output, 'rb') as f:
+        assert f.read() == expected
+
+def test_unpatched_ios_is_left_as_is(tmp_path):
+    base, output = str(tmp_path / 'base.wad'), str(tmp_path / 'patched.wad')
+    make_ios(base, present=())
+    assert patch_ios(base, output) == 0
+    with open(base, 'rb') as f, open(output, 'rb') as g:
+        assert f.read() == g.read()
+
+def test_not_an_ios(tmp_path):
+    base = str(tmp_path / 'base.wad')
+    title = make_title('0001000148414141', 1, [b'ES:' + bytes(0x100)])
+    with open(base, 'wb') as f:
+        f.write(title.dump_wad())
+    with pytest.raises(ValueError):
+        patch_ios(base, str(tmp_path / 'patched.wad'))
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from libModMii.download.locking import FileLock, SingleFlight
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+def test_single_flight_runs_once_for_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return 'result'
+
+    with ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(flight.do, 'key', work) for _ in range(8)]
+        while not calls:
+            time.sleep(0.01)
+        # Let the other callers join the call in flight before the leader returns
+        time.sleep(0.1)
+        release.set()
+        results = [future.result() for future in futures]
+    assert results == ['result'] * 8
+    assert len(calls) == 1
+    assert flight.in_flight() == []
+
+def test_single_flight_distinct_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('b', lambda: 2) == 2
+
+def test_single_flight_leader_exception_reaches_every_caller():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError('boom')
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(flight.do, 'key', failing)
+        started.wait(5)
+        followers = [executor.submit(flight.do, 'key', lambda: 'not run') for _ in range(3)]
+        time.sleep(0.1)
+        release.set()
+        for future in [leader, *followers]:
+            with pytest.raises(ValueError, match='boom'):
+                future.result()
+    # The failed call is not remembered, the next one runs again
+    assert flight.do('key', lambda: 'retried') == 'retried'
+
+def test_single_flight_async_tasks_share_the_leader():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return 'result'
+
+    async def run():
+        return await asyncio.gather(*(flight.do_async('key', work) for _ in range(5)))
+
+    assert asyncio.run(run()) == ['result'] * 5
+    assert len(calls) == 1
+
+def test_single_flight_async_leader_exception():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise ValueError('boom')
+
+    async def run():
+        return await asyncio.gather(*(flight.do_async('key', failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_single_flight_task_waits_on_thread_leader():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+        return 'from thread'
+
+    async def follower():
+        return await flight.do_async('key', lambda: pytest.fail('follower must not run'))
+
+    with ThreadPoolExecutor(1) as executor:
+        leader = executor.submit(flight.do, 'key', work)
+        started.wait(5)
+        threading.Timer(0.1, release.set).start()
+        assert asyncio.run(follower()) == 'from thread'
+        assert leader.result() == 'from thread'
+
+def _overlaps(lock_factory, workers=4, rounds=20):
+    inside = []
+    overlaps = []
+
+    def work():
+        for _ in range(rounds):
+            with lock_factory():
+                inside.append(1)
+                if len(inside) > 1:
+                    overlaps.append(1)
+                time.sleep(0.001)
+                inside.pop()
+
+    with ThreadPoolExecutor(workers) as executor:
+        for future in [executor.submit(work) for _ in range(workers)]:
+            future.result()
+    return len(overlaps)
+
+def test_file_lock_excludes_threads(tmp_path):
+    path = str(tmp_path / 'locks' / 'a.lock')
+    assert _overlaps(lambda: FileLock(path)) == 0
+
+def test_file_lock_timeout(tmp_path):
+    path = str(tmp_path / 'a.lock')
+    with FileLock(path):
+        with pytest.raises(TimeoutError):
+            FileLock(path).acquire(timeout=0.1)
+    lock = FileLock(path)
+    lock.acquire(timeout=0.1)
+    lock.release()
+
+def test_file_lock_async(tmp_path):
+    path = str(tmp_path / 'a.lock')
+    order = []
+
+    async def hold(name):
+        async with FileLock(path):
+            order.append(f'{name} in')
+            await asyncio.sleep(0.05)
+            order.append(f'{name} out')
+
+    async def run():
+        await asyncio.gather(hold('a'), hold('b'))
+
+    asyncio.run(run())
+    assert order in (['a in', 'a out', 'b in', 'b out'], ['b in', 'b out', 'a in', 'a out'])
+
+def test_file_lock_excludes_processes(tmp_path):
+    path = str(tmp_path / 'a.lock')
+    holder = subprocess.Popen(
+        [sys.executable, '-c',
+         'import sys, time; sys.path.insert(0, sys.argv[1]); '
+         'from libModMii.download.locking import FileLock; '
+         'lock = FileLock(sys.argv[2]); lock.acquire(); print("locked", flush=True); time.sleep(2)',
+         SRC, path],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'locked'
+        with pytest.raises(TimeoutError):
+            FileLock(path).acquire(timeout=0.2)
+    finally:
+        holder.kill()
+        holder.wait()
+    FileLock(path).acquire(timeout=5)
+
+def test_file_lock_falls_back_when_lock_file_cannot_be_created(caplog):
+    # A cache root that cannot hold directories, like a read-only or missing one
+    path = os.path.join(os.devnull, 'locks', 'a.lock')
+    with caplog.at_level(logging.WARNING, logger='libModMii.download.locking'):
+        assert _overlaps(lambda: FileLock(path)) == 0
+        with FileLock(path):
+            with pytest.raises(TimeoutError):
+                FileLock(path).acquire(timeout=0.1)
+    assert 'locking within this process only' in caplog.text
+
+def test_file_lock_fallback_async():
+    path = os.path.join(os.devnull, 'locks', 'b.lock')
+
+    async def run():
+        async with FileLock(path):
+            with pytest.raises(TimeoutError):
+                await FileLock(path).acquire_async(timeout=0.1)
+        async with FileLock(path):
+            pass
+
+    asyncio.run(run())
@@ -0,0 +1,76 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+from libModMii.download.nus_cache import NusCache, content_key, tmd_key
+from libModMii.download.wiipy.nus import _content_matches, nus_title_download
+from title_fixtures import FakeNus, make_title
+
+TID = '0001000141424344'
+
+def put_at(cache, key, size, mtime):
+    cache.put(key, bytes(size))
+    os.utime(cache.item_path(key), (mtime, mtime))
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    cache = NusCache(str(tmp_path), max_size=300)
+    for age, key in enumerate(['c', 'b', 'a']):
+        put_at(cache, key, 100, 1000 - age * 100)
+    # Reading an item makes it the most recently used
+    assert cache.get('a') == bytes(100)
+    cache.put('d', bytes(100))
+    assert sorted(item.key for item in cache.items()) == ['a', 'c', 'd']
+    assert cache.size() == 300
+
+def test_prune_to_a_smaller_size(tmp_path):
+    cache = NusCache(str(tmp_path), max_size=None)
+    for mtime, key in enumerate(['old', 'middle', 'new']):
+        put_at(cache, key, 100, 1000 + mtime)
+    assert cache.prune(150) == ['old', 'middle']
+    assert cache.clear() == ['new']
+    assert cache.items() == []
+
+def test_items_skip_partial_files(tmp_path):
+    cache = NusCache(str(tmp_path))
+    cache.put('item', b'data')
+    for name in ('item.part', 'item.part.validator', 'item.1.2.tmp'):
+        with open(os.path.join(cache.path, name), 'wb') as f:
+            f.write(b'partial')
+    assert [item.key for item in cache.items()] == ['item']
+
+def test_content_sha1_mismatch_is_rejected():
+    title = make_title(TID, 3, [os.urandom(5000)])
+    record = title.tmd.content_records[0]
+    data = title.content.content_list[0]
+    title_key = title.ticket.get_title_key()
+    assert _content_matches(record, data, title_key)
+    corrupt = bytearray(data)
+    corrupt[10] ^= 0xFF
+    assert not _content_matches(record, bytes(corrupt), title_key)
+    # Without the title key only the size is checked
+    assert _content_matches(record, bytes(corrupt), None)
+    assert not _content_matches(record, data[:-16], None)
+
+def test_corrupt_cached_content_is_downloaded_again(tmp_path):
+    title = make_title(TID, 3, [os.urandom(5000), os.urandom(70000)])
+    record = title.tmd.content_records[1]
+    cache = NusCache(str(tmp_path / 'cache'))
+    wad = str(tmp_path / 'title.wad')
+    nus = FakeNus([title])
+    try:
+        nus_title_download(TID, 3, wad=wad, endpoint=nus.url, verbose=False, cache=cache)
+        item_path = cache.item_path(content_key(TID, record))
+        with open(item_path, 'rb') as f:
+            data = bytearray(f.read())
+        data[100] ^= 0xFF
+        with open(item_path, 'wb') as f:
+            f.write(data)
+        os.remove(wad)
+        nus_title_download(TID, 3, wad=wad, endpoint=nus.url, verbose=False, cache=cache)
+    finally:
+        nus.close()
+    with open(wad, 'rb') as f:
+        assert f.read() == title.dump_wad()
+    assert cache.peek(content_key(TID, record)) == title.content.content_list[1]
+    assert tmd_key(TID, 3) in cache
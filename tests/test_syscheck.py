@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+from libModMii.syscheck.analysis_cache import AnalysisCache, set_default_analysis_cache
+from libModMii.syscheck.syscheck_updater import get_syscheck_analysis
+from syscheck_fixtures import make_report
+
+TESTS = os.path.dirname(__file__)
+
+# Results of the analysis as it was before the report was parsed once into an IOS table, for every combination
+# of the activeIOS and extraProtection flags. That version only translated the report to read the region, System
+# Menu and console type and ran the IOS checks on the untranslated text, so the expected results were computed
+# from reports translated to English beforehand.
+with open(os.path.join(TESTS, 'test-syscheck-analysis.json'), encoding='utf-8') as f:
+    EXPECTED = json.load(f)
+
+def report(name):
+    if name == 'test-syscheck.csv':
+        with open(os.path.join(TESTS, name), encoding='utf-8') as f:
+            return f.read()
+    language, console_type, seed = name.split('-')
+    return make_report(int(seed), language, console_type)
+
+CASES = [(name, flags) for name in EXPECTED for flags in EXPECTED[name]]
+
+@pytest.mark.parametrize('name, flags', CASES)
+def test_analysis_matches_the_previous_implementation(name, flags):
+    activeIOS, extraProtection = (flag == '1' for flag in flags)
+    assert get_syscheck_analysis(report(name), activeIOS, extraProtection) == EXPECTED[name][flags]
+
+def test_cached_analysis_matches():
+    cache = AnalysisCache()
+    set_default_analysis_cache(cache)
+    try:
+        for _ in range(2):
+            for name, flags in CASES:
+                activeIOS, extraProtection = (flag == '1' for flag in flags)
+                assert get_syscheck_analysis(report(name), activeIOS, extraProtection) == EXPECTED[name][flags]
+    finally:
+        set_default_analysis_cache(None)
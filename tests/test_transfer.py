@@ -0,0 +1,182 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from libModMii.download.http_async import AsyncHttpClient
+from libModMii.download.transfer import (RetryPolicy, download_file, download_file_async, fetch_bytes,
+                                         fetch_bytes_async, part_path, validator_path)
+from http_fixtures import FileServer, ServedFile
+
+FAST_RETRY = RetryPolicy(attempts=4, base_delay=0.01, max_delay=0.02)
+# Several CHUNK_SIZE chunks: requests drops a chunk cut short by a reset, half a body still leaves whole ones
+DATA = os.urandom(300_000)
+
+def download(mode, url, path, expected_size=None, retry=FAST_RETRY):
+    if mode == 'sync':
+        return download_file(url, path, expected_size=expected_size, retry=retry)
+
+    async def run():
+        async with AsyncHttpClient(timeout=5) as client:
+            return await download_file_async(client, url, path, expected_size=expected_size, retry=retry)
+    return asyncio.run(run())
+
+def fetch(mode, url, expected_size=None, retry=FAST_RETRY):
+    if mode == 'sync':
+        return fetch_bytes(url, expected_size=expected_size, retry=retry)
+
+    async def run():
+        async with AsyncHttpClient(timeout=5) as client:
+            return await fetch_bytes_async(client, url, expected_size=expected_size, retry=retry)
+    return asyncio.run(run())
+
+def write_part(path, data, validator=None):
+    with open(part_path(path), 'wb') as f:
+        f.write(data)
+    if validator is not None:
+        with open(validator_path(part_path(path)), 'w', encoding='utf-8') as f:
+            f.write(validator)
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def assert_done(path, data):
+    assert read(path) == data
+    assert not os.path.exists(part_path(path))
+    assert not os.path.exists(validator_path(part_path(path)))
+
+modes = pytest.mark.parametrize('mode', ['sync', 'async'])
+
+@modes
+def test_fresh_download_keeps_no_part(mode, tmp_path):
+    path = str(tmp_path / 'file')
+    with FileServer({'file': ServedFile(DATA, etag='"v1"')}) as server:
+        download(mode, server.url + 'file', path)
+        assert 'range' not in server.requests[0].headers
+    assert_done(path, DATA)
+
+@modes
+def test_resume_with_206(mode, tmp_path):
+    path = str(tmp_path / 'file')
+    write_part(path, DATA[:30_000], '"v1"')
+    with FileServer({'file': ServedFile(DATA, etag='"v1"')}) as server:
+        download(mode, server.url + 'file', path)
+        headers = server.requests[0].headers
+    assert headers['range'] == 'bytes=30000-'
+    assert headers['if-range'] == '"v1"'
+    assert_done(path, DATA)
+
+@modes
+def test_resume_with_known_size_needs_no_validator(mode, tmp_path):
+    path = str(tmp_path / 'file')
+    write_part(path, DATA[:30_000])
+    with FileServer({'file': ServedFile(DATA)}) as server:
+        download(mode, server.url + 'file', path, expected_size=len(DATA))
+        headers = server.requests[0].headers
+    assert headers['range'] == 'bytes=30000-'
+    assert 'if-range' not in headers
+    assert_done(path, DATA)
+
+@modes
+def test_200_to_a_range_request_restarts_from_zero(mode, tmp_path):
+    path = str(tmp_path / 'file')
+    write_part(path, b'x' * 30_000, '"v1"')
+    with FileServer({'file': ServedFile(DATA, etag='"v1"', ranges=False)}) as server:
+        download(mode, server.url + 'file', path)
+        assert 'range' in server.requests[0].headers
+    assert_done(path, DATA)
+
+@modes
+def test_changed_validator_restarts_from_zero(mode, tmp_path):
+    path = str(tmp_path / 'file')
+    old = os.urandom(len(DATA))
+    write_part(path, old[:30_000], '"v1"')
+    with FileServer({'file': ServedFile(DATA, etag='"v2"')}) as server:
+        download(mode, server.url + 'file', path)
+        assert server.requests[0].headers['if-range'] == '"v1"'
+    assert_done(path, DATA)
+
+@modes
+def test_part_without_validator_or_size_restarts_from_zero(mode, tmp_path):
+    path = str(tmp_path / 'file')
+    write_part(path, os.urandom(30_000))
+    with FileServer({'file': ServedFile(DATA)}) as server:
+        download(mode, server.url + 'file', path)
+        assert 'range' not in server.requests[0].headers
+    assert_done(path, DATA)
+
+@modes
+def test_416_on_a_complete_part(mode, tmp_path):
+    path = str(tmp_path / 'file')
+    write_part(path, DATA, '"v1"')
+    with FileServer({'file': ServedFile(DATA, etag='"v1"')}) as server:
+        download(mode, server.url + 'file', path)
+        assert len(server.requests) == 1
+    assert_done(path, DATA)
+
+@modes
+def test_complete_part_of_known_size_is_not_requested(mode, tmp_path):
+    path = str(tmp_path / 'file')
+    write_part(path, DATA)
+    with FileServer({'file': ServedFile(DATA)}) as server:
+        download(mode, server.url + 'file', path, expected_size=len(DATA))
+        assert server.requests == []
+    assert_done(path, DATA)
+
+@modes
+@pytest.mark.parametrize('etag, expected_size', [('"v1"', None), (None, len(DATA))])
+def test_dropped_connection_resumes(mode, tmp_path, etag, expected_size):
+    path = str(tmp_path / 'file')
+    with FileServer({'file': ServedFile(DATA, etag=etag, drops=1)}) as server:
+        download(mode, server.url + 'file', path, expected_size)
+        assert len(server.requests) == 2
+        assert 'range' not in server.requests[0].headers
+        # Only the bytes the dropped response did not deliver are requested again
+        assert int(server.requests[1].headers['range'].split('=')[1].rstrip('-')) > 0
+    assert_done(path, DATA)
+
+@modes
+def test_retries_give_up(mode, tmp_path):
+    path = str(tmp_path / 'file')
+    with FileServer({'file': ServedFile(DATA, etag='"v1"', drops=10)}) as server:
+        with pytest.raises(Exception, match='after 4 attempts'):
+            download(mode, server.url + 'file', path)
+        assert len(server.requests) == 4
+
+@modes
+def test_fetch_bytes_dropped_connection_resumes(mode):
+    with FileServer({'file': ServedFile(DATA, etag='"v1"', drops=1)}) as server:
+        assert fetch(mode, server.url + 'file') == DATA
+        assert server.requests[1].headers['if-range'] == '"v1"'
+
+@modes
+def test_fetch_bytes_without_validator_restarts(mode):
+    with FileServer({'file': ServedFile(DATA, drops=1)}) as server:
+        assert fetch(mode, server.url + 'file') == DATA
+        assert 'range' not in server.requests[1].headers
+
+@modes
+def test_fetch_bytes_changed_file_restarts(mode):
+    served = ServedFile(DATA, etag='"v1"', drops=1)
+    new = os.urandom(len(DATA))
+    with FileServer({'file': served}) as server:
+        original_handle = server._handle
+
+        def handle(request, connection):
+            original_handle(request, connection)
+            # The file changes on the server after the first, dropped, response
+            served.data, served.etag = new, '"v2"'
+
+        server.server.handler = handle
+        assert fetch(mode, server.url + 'file') == new
+
+def test_retry_policy_delays():
+    policy = RetryPolicy(attempts=6, base_delay=0.5, max_delay=3.0)
+    for _ in range(50):
+        delays = list(policy.delays())
+        assert len(delays) == 5
+        for attempt, delay in enumerate(delays):
+            assert 0 <= delay <= min(3.0, 0.5 * 2 ** attempt)
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+from libModMii.syscheck import translation
+from libModMii.syscheck.translation import LOOP_MAX_KEYWORDS, KeywordTranslator, load_translations
+from syscheck_fixtures import LANGUAGES, make_report
+
+def regex_translator(languages, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(translation, 'LOOP_MAX_KEYWORDS', 0)
+        translator = KeywordTranslator(languages)
+    assert translator._loop is None
+    return translator
+
+def reports():
+    with open(os.path.join(os.path.dirname(__file__), 'test-syscheck.csv'), encoding='utf-8') as f:
+        yield f.read()
+    for language in LANGUAGES:
+        for console_type in ('Wii', 'vWii'):
+            yield make_report(3, language, console_type, 20)
+
+def test_packaged_table_strategies_agree(monkeypatch):
+    translator = KeywordTranslator(load_translations())
+    assert translator._loop is not None
+    regex = regex_translator(load_translations(), monkeypatch)
+    for report in reports():
+        assert translator.translate(report) == regex.translate(report)
+
+@pytest.mark.parametrize('force_regex', [False, True])
+def test_longest_keyword_wins(monkeypatch, force_regex):
+    languages = {'fr': {'Chaine': 'Channel', 'Chaine Homebrew': 'Homebrew Channel', 'Pas de patches': 'No Patches'}}
+    translator = regex_translator(languages, monkeypatch) if force_regex else KeywordTranslator(languages)
+    assert (translator.translate('Chaine Homebrew 1.1.2, Chaine, IOS9: Pas de patches')
+            == 'Homebrew Channel 1.1.2, Channel, IOS9: No Patches')
+
+def test_replacements_are_not_translated_again():
+    # "Console" is both a replacement and a keyword: a chained replace would turn "Konsole" into "Console Type"
+    translator = KeywordTranslator({'de': {'Konsole': 'Console', 'Console': 'Console Type'}})
+    assert translator._loop is None
+    assert translator.translate('Konsole, Console') == 'Console, Console Type'
+
+def test_large_tables_use_the_regex():
+    keywords = {f'Keyword {index}': f'Word {index}' for index in range(LOOP_MAX_KEYWORDS)}
+    translator = KeywordTranslator({'xx': dict(list(keywords.items())[:-1])})
+    assert translator._loop is not None
+    translator.register('xx', keywords)
+    assert translator._loop is None
+    assert translator.translate('Keyword 12, Keyword 1') == 'Word 12, Word 1'
+
+def test_empty_table():
+    assert KeywordTranslator({}).translate('IOS9 (rev 1034): No Patches') == 'IOS9 (rev 1034): No Patches'
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from libModMii.download import validation
+from libModMii.download.validation import HashIndex, get_file_md5, verify_file
+
+@pytest.fixture
+def hashed(monkeypatch):
+    # Files actually read by get_file_md5(), index hits read nothing
+    reads = []
+    md5_file = validation.md5_file
+
+    def counting_md5_file(file_path, *args):
+        reads.append(file_path)
+        return md5_file(file_path, *args)
+
+    monkeypatch.setattr(validation, 'md5_file', counting_md5_file)
+    return reads
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def test_unchanged_file_is_not_read_again(tmp_path, hashed):
+    index = HashIndex(str(tmp_path / 'index.sqlite'))
+    path = str(tmp_path / 'file')
+    write(path, b'first')
+    assert get_file_md5(path, index) == hashlib.md5(b'first').hexdigest()
+    assert get_file_md5(path, index) == hashlib.md5(b'first').hexdigest()
+    assert len(hashed) == 1
+    # The index is shared through its file
+    assert get_file_md5(path, HashIndex(index.path)) == hashlib.md5(b'first').hexdigest()
+    assert len(hashed) == 1
+
+def test_size_change_misses(tmp_path, hashed):
+    index = HashIndex(str(tmp_path / 'index.sqlite'))
+    path = str(tmp_path / 'file')
+    write(path, b'first')
+    mtime_ns = os.stat(path).st_mtime_ns
+    get_file_md5(path, index)
+    write(path, b'longer content')
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    assert get_file_md5(path, index) == hashlib.md5(b'longer content').hexdigest()
+    assert len(hashed) == 2
+
+def test_mtime_change_misses(tmp_path, hashed):
+    index = HashIndex(str(tmp_path / 'index.sqlite'))
+    path = str(tmp_path / 'file')
+    write(path, b'first')
+    mtime_ns = os.stat(path).st_mtime_ns
+    get_file_md5(path, index)
+    # Same size, only the modification time (down to the nanosecond) tells the content changed
+    write(path, b'other')
+    os.utime(path, ns=(mtime_ns + 1, mtime_ns + 1))
+    assert get_file_md5(path, index) == hashlib.md5(b'other').hexdigest()
+    assert len(hashed) == 2
+
+def test_verify_file_with_index(tmp_path):
+    index = HashIndex(str(tmp_path / 'index.sqlite'))
+    path = str(tmp_path / 'file')
+    write(path, b'data')
+    md5 = hashlib.md5(b'data').hexdigest()
+    verify_file(path, md5, hash_index=index)
+    verify_file(path, 'wrong', md5, hash_index=index)
+    with pytest.raises(Exception, match='File verification failed'):
+        verify_file(path, 'wrong', hash_index=index)
+
+def test_forget_and_prune(tmp_path, hashed):
+    index = HashIndex(str(tmp_path / 'index.sqlite'))
+    kept, removed = str(tmp_path / 'kept'), str(tmp_path / 'removed')
+    for path in (kept, removed):
+        write(path, b'data')
+        get_file_md5(path, index)
+    index.forget(kept)
+    assert index.lookup(kept, os.stat(kept)) is None
+    get_file_md5(kept, index)
+    os.remove(removed)
+    assert index.prune() == 1
+    assert index.lookup(kept, os.stat(kept)) == hashlib.md5(b'data').hexdigest()